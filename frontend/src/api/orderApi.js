@@ -21,6 +21,7 @@ export const getOrders = async (filters = {}) => {
     if (filters.date_from) params.append('date_from', filters.date_from);
     if (filters.date_to) params.append('date_to', filters.date_to);
     if (filters.limit) params.append('limit', filters.limit);
+    if (filters.fields) params.append('fields', filters.fields.join(','));
 
     const response = await fetch(`${ORDER_SERVICE_URL}/orders?${params}`);
     const data = await response.json();
@@ -50,13 +51,15 @@ export const getOrderById = async (orderId) => {
   }
 };
 
-export const createOrder = async (orderData) => {
+export const createOrder = async (orderData, idempotencyKey) => {
   try {
+    const headers = { 'Content-Type': 'application/json' };
+    // Retries with the same key return the original order instead of creating a duplicate
+    if (idempotencyKey) headers['Idempotency-Key'] = idempotencyKey;
+
     const response = await fetch(`${ORDER_SERVICE_URL}/orders`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
+      headers,
       body: JSON.stringify(orderData),
     });
     
@@ -72,6 +75,24 @@ export const createOrder = async (orderData) => {
   }
 };
 
+export const getPrepList = async (statuses = []) => {
+  try {
+    const params = new URLSearchParams();
+    if (statuses.length) params.append('status', statuses.join(','));
+
+    const response = await fetch(`${ORDER_SERVICE_URL}/orders/prep-list?${params}`);
+    const data = await response.json();
+    
+    if (!data.success) {
+      throw new Error(data.message);
+    }
+    
+    return data.data;
+  } catch (error) {
+    throw handleApiError(error);
+  }
+};
+
 export const updateOrderStatus = async (orderId, status) => {
   try {
     const response = await fetch(`${ORDER_SERVICE_URL}/orders/${orderId}/status`, {
@@ -147,6 +168,44 @@ export const payOrder = async (orderId, paymentData = {}) => {
   }
 };
 
+export const getTableBill = async (tableNumber) => {
+  try {
+    const response = await fetch(`${ORDER_SERVICE_URL}/tables/${tableNumber}/bill`);
+    const data = await response.json();
+    
+    if (!data.success) {
+      throw new Error(data.message);
+    }
+    
+    return data.data;
+  } catch (error) {
+    throw handleApiError(error);
+  }
+};
+
+export const payTable = async (tableNumber, paymentData = {}) => {
+  try {
+    // Settles every ready order of the table at once and returns one receipt
+    const response = await fetch(`${ORDER_SERVICE_URL}/tables/${tableNumber}/pay`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(paymentData),
+    });
+    
+    const data = await response.json();
+    
+    if (!data.success) {
+      throw new Error(data.message);
+    }
+    
+    return data.data;
+  } catch (error) {
+    throw handleApiError(error);
+  }
+};
+
 export const getKitchenOrders = async () => {
   try {
     const response = await fetch(`${ORDER_SERVICE_URL}/orders/kitchen`);
@@ -1,8 +1,16 @@
 import React, { useState, useEffect } from 'react';
-import { getOrders, updateOrderStatus, updateOrderItemStatus } from '../api/orderApi.js';
+import { getOrders, getPrepList, updateOrderStatus, updateOrderItemStatus } from '../api/orderApi.js';
+
+// Only the fields rendered by the kitchen cards
+const KITCHEN_FIELDS = [
+  'id', 'order_number', 'table_number', 'customer_name', 'status', 'special_instructions',
+  'estimated_completion_time', 'created_at', 'final_amount',
+  'items.id', 'items.menu_item_name', 'items.quantity', 'items.special_instructions', 'items.status'
+];
 
 export default function KitchenDisplay() {
   const [orders, setOrders] = useState([]);
+  const [prepList, setPrepList] = useState([]);
   const [loading, setLoading] = useState(true);
   const [filterStatus, setFilterStatus] = useState('active');
   const [autoRefresh, setAutoRefresh] = useState(true);
@@ -22,8 +30,12 @@ export default function KitchenDisplay() {
 
   const loadOrders = async () => {
     try {
-      const data = await getOrders();
+      const [data, prepData] = await Promise.all([
+        getOrders({ fields: KITCHEN_FIELDS }),
+        getPrepList(['pending', 'preparing'])
+      ]);
       setOrders(data);
+      setPrepList(prepData);
     } catch (error) {
       console.error('Error loading orders:', error);
     } finally {
@@ -180,6 +192,20 @@ export default function KitchenDisplay() {
         ))}
       </div>
 
+      {prepList.length > 0 && (
+        <section className="kitchen-display__prep-list">
+          <strong>📝 Da preparare</strong>
+          {prepList.map(entry => (
+            <span key={entry.menu_item_id} className="chip-warning">
+              {entry.total_quantity}× {entry.menu_item_name}
+              {entry.by_status.preparing && (
+                <span className="text-muted"> ({entry.by_status.preparing.quantity} in preparazione)</span>
+              )}
+            </span>
+          ))}
+        </section>
+      )}
+
       {filteredOrders.length === 0 ? (
         <div className="empty-state">
           <span style={{ fontSize: '2.5rem' }}>🎉</span>
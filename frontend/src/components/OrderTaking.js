@@ -1,8 +1,16 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { getMenu } from '../api';
 import { createOrder } from '../api/orderApi';
 
+const newIdempotencyKey = () => (
+  window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+);
+
 export default function OrderTaking() {
+  // Same key for every retry of an unchanged order, so the server never creates it twice
+  const submitAttemptRef = useRef({ key: null, payload: null });
   const [menuItems, setMenuItems] = useState([]);
   const [currentOrder, setCurrentOrder] = useState({
     table_number: '',
@@ -130,7 +138,13 @@ export default function OrderTaking() {
         total_amount: calculateOrderTotal()
       };
 
-      const result = await createOrder(orderData);
+      const payload = JSON.stringify(orderData);
+      if (submitAttemptRef.current.payload !== payload) {
+        submitAttemptRef.current = { key: newIdempotencyKey(), payload };
+      }
+
+      const result = await createOrder(orderData, submitAttemptRef.current.key);
+      submitAttemptRef.current = { key: null, payload: null };
 
       setOrderHistory(prev => [result, ...prev]);
       setCurrentOrder({
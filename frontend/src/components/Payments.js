@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getOrders, payOrder, formatOrderStatus, formatOrderType, calculateOrderTiming } from '../api/orderApi';
+import { getOrders, getTableBill, payOrder, payTable, formatOrderStatus, formatOrderType, calculateOrderTiming } from '../api/orderApi';
 
 export default function Payments() {
   const [orders, setOrders] = useState([]);
@@ -278,11 +278,32 @@ export default function Payments() {
                 
                 const totalAmount = filteredOrders.reduce((total, order) => total + parseFloat(order.final_amount), 0).toFixed(2);
                 
-                if (!window.confirm(`Confermi il pagamento di €${totalAmount} per ${filteredOrders.length} ordini?`)) {
-                  return;
-                }
-                
                 try {
+                  if (selectedTable) {
+                    // One transaction and one receipt for the whole table: confirm the amount
+                    // the server will charge, and send it so a bill that grew meanwhile is refused
+                    const bill = await getTableBill(selectedTable);
+                    const payableOrders = bill.orders.filter((order) => order.payable);
+                    if (payableOrders.length === 0) {
+                      alert('Non ci sono ordini da pagare');
+                      return;
+                    }
+                    if (!window.confirm(`Confermi il pagamento di €${bill.payable_total.toFixed(2)} per ${payableOrders.length} ordini del tavolo ${selectedTable}?`)) {
+                      return;
+                    }
+                    const receipt = await payTable(selectedTable, {
+                      payment_method: paymentMethod,
+                      payment_amount: bill.payable_total
+                    });
+                    alert(`Tavolo ${receipt.table_number} pagato! Totale: €${receipt.total.toFixed(2)}`);
+                    await loadOrders();
+                    return;
+                  }
+                  
+                  if (!window.confirm(`Confermi il pagamento di €${totalAmount} per ${filteredOrders.length} ordini?`)) {
+                    return;
+                  }
+
                   // Process all payments
                   for (const order of filteredOrders) {
                     await payOrder(order.id, {
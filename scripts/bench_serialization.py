@@ -0,0 +1,122 @@
+"""Micro-benchmark for the order serialization path.
+
+Compares the previous per-endpoint approach (hand-written dict building with
+Decimal -> float / isoformat, then the stdlib JSON encoder with sorted keys as
+Flask's default provider does) with the shared row serializers plus the fast
+JSON provider.
+
+Usage:
+    python scripts/bench_serialization.py [orders] [items_per_order]
+"""
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'services', 'order-management', 'src'))
+
+from serialization import serialize_order, serialize_order_item  # noqa: E402
+from json_provider import orjson, _default  # noqa: E402
+
+OrderRow = namedtuple('OrderRow', [
+    'id', 'order_number', 'table_number', 'customer_name', 'status', 'order_type',
+    'total_amount', 'tax_amount', 'discount_amount', 'final_amount', 'special_instructions',
+    'estimated_completion_time', 'version', 'created_at', 'updated_at'
+])
+ItemRow = namedtuple('ItemRow', [
+    'id', 'order_id', 'menu_item_id', 'menu_item_name', 'quantity', 'unit_price',
+    'total_price', 'special_instructions', 'status', 'version', 'created_at', 'updated_at'
+])
+
+
+def make_rows(orders, items_per_order):
+    now = datetime.now()
+    rows = []
+    for n in range(orders):
+        order_id = str(uuid.uuid4())
+        order = OrderRow(order_id, f'ORD-20240101-{n:04d}', n % 20 + 1, 'Mario Rossi', 'preparing', 'dine_in',
+                         Decimal('42.50'), Decimal('0'), Decimal('0'), Decimal('42.50'), None, now, 1, now, now)
+        items = [
+            ItemRow(str(uuid.uuid4()), order_id, str(uuid.uuid4()), 'Spaghetti Carbonara', 2,
+                    Decimal('12.00'), Decimal('24.00'), 'no pepper', 'preparing', 1, now, now)
+            for _ in range(items_per_order)
+        ]
+        rows.append((order, items))
+    return rows
+
+
+def legacy_item(item):
+    return {
+        'id': str(item.id),
+        'menu_item_id': str(item.menu_item_id),
+        'menu_item_name': item.menu_item_name,
+        'quantity': item.quantity,
+        'unit_price': float(item.unit_price),
+        'total_price': float(item.total_price),
+        'special_instructions': item.special_instructions,
+        'status': item.status,
+        'created_at': item.created_at.isoformat() if item.created_at else None,
+        'updated_at': item.updated_at.isoformat() if item.updated_at else None
+    }
+
+
+def legacy_order(order, items):
+    return {
+        'id': str(order.id),
+        'order_number': order.order_number,
+        'table_number': order.table_number,
+        'customer_name': order.customer_name,
+        'status': order.status,
+        'order_type': order.order_type,
+        'total_amount': float(order.total_amount),
+        'tax_amount': float(order.tax_amount),
+        'discount_amount': float(order.discount_amount),
+        'final_amount': float(order.final_amount),
+        'special_instructions': order.special_instructions,
+        'estimated_completion_time': order.estimated_completion_time.isoformat() if order.estimated_completion_time else None,
+        'items': [legacy_item(item) for item in items],
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None
+    }
+
+
+def run_legacy(rows):
+    payload = {'success': True, 'data': [legacy_order(order, items) for order, items in rows]}
+    return json.dumps(payload, sort_keys=True, ensure_ascii=True).encode()
+
+
+def run_fast(rows):
+    payload = {'success': True, 'data': [
+        serialize_order(order, [serialize_order_item(item) for item in items]) for order, items in rows
+    ]}
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default).encode()
+
+
+def bench(func, rows, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    items_per_order = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rows = make_rows(orders, items_per_order)
+    total_rows = orders * (1 + items_per_order)
+
+    legacy = bench(run_legacy, rows)
+    fast = bench(run_fast, rows)
+
+    print(f"{orders} orders x {items_per_order} items ({total_rows} rows), orjson={'yes' if orjson else 'no'}")
+    print(f"  legacy to_dict + stdlib json: {legacy * 1000:8.2f} ms  ({legacy / total_rows * 1e6:.2f} us/row)")
+    print(f"  row serializer + fast json:   {fast * 1000:8.2f} ms  ({fast / total_rows * 1e6:.2f} us/row)")
+    print(f"  speedup: {legacy / fast:.2f}x")
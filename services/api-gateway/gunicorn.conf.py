@@ -0,0 +1,59 @@
+"""Gunicorn settings for the API gateway.
+
+Run with: gunicorn --config gunicorn.conf.py wsgi:app
+
+The gateway only waits on the other services, so it runs few worker processes
+with many threads each; the worker timeout stays above REQUEST_TIMEOUT so a
+slow upstream is answered with a 503 instead of a killed worker. The app is
+preloaded once in the master.
+
+kill -HUP <master> restarts the workers gracefully; since the app is
+preloaded, deploying new code needs kill -USR2 (new master) then -QUIT on the
+old one. Workers are recycled after max_requests (+ jitter) requests.
+"""
+import multiprocessing
+import os
+import shutil
+
+_cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 3000)}"
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', _cpus + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# Heartbeat files on tmpfs: a slow overlay filesystem must not get workers killed
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+# The app writes its own structured access log
+accesslog = None
+errorlog = '-'
+
+os.environ.setdefault('METRICS_DIR', '/tmp/metrics-api-gateway')
+
+
+def on_starting(server):
+    # Snapshots left by a previous run would be merged into /metrics
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
+
+
+def post_worker_init(worker):
+    from logging_utils import restart_log_listener
+    from profiler import install_profile_signal
+
+    app = worker.wsgi
+    restart_log_listener(app)
+    # Gunicorn resets SIGUSR2 in the worker after post_fork
+    install_profile_signal(app)
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
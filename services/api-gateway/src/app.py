@@ -1,18 +1,30 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from datetime import datetime
+import logging
 import os
-import time
 
 from config import config
-from routes.gateway_routes import gateway_bp
+from json_provider import FastJSONProvider
+from logging_utils import init_logging
+from metrics import init_metrics, metrics_response, process_uptime
+from profiler import init_profiler
+from tracing import init_tracing
+from routes.gateway_routes import gateway_bp, FORWARDED_HEADERS
+
+logger = logging.getLogger(__name__)
 
 def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = FastJSONProvider(app)
+    init_logging(app, 'api-gateway')
+    init_metrics(app)
+    init_profiler(app)
+    init_tracing(app, 'api-gateway')
     
-    # Initialize extensions
-    CORS(app)
+    # Initialize extensions (the browser frontend may read the forwarded upstream headers)
+    CORS(app, expose_headers=list(FORWARDED_HEADERS))
     
     # Configure Flask to handle trailing slashes flexibly
     app.url_map.strict_slashes = False
@@ -30,8 +42,11 @@ def create_app(config_name='default'):
             'timestamp': datetime.utcnow().isoformat(),
             'endpoints': {
                 'health': '/health',
+                'metrics': '/metrics',
                 'menu': '/api/menu',
-                'orders': '/api/orders'
+                'orders': '/api/orders',
+                'tables': '/api/tables',
+                'reports': '/api/reports'
             }
         })
     
@@ -60,16 +75,21 @@ def create_app(config_name='default'):
                 services_health['order-service'] = 'unavailable'
             
         except Exception as e:
-            print(f"Error checking service health: {str(e)}")
+            logger.warning('Error checking service health: %s', e)
         
         return jsonify({
             'status': 'healthy',
             'service': 'api-gateway',
             'timestamp': datetime.utcnow().isoformat(),
-            'uptime': time.process_time(),
+            'uptime': round(process_uptime(), 3),
             'services': services_health
         })
     
+    # Metrics endpoint (Prometheus text format)
+    @app.route('/metrics')
+    def metrics():
+        return metrics_response()
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
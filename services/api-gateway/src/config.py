@@ -9,6 +9,28 @@ class Config:
     MENU_SERVICE_URL = os.environ.get('MENU_SERVICE_URL', 'http://localhost:3001')
     ORDER_SERVICE_URL = os.environ.get('ORDER_SERVICE_URL', 'http://localhost:3002')
     
+    # Logging: JSON lines written by a background thread (see logging_utils)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', 'werkzeug=WARNING')  # e.g. 'routes.order_routes=DEBUG'
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')  # e.g. 'access=0.1' keeps 10% of successful requests
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json or text
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # Metrics: with several worker processes, a directory shared by them so /metrics covers all workers
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    # Admin endpoints (/admin/profile) exist only when ADMIN_TOKEN is set
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    # Sampling profiler (profiler.py): collapsed stacks are written to PROFILE_DIR
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/profiles')
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 300))
+    PROFILE_SIGNAL_SECONDS = float(os.environ.get('PROFILE_SIGNAL_SECONDS', 30))
+    # Tracing: TRACE_EXPORTER is '' (propagate only), 'memory' or 'file' (JSON lines in TRACE_FILE)
+    TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', '')
+    TRACE_FILE = os.environ.get('TRACE_FILE', '/tmp/traces/{service}.jsonl')
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 1.0))
+    TRACE_MEMORY_SPANS = int(os.environ.get('TRACE_MEMORY_SPANS', 10000))
+    
     # Flask settings
     PORT = int(os.environ.get('PORT', 3000))
     DEBUG = os.environ.get('FLASK_ENV') == 'development'
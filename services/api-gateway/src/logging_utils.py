@@ -0,0 +1,198 @@
+"""Structured, non-blocking logging shared by the services.
+
+Records are formatted as one JSON object per line (or plain text with
+LOG_FORMAT=text) by a background QueueListener; request threads only put the
+record on a bounded queue and never wait on stdout. When the queue is full
+records are dropped and counted rather than blocking the request.
+
+- LOG_LEVEL sets the root level, LOG_LEVELS overrides it per logger
+  ('werkzeug=WARNING,routes.order_routes=DEBUG').
+- LOG_SAMPLE_RATES keeps only a fraction of the INFO and DEBUG records of
+  high-volume loggers ('access=0.1'); warnings and errors are never sampled.
+- Every record carries the request id, taken from the X-Request-ID header
+  (the gateway generates it) or generated here, and echoed on the response.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import traceback
+import uuid
+
+from flask import g, request, has_request_context
+
+from json_provider import json_dumps
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Attributes every LogRecord has; anything else was passed with extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+access_logger = logging.getLogger('access')
+
+
+def parse_logger_settings(value):
+    """'name=value,other=value' -> {'name': 'value', 'other': 'value'}"""
+    settings = {}
+    for entry in (value or '').split(','):
+        name, _, setting = entry.partition('=')
+        if name.strip() and setting.strip():
+            settings[name.strip()] = setting.strip()
+    return settings
+
+
+def get_request_id():
+    return g.get('request_id') if has_request_context() else None
+
+
+def request_id_headers():
+    """Headers that propagate the current request id to another service"""
+    request_id = get_request_id()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+class ContextFilter(logging.Filter):
+    """Adds the service name, request id and trace id while still on the request thread"""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def filter(self, record):
+        record.service = self.service
+        record.request_id = get_request_id()
+        record.trace_id = g.get('trace_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the INFO/DEBUG records of the configured loggers (and their children)"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'timestamp': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info))
+        try:
+            return json_dumps(entry)
+        except TypeError:
+            return json_dumps({
+                key: value if isinstance(value, (str, int, float, bool, list, dict)) else str(value)
+                for key, value in entry.items()
+            })
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only resolve the message here
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info))
+            record.exception = record.exc_text
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def init_logging(app, service):
+    """Route all logging through a queue to one structured stdout handler"""
+    config = app.config
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if config.get('LOG_FORMAT') == 'text' else JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=config.get('LOG_QUEUE_SIZE', 10000)))
+    handler.addFilter(ContextFilter(service))
+    handler.addFilter(SamplingFilter({
+        name: float(rate) for name, rate in parse_logger_settings(config.get('LOG_SAMPLE_RATES')).items()
+    }))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, DroppingQueueHandler):
+            existing.listener.stop()
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(config.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_logger_settings(config.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    handler.listener = logging.handlers.QueueListener(handler.queue, output)
+    handler.listener.start()
+    atexit.register(handler.listener.stop)
+    app.extensions['log_handler'] = handler
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        response.headers[REQUEST_ID_HEADER] = g.get('request_id', '')
+        duration_ms = (time.perf_counter() - g.get('request_started', time.perf_counter())) * 1000
+        level = logging.ERROR if response.status_code >= 500 else logging.WARNING if response.status_code >= 400 else logging.INFO
+        access_logger.log(level, '%s %s %s', request.method, request.path, response.status_code, extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'query_count': g.get('query_count'),
+            'db_ms': round(g.query_time * 1000, 2) if 'query_time' in g else None
+        })
+        return response
+
+
+def restart_log_listener(app):
+    """Start the output thread again in a forked worker; threads do not survive fork()"""
+    handler = app.extensions.get('log_handler')
+    if handler is None:
+        return
+    handler.listener = logging.handlers.QueueListener(handler.queue, *handler.listener.handlers)
+    handler.listener.start()
+    atexit.register(handler.listener.stop)
@@ -0,0 +1,338 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters, gauges and histograms keep their values in plain dicts keyed by
+label values, each guarded by its own lock, so recording a sample is a dict
+update. GET /metrics renders them.
+
+With several worker processes (gunicorn) set METRICS_DIR to a directory
+shared by the workers: each worker writes a snapshot of its values there every
+METRICS_FLUSH_SECONDS and /metrics merges the snapshots of all workers, so a
+scrape sees the whole service whichever worker answers it. Counters and
+histograms of workers that exited are kept; their gauges are dropped by
+mark_process_dead() (called from the gunicorn child_exit hook).
+"""
+import atexit
+import bisect
+import glob
+import logging
+import os
+import threading
+import time
+
+from flask import g, request, Response
+
+from json_provider import json_dumps, json_loads
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROCESS_STARTED = time.time()
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, snapshots):
+        """Combine the snapshots of several processes into {labels: value}"""
+        merged = {}
+        for samples in snapshots:
+            for labels, value in samples:
+                labels = tuple(labels)
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def render(self, merged):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for labels, value in sorted(merged.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """multiprocess_mode: 'sum' adds the workers' values, 'max' keeps the largest"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), multiprocess_mode='sum'):
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def merge(self, snapshots):
+        if self.multiprocess_mode != 'max':
+            return super().merge(snapshots)
+        merged = {}
+        for samples in snapshots:
+            for labels, value in samples:
+                labels = tuple(labels)
+                merged[labels] = max(merged.get(labels, value), value)
+        return merged
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (not cumulative) counts, one extra for +Inf, then the sum
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(state)] for labels, state in self._values.items()]
+
+    def merge(self, snapshots):
+        merged = {}
+        for samples in snapshots:
+            for labels, state in samples:
+                labels = tuple(labels)
+                current = merged.get(labels)
+                merged[labels] = list(state) if current is None else [a + b for a, b in zip(current, state)]
+        return merged
+
+    def render(self, merged):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        bounds = self.buckets + (float('inf'),)
+        for labels, state in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-1])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.directory = None
+        self.flush_interval = 5.0
+        self._flusher_pid = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector):
+        """collector() is called before every render or flush to refresh gauges"""
+        self.collectors.append(collector)
+
+    def collect(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning('Metrics collector %s failed: %s', getattr(collector, '__name__', collector), e)
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    # Multiprocess support
+
+    def snapshot_path(self, pid):
+        return os.path.join(self.directory, f'metrics_{pid}.json')
+
+    def flush(self):
+        if not self.directory:
+            return
+        path = self.snapshot_path(os.getpid())
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(json_dumps(self.collect()))
+        os.replace(f'{path}.tmp', path)
+
+    def ensure_flusher(self):
+        """Start the flush thread in this process (again after a fork)"""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning('Could not write metrics snapshot: %s', e)
+
+        threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+        atexit.register(self.flush)
+
+    def load_snapshots(self):
+        """This process's live values plus the last snapshot of every other worker"""
+        snapshots = [self.collect()]
+        if self.directory:
+            own = self.snapshot_path(os.getpid())
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path, 'rb') as f:
+                        snapshots.append(json_loads(f.read()))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+    def render(self):
+        snapshots = self.load_snapshots()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.extend(metric.render(metric.merge(snapshot.get(name, []) for snapshot in snapshots)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    'http_requests_total', 'HTTP requests handled', ('method', 'route', 'status')))
+REQUEST_DURATION = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('method', 'route', 'status')))
+IN_FLIGHT = registry.register(Gauge(
+    'http_requests_in_flight', 'HTTP requests being handled'))
+UPSTREAM_DURATION = registry.register(Histogram(
+    'upstream_request_duration_seconds', 'Latency of calls to other services', ('upstream', 'status')))
+CACHE_REQUESTS = registry.register(Counter(
+    'cache_requests_total', 'Cache lookups by result (hit or miss)', ('cache', 'result')))
+DB_POOL = registry.register(Gauge(
+    'db_pool_connections', 'Database connection pool usage', ('bind', 'state')))
+UPTIME = registry.register(Gauge(
+    'process_uptime_seconds', 'Seconds since the oldest worker started', multiprocess_mode='max'))
+
+
+def process_uptime():
+    return time.time() - PROCESS_STARTED
+
+
+def observe_upstream(upstream, status, seconds):
+    UPSTREAM_DURATION.observe(upstream, str(status), value=seconds)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
+
+
+def mark_process_dead(pid, directory=None):
+    """Drop the gauges of an exited worker, keeping its counters and histograms"""
+    directory = directory or os.environ.get('METRICS_DIR')
+    if not directory:
+        return
+    path = os.path.join(directory, f'metrics_{pid}.json')
+    try:
+        with open(path, 'rb') as f:
+            snapshot = json_loads(f.read())
+    except (OSError, ValueError):
+        return
+    for name, metric in registry.metrics.items():
+        if isinstance(metric, Gauge):
+            snapshot.pop(name, None)
+    with open(f'{path}.tmp', 'w') as f:
+        f.write(json_dumps(snapshot))
+    os.replace(f'{path}.tmp', path)
+
+
+def metrics_response():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+def init_metrics(app, db=None):
+    registry.directory = app.config.get('METRICS_DIR') or None
+    registry.flush_interval = app.config.get('METRICS_FLUSH_SECONDS', 5.0)
+    if registry.directory:
+        os.makedirs(registry.directory, exist_ok=True)
+
+    registry.add_collector(lambda: UPTIME.set(value=round(process_uptime(), 3)))
+
+    if db is not None:
+        with app.app_context():
+            engines = dict(db.engines)
+
+        def collect_pool_usage():
+            for bind, engine in engines.items():
+                pool = engine.pool
+                if not hasattr(pool, 'checkedout'):
+                    continue
+                bind = bind or 'default'
+                DB_POOL.set(bind, 'size', value=pool.size())
+                DB_POOL.set(bind, 'checked_out', value=pool.checkedout())
+                DB_POOL.set(bind, 'idle', value=pool.checkedin())
+                # QueuePool reports overflow as negative while below its size
+                DB_POOL.set(bind, 'overflow', value=max(pool.overflow(), 0))
+
+        registry.add_collector(collect_pool_usage)
+
+    @app.before_request
+    def start_request_metrics():
+        registry.ensure_flusher()
+        g.metrics_started = time.perf_counter()
+        g.metrics_in_flight = True
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_started' in g:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            labels = (request.method, route, str(response.status_code))
+            REQUESTS.inc(*labels)
+            REQUEST_DURATION.observe(*labels, value=time.perf_counter() - g.metrics_started)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        if g.pop('metrics_in_flight', False):
+            IN_FLIGHT.dec()
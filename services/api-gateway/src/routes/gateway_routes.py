@@ -1,29 +1,63 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g, Response
 import requests
+import time
+from urllib.parse import urlparse
 from flask import current_app
 
+from logging_utils import request_id_headers
+from metrics import observe_upstream
+from tracing import start_span, traceparent_headers
+
 gateway_bp = Blueprint('gateway', __name__)
 
-def proxy_request(service_url, path, method='GET', data=None, params=None):
+# Upstream response headers that are part of the services' API contract
+FORWARDED_HEADERS = ('Idempotent-Replayed', 'Retry-After', 'Location', 'Preference-Applied')
+
+def gateway_location(location):
+    """Upstream Location as a URL on the gateway, whose /api routes mirror the services' paths"""
+    parsed = urlparse(location)
+    if not parsed.path.startswith('/api/'):
+        return location
+    return request.script_root + parsed.path + (f'?{parsed.query}' if parsed.query else '')
+
+@gateway_bp.after_request
+def forward_upstream_headers(response):
+    """Copy the forwarded headers of the proxied response onto the gateway response"""
+    for name, value in g.pop('upstream_headers', {}).items():
+        response.headers[name] = gateway_location(value) if name == 'Location' else value
+    return response
+
+def proxy_request(service_url, path, method='GET', data=None, params=None, headers=None):
     """Proxy request to a microservice"""
+    started = time.perf_counter()
+    status = 'error'
+    upstream = urlparse(service_url).netloc
     try:
         url = f"{service_url}{path}"
         timeout = current_app.config.get('REQUEST_TIMEOUT', 30)
         
-        if method == 'GET':
-            response = requests.get(url, params=params, timeout=timeout)
-        elif method == 'POST':
-            response = requests.post(url, json=data, timeout=timeout)
-        elif method == 'PUT':
-            response = requests.put(url, json=data, timeout=timeout)
-        elif method == 'PATCH':
-            response = requests.patch(url, json=data, timeout=timeout)
-        elif method == 'DELETE':
-            response = requests.delete(url, timeout=timeout)
-        else:
-            return jsonify({'success': False, 'message': 'Method not allowed'}), 405
-        
-        return response.json(), response.status_code
+        with start_span(f'{method} {upstream}', kind='client', **{'peer.service': upstream, 'http.target': path}) as span:
+            headers = {**request_id_headers(), **traceparent_headers(), **(headers or {})}
+            if method == 'GET':
+                response = requests.get(url, params=params, headers=headers, timeout=timeout)
+            elif method == 'POST':
+                response = requests.post(url, json=data, headers=headers, timeout=timeout)
+            elif method == 'PUT':
+                response = requests.put(url, json=data, headers=headers, timeout=timeout)
+            elif method == 'PATCH':
+                response = requests.patch(url, json=data, headers=headers, timeout=timeout)
+            elif method == 'DELETE':
+                response = requests.delete(url, headers=headers, timeout=timeout)
+            else:
+                return jsonify({'success': False, 'message': 'Method not allowed'}), 405
+            
+            status = response.status_code
+            g.upstream_headers = {
+                name: response.headers[name] for name in FORWARDED_HEADERS if name in response.headers
+            }
+            if span is not None:
+                span.set_attribute('http.status_code', status)
+            return response.json(), response.status_code
         
     except requests.RequestException as e:
         return {
@@ -31,6 +65,57 @@ def proxy_request(service_url, path, method='GET', data=None, params=None):
             'message': 'Service unavailable',
             'error': str(e)
         }, 503
+    finally:
+        observe_upstream(upstream, status, time.perf_counter() - started)
+
+# Exports and bulk imports can be large: their bodies are streamed through, not parsed
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAMED_HEADERS = ('Content-Type', 'Content-Disposition')
+
+def iter_request_body():
+    while True:
+        chunk = request.stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def stream_request(service_url, path, method='GET', params=None, data=None, headers=None):
+    """Proxy a request to a microservice, streaming the response body back unparsed"""
+    started = time.perf_counter()
+    status = 'error'
+    upstream = urlparse(service_url).netloc
+    try:
+        url = f"{service_url}{path}"
+        timeout = current_app.config.get('REQUEST_TIMEOUT', 30)
+        
+        with start_span(f'{method} {upstream}', kind='client', **{'peer.service': upstream, 'http.target': path}) as span:
+            headers = {**request_id_headers(), **traceparent_headers(), **(headers or {})}
+            response = requests.request(
+                method, url, params=params, data=data, headers=headers, timeout=timeout, stream=True
+            )
+            status = response.status_code
+            if span is not None:
+                span.set_attribute('http.status_code', status)
+    except requests.RequestException as e:
+        return jsonify({
+            'success': False,
+            'message': 'Service unavailable',
+            'error': str(e)
+        }), 503
+    finally:
+        observe_upstream(upstream, status, time.perf_counter() - started)
+    
+    def generate():
+        try:
+            yield from response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        finally:
+            response.close()
+    
+    return Response(
+        generate(),
+        status=response.status_code,
+        headers={name: response.headers[name] for name in STREAMED_HEADERS if name in response.headers}
+    )
 
 # Menu Service Routes
 @gateway_bp.route('/menu', methods=['GET'])
@@ -51,17 +136,63 @@ def get_available_menu_items():
     response_data, status_code = proxy_request(
         current_app.config['MENU_SERVICE_URL'],
         '/api/menu/available',
-        method='GET'
+        method='GET',
+        params=request.args
+    )
+    return jsonify(response_data), status_code
+
+@gateway_bp.route('/menu/changes', methods=['GET'])
+def get_menu_changes():
+    """Get menu changes since a version"""
+    response_data, status_code = proxy_request(
+        current_app.config['MENU_SERVICE_URL'],
+        '/api/menu/changes',
+        method='GET',
+        params=request.args
+    )
+    return jsonify(response_data), status_code
+
+@gateway_bp.route('/menu/availability', methods=['PATCH'])
+def update_menu_availability():
+    """Bulk update menu item availability"""
+    response_data, status_code = proxy_request(
+        current_app.config['MENU_SERVICE_URL'],
+        '/api/menu/availability',
+        method='PATCH',
+        data=request.json
     )
     return jsonify(response_data), status_code
 
+@gateway_bp.route('/menu/export', methods=['GET'])
+def export_menu_items():
+    """Export menu items as NDJSON or CSV"""
+    return stream_request(
+        current_app.config['MENU_SERVICE_URL'],
+        '/api/menu/export',
+        method='GET',
+        params=request.args
+    )
+
+@gateway_bp.route('/menu/bulk', methods=['POST'])
+def bulk_import_menu_items():
+    """Import menu items from an NDJSON or CSV body"""
+    return stream_request(
+        current_app.config['MENU_SERVICE_URL'],
+        '/api/menu/bulk',
+        method='POST',
+        params=request.args,
+        data=iter_request_body(),
+        headers={'Content-Type': request.content_type} if request.content_type else None
+    )
+
 @gateway_bp.route('/menu/<menu_id>', methods=['GET'])
 def get_menu_item(menu_id):
     """Get specific menu item"""
     response_data, status_code = proxy_request(
         current_app.config['MENU_SERVICE_URL'],
         f'/api/menu/{menu_id}',
-        method='GET'
+        method='GET',
+        params=request.args
     )
     return jsonify(response_data), status_code
 
@@ -109,27 +240,76 @@ def get_orders():
     )
     return jsonify(response_data), status_code
 
+@gateway_bp.route('/orders/export', methods=['GET'])
+def export_orders():
+    """Export orders as NDJSON or CSV"""
+    return stream_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        '/api/orders/export',
+        method='GET',
+        params=request.args
+    )
+
 @gateway_bp.route('/orders/<order_id>', methods=['GET'])
 def get_order(order_id):
     """Get specific order"""
     response_data, status_code = proxy_request(
         current_app.config['ORDER_SERVICE_URL'],
         f'/api/orders/{order_id}',
-        method='GET'
+        method='GET',
+        params=request.args
     )
     return jsonify(response_data), status_code
 
 @gateway_bp.route('/orders', methods=['POST'])
 def create_order():
     """Create new order"""
+    headers = {
+        name: request.headers[name]
+        for name in ('Idempotency-Key', 'Prefer')
+        if request.headers.get(name)
+    }
     response_data, status_code = proxy_request(
         current_app.config['ORDER_SERVICE_URL'],
         '/api/orders',
         method='POST',
+        data=request.json,
+        headers=headers
+    )
+    return jsonify(response_data), status_code
+
+@gateway_bp.route('/orders/prep-list', methods=['GET'])
+def get_prep_list():
+    """Get kitchen prep list"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        '/api/orders/prep-list',
+        method='GET',
+        params=request.args
+    )
+    return jsonify(response_data), status_code
+
+@gateway_bp.route('/orders/status', methods=['PUT'])
+def update_orders_status():
+    """Update the status of several orders at once"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        '/api/orders/status',
+        method='PUT',
         data=request.json
     )
     return jsonify(response_data), status_code
 
+@gateway_bp.route('/orders/<order_id>/processing', methods=['GET'])
+def get_order_processing(order_id):
+    """Get processing state of an order accepted asynchronously"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        f'/api/orders/{order_id}/processing',
+        method='GET'
+    )
+    return jsonify(response_data), status_code
+
 @gateway_bp.route('/orders/<order_id>', methods=['PUT'])
 def update_order(order_id):
     """Update order"""
@@ -173,3 +353,37 @@ def cancel_order(order_id):
         data=request.json
     )
     return jsonify(response_data), status_code
+
+# Table Routes
+@gateway_bp.route('/tables/<int:table_number>/bill', methods=['GET'])
+def get_table_bill(table_number):
+    """Get open bill of a table"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        f'/api/tables/{table_number}/bill',
+        method='GET'
+    )
+    return jsonify(response_data), status_code
+
+@gateway_bp.route('/tables/<int:table_number>/pay', methods=['POST'])
+def pay_table(table_number):
+    """Pay all ready orders of a table"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        f'/api/tables/{table_number}/pay',
+        method='POST',
+        data=request.json
+    )
+    return jsonify(response_data), status_code
+
+# Reporting Routes
+@gateway_bp.route('/reports/<report_name>', methods=['GET'])
+def get_report(report_name):
+    """Get sales report (summary, sales, menu-items)"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        f'/api/reports/{report_name}',
+        method='GET',
+        params=request.args
+    )
+    return jsonify(response_data), status_code
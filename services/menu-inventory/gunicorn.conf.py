@@ -0,0 +1,71 @@
+"""Gunicorn settings for the menu inventory service.
+
+Run with: gunicorn --config gunicorn.conf.py wsgi:app
+
+Requests mostly wait on PostgreSQL, so a few threads per worker process keep
+the connection pool busy without oversubscribing it (threads <= pool size).
+The app is preloaded once in the master; every worker then gets fresh
+database connections and starts its own background threads (outbox relay,
+event consumers), which would not survive the fork otherwise.
+
+kill -HUP <master> restarts the workers gracefully; since the app is
+preloaded, deploying new code needs kill -USR2 (new master) then -QUIT on the
+old one. Workers are recycled after max_requests (+ jitter) requests.
+"""
+import multiprocessing
+import os
+import shutil
+
+_cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 3001)}"
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * _cpus + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Heartbeat files on tmpfs: a slow overlay filesystem must not get workers killed
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+# The app writes its own structured access log
+accesslog = None
+errorlog = '-'
+
+# The master only loads the app; background threads start in each worker
+_start_background_workers = os.environ.get('START_EVENT_WORKERS', 'true').lower() == 'true'
+os.environ['START_EVENT_WORKERS'] = 'false'
+os.environ.setdefault('METRICS_DIR', '/tmp/metrics-menu-inventory')
+
+
+def on_starting(server):
+    # Snapshots left by a previous run would be merged into /metrics
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
+
+
+def post_worker_init(worker):
+    from app import start_background_workers
+    from logging_utils import restart_log_listener
+    from models import db
+    from profiler import install_profile_signal
+
+    app = worker.wsgi
+    restart_log_listener(app)
+    # Connections inherited from the master would be shared between processes
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    # Gunicorn resets SIGUSR2 in the worker after post_fork
+    install_profile_signal(app)
+    if _start_background_workers:
+        start_background_workers(app)
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,71 @@
+"""
+Migration script to add the 'sold_out' column to menu_items
+
+'sold_out' marks items made unavailable by a reservation taking their last
+portions; only those become available again when stock is released.
+
+Usage:
+    python migrate_add_sold_out.py
+"""
+
+import psycopg2
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5432'),
+    'database': os.getenv('DB_NAME', 'menu_inventory_db'),
+    'user': os.getenv('DB_USER', 'menu_user'),
+    'password': os.getenv('DB_PASSWORD', 'menu_password')
+}
+
+
+def migrate():
+    """Add 'sold_out' column to menu_items"""
+    conn = None
+    cursor = None
+
+    try:
+        print(f"Connecting to database {DB_CONFIG['database']}...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        print("Adding 'sold_out' column to menu_items...")
+        cursor.execute("""
+            ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS sold_out BOOLEAN NOT NULL DEFAULT FALSE;
+        """)
+        # Unavailable items out of stock were, until now, re-enabled by a release
+        cursor.execute("""
+            UPDATE menu_items SET sold_out = TRUE
+            WHERE is_available = FALSE AND stock_quantity <= 0;
+        """)
+
+        conn.commit()
+        print("✓ Migration completed successfully!")
+
+    except psycopg2.Error as e:
+        print(f"✗ Database error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print("Database connection closed.")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Menu Migration: Adding 'sold_out' column")
+    print("=" * 60)
+
+    try:
+        migrate()
+        print("\n✓ Migration process completed!")
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        exit(1)
@@ -0,0 +1,66 @@
+"""
+Migration script to add the 'stock_quantity' column to menu_items
+
+Stock is optional: NULL means the item is not stock-tracked and only
+'is_available' is checked when an order reserves it.
+
+Usage:
+    python migrate_add_stock_quantity.py
+"""
+
+import psycopg2
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5432'),
+    'database': os.getenv('DB_NAME', 'menu_inventory_db'),
+    'user': os.getenv('DB_USER', 'menu_user'),
+    'password': os.getenv('DB_PASSWORD', 'menu_password')
+}
+
+
+def migrate():
+    """Add 'stock_quantity' column to menu_items"""
+    conn = None
+    cursor = None
+
+    try:
+        print(f"Connecting to database {DB_CONFIG['database']}...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        print("Adding 'stock_quantity' column to menu_items...")
+        cursor.execute("""
+            ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS stock_quantity INTEGER;
+        """)
+
+        conn.commit()
+        print("✓ Migration completed successfully!")
+
+    except psycopg2.Error as e:
+        print(f"✗ Database error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print("Database connection closed.")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Menu Migration: Adding 'stock_quantity' column")
+    print("=" * 60)
+
+    try:
+        migrate()
+        print("\n✓ Migration process completed!")
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        exit(1)
@@ -2,19 +2,35 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from datetime import datetime
 import os
-import time
 
 from config import config
+from json_provider import FastJSONProvider
+from logging_utils import init_logging
+from metrics import init_metrics, metrics_response, process_uptime
+from profiler import init_profiler
+from tracing import init_tracing
 from models import db
+from db_routing import init_read_replicas
+from sql_instrumentation import init_sql_instrumentation
+from schema import ensure_schema
 from routes.menu_routes import menu_bp
+from outbox import init_events, start_event_workers
+from event_handlers import EVENT_HANDLERS
 
 
 def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = FastJSONProvider(app)
+    init_logging(app, 'menu-service')
 
     # Initialize extensions
     db.init_app(app)
+    init_read_replicas(app, db)
+    init_sql_instrumentation(app, db)
+    init_metrics(app, db)
+    init_profiler(app)
+    init_tracing(app, 'menu-service')
     CORS(app)
 
     # Register blueprints
@@ -27,9 +43,14 @@ def create_app(config_name='default'):
             'status': 'healthy',
             'service': 'menu-service',
             'timestamp': datetime.utcnow().isoformat(),
-            'uptime': time.process_time()
+            'uptime': round(process_uptime(), 3)
         })
 
+    # Metrics endpoint (Prometheus text format)
+    @app.route('/metrics')
+    def metrics():
+        return metrics_response()
+
     # API Overview endpoint
     @app.route('/api')
     def api_overview():
@@ -38,12 +59,18 @@ def create_app(config_name='default'):
             'version': '1.0.0',
             'endpoints': {
                 'menu': {
-                    'GET /api/menu/': 'Get all menu items',
+                    'GET /api/menu/': 'Get all menu items (?fields=id,name,... to select fields)',
                     'POST /api/menu/': 'Create menu item',
                     'GET /api/menu/{id}': 'Get menu item by ID',
                     'PUT /api/menu/{id}': 'Update menu item',
                     'DELETE /api/menu/{id}': 'Delete menu item',
-                    'GET /api/menu/available': 'Get available menu items'
+                    'GET /api/menu/available': 'Get available menu items',
+                    'PATCH /api/menu/availability': 'Set availability for many items by ids or filter (category, allergen)',
+                    'POST /api/menu/bulk': 'Bulk import menu items from NDJSON or CSV (upsert by name)',
+                    'GET /api/menu/export': 'Stream all menu items as NDJSON or CSV (?format=)',
+                    'GET /api/menu/changes?since={version}': 'Get menu changes since a version',
+                    'POST /api/menu/reservations': 'Atomically reserve stock for order items',
+                    'POST /api/menu/reservations/release': 'Release previously reserved stock'
                 }
             }
         })
@@ -71,24 +98,47 @@ def create_app(config_name='default'):
             'message': 'Bad request'
         }), 400
 
-    # Initialize database
+    # CLI commands (run with: flask --app "app:create_app('production')" <command>)
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables and record the schema version"""
+        if ensure_schema():
+            print("✅ Database schema created/updated")
+        else:
+            print("✅ Database schema already up to date")
+
+    @app.cli.command('seed')
+    def seed_command():
+        """Add sample menu items if the menu is empty"""
+        from models import MenuItem
+        ensure_schema()
+        if MenuItem.query.count() == 0:
+            add_sample_data()
+            print("✅ Sample data added successfully")
+        else:
+            print("ℹ️ Menu is not empty, skipping sample data")
+
+    # Initialize database (DDL only runs when the schema version changed)
     with app.app_context():
         try:
-            db.create_all()
-            print("✅ Database tables created successfully")
-
-            # Add some sample data if tables are empty
-            from models import MenuItem
-            if MenuItem.query.count() == 0:
-                add_sample_data()
-                print("✅ Sample data added successfully")
-
+            if ensure_schema():
+                print("✅ Database tables created successfully")
         except Exception as e:
             print(f"❌ Error creating database tables: {str(e)}")
 
+    # Events: the outbox relay and the broker consumers run as background threads
+    init_events(app, 'menu-inventory', EVENT_HANDLERS)
+    if app.config.get('START_EVENT_WORKERS'):
+        start_background_workers(app)
+
     return app
 
 
+def start_background_workers(app):
+    """Start the outbox relay and event consumer threads of this process"""
+    start_event_workers(app)
+
+
 def add_sample_data():
     """Add some sample menu items for testing"""
     from models import MenuItem
@@ -16,6 +16,53 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read replicas (comma separated URLs): read-only endpoints use them while they are in sync
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    SQLALCHEMY_BINDS = {f'replica_{index}': url for index, url in enumerate(DATABASE_REPLICA_URLS)}
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 1.0))
+    REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 5.0))
+    
+    # Bulk import/export
+    BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', 500))
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+    
+    # Menu change feed
+    MENU_CHANGE_RETENTION = int(os.environ.get('MENU_CHANGE_RETENTION', 1000))  # versions kept in the log
+    MENU_CHANGE_COMPACT_EVERY = int(os.environ.get('MENU_CHANGE_COMPACT_EVERY', 100))
+    
+    # Events (transactional outbox + message broker)
+    EVENT_BROKER_URL = os.environ.get('EVENT_BROKER_URL', 'memory://')  # memory://, sqlite:///path, amqp://...
+    START_EVENT_WORKERS = os.environ.get('START_EVENT_WORKERS', 'true').lower() == 'true'
+    OUTBOX_RELAY_ENABLED = os.environ.get('OUTBOX_RELAY_ENABLED', 'true').lower() == 'true'
+    OUTBOX_RELAY_INTERVAL_SECONDS = float(os.environ.get('OUTBOX_RELAY_INTERVAL_SECONDS', 1.0))
+    OUTBOX_RELAY_BATCH_SIZE = int(os.environ.get('OUTBOX_RELAY_BATCH_SIZE', 100))
+    OUTBOX_RETENTION_HOURS = int(os.environ.get('OUTBOX_RETENTION_HOURS', 24))
+    EVENT_CONSUMERS_ENABLED = os.environ.get('EVENT_CONSUMERS_ENABLED', 'true').lower() == 'true'
+    
+    # Logging: JSON lines written by a background thread (see logging_utils)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', 'werkzeug=WARNING')  # e.g. 'routes.order_routes=DEBUG'
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')  # e.g. 'access=0.1' keeps 10% of successful requests
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json or text
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # Metrics: with several worker processes, a directory shared by them so /metrics covers all workers
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    # Admin endpoints (/admin/profile) exist only when ADMIN_TOKEN is set
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    # Sampling profiler (profiler.py): collapsed stacks are written to PROFILE_DIR
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/profiles')
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 300))
+    PROFILE_SIGNAL_SECONDS = float(os.environ.get('PROFILE_SIGNAL_SECONDS', 30))
+    # Tracing: TRACE_EXPORTER is '' (propagate only), 'memory' or 'file' (JSON lines in TRACE_FILE)
+    TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', '')
+    TRACE_FILE = os.environ.get('TRACE_FILE', '/tmp/traces/{service}.jsonl')
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 1.0))
+    TRACE_MEMORY_SPANS = int(os.environ.get('TRACE_MEMORY_SPANS', 10000))
+    # Statements slower than this are logged on the 'sql.slow' logger
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    
     # Flask settings
     PORT = int(os.environ.get('PORT', 3001))
     DEBUG = os.environ.get('FLASK_ENV') == 'development'
@@ -36,6 +83,8 @@ class TestConfig(Config):
     """Test configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_BINDS = {}
+    START_EVENT_WORKERS = False
 
 config = {
     'development': DevelopmentConfig,
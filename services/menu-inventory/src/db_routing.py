@@ -0,0 +1,129 @@
+"""Read-replica routing.
+
+Replicas are configured as SQLAlchemy binds named replica_<n>. Views
+decorated with read_only() send their SELECTs to a replica; everything else,
+and any statement that writes or runs during a flush, goes to the primary.
+A replica is only used while its replication lag is within
+REPLICA_MAX_LAG_SECONDS (checked at most every REPLICA_LAG_CHECK_SECONDS),
+otherwise reads fall back to the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import g, current_app, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+logger = logging.getLogger(__name__)
+
+# Zero while the replica has replayed everything it received, so an idle primary is not mistaken for lag
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def is_read(clause):
+    if clause is None:
+        return True
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().upper().startswith('SELECT')
+    # SELECT ... FOR UPDATE locks rows on the primary
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of read-only requests to an in-sync replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('read_replica'):
+            if self._flushing or not is_read(clause):
+                # Once the request writes, it keeps reading its own writes from the primary
+                g.read_replica = False
+            else:
+                engine = choose_replica(self._db)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaPool:
+    """Round-robin over the replicas whose last measured lag was acceptable"""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.healthy = []
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self._next = itertools.count()
+
+    def refresh(self, db, max_lag):
+        healthy = []
+        for key in self.keys:
+            lag = replica_lag(db.engines[key])
+            if lag is not None and lag <= max_lag:
+                healthy.append(key)
+            else:
+                logger.warning('Replica %s skipped (lag: %s)', key, 'unreachable' if lag is None else f'{lag:.1f}s')
+        self.healthy = healthy
+        self.checked_at = time.monotonic()
+
+    def choose(self, db, max_lag, check_interval):
+        if time.monotonic() - self.checked_at >= check_interval and self.lock.acquire(blocking=False):
+            try:
+                self.refresh(db, max_lag)
+            finally:
+                self.lock.release()
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return db.engines[healthy[next(self._next) % len(healthy)]]
+
+
+def replica_lag(engine):
+    """Replication lag in seconds, or None if the replica cannot be reached"""
+    try:
+        with engine.connect() as connection:
+            if engine.dialect.name != 'postgresql':
+                return 0.0
+            return float(connection.execute(REPLICA_LAG_SQL).scalar() or 0)
+    except Exception as e:
+        logger.warning('Could not check replica lag: %s', e)
+        return None
+
+
+def init_read_replicas(app, db):
+    keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith(REPLICA_BIND_PREFIX))
+    app.extensions['read_replicas'] = ReplicaPool(keys)
+    if keys:
+        print(f"✅ Read-only endpoints use {len(keys)} replica(s)")
+
+
+def choose_replica(db):
+    if not has_app_context():
+        return None
+    pool = current_app.extensions.get('read_replicas')
+    if pool is None or not pool.keys:
+        return None
+    return pool.choose(
+        db,
+        current_app.config.get('REPLICA_MAX_LAG_SECONDS', 1.0),
+        current_app.config.get('REPLICA_LAG_CHECK_SECONDS', 5.0)
+    )
+
+
+def read_only(view):
+    """Serve a view's reads from a replica when one is in sync with the primary"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,24 @@
+"""Handlers for events consumed by the menu service"""
+import logging
+
+from outbox import mark_event_processed
+from routes.menu_routes import aggregate_reservation, release_stock
+
+logger = logging.getLogger(__name__)
+
+
+def handle_order_status_changed(event):
+    """Give back the stock reserved by an order when it is cancelled"""
+    payload = event['payload']
+    if payload.get('status') != 'cancelled' or not payload.get('items'):
+        return
+    # Redelivered events must not release the same stock twice
+    if not mark_event_processed(event['event_id']):
+        return
+    release_stock(aggregate_reservation(payload['items']))
+    logger.info('Released stock for cancelled order %s', payload['order_id'])
+
+
+EVENT_HANDLERS = {
+    'order.status_changed': handle_order_status_changed
+}
@@ -1,10 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import uuid
-import json
 
+from json_provider import json_dumps, json_loads
+from db_routing import RoutingSession
+from serialization import serialize_menu_item, serialize_menu_change
 
-db = SQLAlchemy()
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class MenuItem(db.Model):
@@ -17,22 +20,138 @@ class MenuItem(db.Model):
     category = db.Column(db.String(20), nullable=False)
     is_available = db.Column(db.Boolean, default=True)
     preparation_time = db.Column(db.Integer, nullable=False)
+    stock_quantity = db.Column(db.Integer)  # Portions left, NULL means not tracked
+    # Made unavailable by a reservation taking the last portions (not by a manager)
+    sold_out = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     allergens = db.Column(db.Text)  # Stored as JSON string
     nutritional_info = db.Column(db.Text)  # Stored as JSON string
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'price': float(self.price) if self.price else 0,
-            'category': self.category,
-            'is_available': self.is_available,
-            'preparation_time': self.preparation_time,
-            'allergens': json.loads(self.allergens) if self.allergens else [],
-            'nutritional_info': json.loads(self.nutritional_info) if self.nutritional_info else {},
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        return serialize_menu_item(self)
+
+
+class MenuVersion(db.Model):
+    """Single-row counter bumped on every menu change"""
+    __tablename__ = 'menu_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    # Changes at or below this version have been compacted out of the log
+    compacted_version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class MenuChange(db.Model):
+    """Change log entry; only the latest entry per menu item is kept"""
+    __tablename__ = 'menu_changes'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    version = db.Column(db.BigInteger, nullable=False, index=True)
+    menu_item_id = db.Column(db.String(36), nullable=False, index=True)
+    change_type = db.Column(db.String(20), nullable=False)  # create, update, delete, availability
+    data = db.Column(db.Text)  # Item snapshot stored as JSON string, NULL for deletes
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return serialize_menu_change(self)
+
+
+def bump_menu_version():
+    """Increment the menu version inside the current transaction and return it"""
+    result = db.session.execute(
+        db.update(MenuVersion).where(MenuVersion.id == 1).values(version=MenuVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(MenuVersion(id=1, version=1, compacted_version=0))
+        db.session.flush()
+        return 1
+    return db.session.execute(db.select(MenuVersion.version).where(MenuVersion.id == 1)).scalar_one()
+
+
+def get_menu_version():
+    """Return (version, compacted_version) of the menu change log"""
+    row = db.session.execute(
+        db.select(MenuVersion.version, MenuVersion.compacted_version).where(MenuVersion.id == 1)
+    ).first()
+    return (row.version, row.compacted_version) if row else (0, 0)
+
+
+def record_menu_changes(changes, retention=1000, compact_every=100):
+    """Log a list of (change_type, menu_item_id, item_dict) under one new version.
+
+    Runs in the caller's transaction. Older entries for the same items are
+    superseded and removed, and every `compact_every` versions entries older
+    than `retention` versions are dropped so the log stays bounded.
+    """
+    version = bump_menu_version()
+    if not changes:
+        return version
+
+    # Keep only the last change per item within this version
+    changes = list({menu_item_id: (change_type, menu_item_id, item)
+                    for change_type, menu_item_id, item in changes}.values())
+    menu_item_ids = [menu_item_id for _, menu_item_id, _ in changes]
+    db.session.execute(
+        db.delete(MenuChange).where(MenuChange.menu_item_id.in_(menu_item_ids))
+    )
+    db.session.execute(db.insert(MenuChange), [
+        {
+            'version': version,
+            'menu_item_id': menu_item_id,
+            'change_type': change_type,
+            'data': json_dumps(item) if item is not None else None,
+            'created_at': datetime.utcnow()
         }
+        for change_type, menu_item_id, item in changes
+    ])
+
+    floor = version - retention
+    if floor > 0 and version % compact_every == 0:
+        db.session.execute(db.delete(MenuChange).where(MenuChange.version <= floor))
+        db.session.execute(
+            db.update(MenuVersion)
+            .where(MenuVersion.id == 1, MenuVersion.compacted_version < floor)
+            .values(compacted_version=floor)
+        )
+
+    return version
+
+
+class SchemaMetadata(db.Model):
+    """Key/value metadata about the database itself (e.g. applied schema version)"""
+    __tablename__ = 'schema_metadata'
+
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(100))
+
+
+class OutboxEvent(db.Model):
+    """Event written with the business change, published later by the outbox relay"""
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event_id = db.Column(db.String(36), unique=True, nullable=False)
+    event_type = db.Column(db.String(100), nullable=False)
+    aggregate_id = db.Column(db.String(36), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # Stored as JSON string
+    created_at = db.Column(db.DateTime, nullable=False)
+    published_at = db.Column(db.DateTime, index=True)
+
+    def envelope(self):
+        """Message body sent to the broker"""
+        return json_dumps({
+            'event_id': self.event_id,
+            'event_type': self.event_type,
+            'aggregate_id': self.aggregate_id,
+            'occurred_at': self.created_at.isoformat(),
+            'payload': json_loads(self.payload)
+        })
+
+
+class ProcessedEvent(db.Model):
+    """Ids of consumed events, used to make handlers idempotent"""
+    __tablename__ = 'processed_events'
+
+    event_id = db.Column(db.String(36), primary_key=True)
+    processed_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,297 @@
+"""On-demand sampling profiler.
+
+A profile covers either the next N seconds or the next N requests whose path
+(or route template) matches a glob, whichever ends first. While it runs, a
+background thread samples the stacks of the threads serving the profiled
+requests every PROFILE_INTERVAL_MS; when it ends the stacks are written as
+collapsed stacks (flamegraph.pl / speedscope input) to PROFILE_DIR and
+per-endpoint aggregates are logged. When no profile runs the only cost is one
+attribute check per request.
+
+Start one with POST /admin/profile (X-Admin-Token must match ADMIN_TOKEN; the
+endpoint does not exist when ADMIN_TOKEN is unset) or by sending SIGUSR2 to
+the process, which profiles every request for PROFILE_SIGNAL_SECONDS.
+"""
+from collections import Counter
+from fnmatch import fnmatch
+import hmac
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from flask import g, request, current_app, jsonify, Response
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+MAX_STACK_DEPTH = 128
+TOP_FUNCTIONS = 10
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileRequestSchema(Schema):
+    seconds = fields.Float(validate=validate.Range(min=0.1))
+    requests = fields.Int(validate=validate.Range(min=1, max=10000))
+    route = fields.Str(validate=validate.Length(min=1, max=200))
+    interval_ms = fields.Float(validate=validate.Range(min=1, max=1000))
+
+    @validates_schema
+    def validate_limit(self, data, **kwargs):
+        if 'seconds' not in data and 'requests' not in data:
+            raise ValidationError('Give seconds, requests or both')
+
+
+def frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        self._threads = {}
+        self.settings = {}
+        self.stacks = Counter()
+        self.endpoints = {}
+        self.started_at = None
+        self.finished_at = None
+        self.output_path = None
+
+    def start(self, seconds=None, requests=None, route=None, interval_ms=5.0, max_seconds=300.0,
+              output_dir=None, trigger='api'):
+        with self._lock:
+            if self.active:
+                raise RuntimeError('A profile is already running')
+            seconds = min(seconds or max_seconds, max_seconds)
+            self.settings = {
+                'seconds': seconds, 'requests': requests, 'route': route,
+                'interval_ms': interval_ms, 'trigger': trigger
+            }
+            self.stacks = Counter()
+            self.endpoints = {}
+            self.started_at = time.time()
+            self.finished_at = None
+            self.output_path = None
+            self._output_dir = output_dir
+            self._deadline = time.monotonic() + seconds
+            self._remaining = requests
+            self.active = True
+        threading.Thread(target=self._run, name='profiler', daemon=True).start()
+
+    def stop(self):
+        with self._lock:
+            if not self.active:
+                return False
+            self.active = False
+            self.finished_at = time.time()
+        self._write_output()
+        logger.info('Profile finished', extra={'profile': self.report()})
+        return True
+
+    def claim(self, path, rule):
+        """True if this request is to be profiled (counts against the request limit)"""
+        route = self.settings.get('route')
+        if route and not (fnmatch(path, route) or (rule and fnmatch(rule, route))):
+            return False
+        with self._lock:
+            if not self.active or self._remaining == 0:
+                return False
+            if self._remaining is not None:
+                self._remaining -= 1
+            return True
+
+    def begin(self, label):
+        self._threads[threading.get_ident()] = label
+
+    def end(self, label, duration):
+        self._threads.pop(threading.get_ident(), None)
+        with self._lock:
+            stats = self._endpoint(label)
+            stats['requests'] += 1
+            stats['total_ms'] += duration * 1000
+            stats['max_ms'] = max(stats['max_ms'], duration * 1000)
+
+    def _endpoint(self, label):
+        stats = self.endpoints.get(label)
+        if stats is None:
+            stats = self.endpoints[label] = {
+                'requests': 0, 'samples': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'self': Counter()
+            }
+        return stats
+
+    def _run(self):
+        interval = self.settings['interval_ms'] / 1000
+        while self.active:
+            if time.monotonic() >= self._deadline or (self._remaining == 0 and not self._threads):
+                self.stop()
+                return
+            self._sample()
+            time.sleep(interval)
+
+    def _sample(self):
+        threads = dict(self._threads)
+        if not threads:
+            return
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, label in threads.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                stack.reverse()
+                self.stacks[(label, *stack)] += 1
+                stats = self._endpoint(label)
+                stats['samples'] += 1
+                stats['self'][stack[-1]] += 1
+
+    def collapsed(self):
+        with self._lock:
+            return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def report(self):
+        with self._lock:
+            endpoints = {
+                label: {
+                    'requests': stats['requests'],
+                    'samples': stats['samples'],
+                    'avg_ms': round(stats['total_ms'] / stats['requests'], 2) if stats['requests'] else None,
+                    'max_ms': round(stats['max_ms'], 2),
+                    'top_functions': [
+                        {'function': function, 'samples': count}
+                        for function, count in stats['self'].most_common(TOP_FUNCTIONS)
+                    ]
+                }
+                for label, stats in self.endpoints.items()
+            }
+            samples = sum(self.stacks.values())
+        return {
+            'active': self.active,
+            'settings': self.settings,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'samples': samples,
+            'output_path': self.output_path,
+            'endpoints': endpoints
+        }
+
+    def _write_output(self):
+        if not self._output_dir or not self.stacks:
+            return
+        try:
+            os.makedirs(self._output_dir, exist_ok=True)
+            path = os.path.join(
+                self._output_dir, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+            )
+            with open(path, 'w') as f:
+                f.write(self.collapsed())
+            self.output_path = path
+        except OSError as e:
+            logger.warning('Could not write profile: %s', e)
+
+
+profiler = SamplingProfiler()
+
+
+def profile_settings(config):
+    return {
+        'interval_ms': config.get('PROFILE_INTERVAL_MS', 5.0),
+        'max_seconds': config.get('PROFILE_MAX_SECONDS', 300.0),
+        'output_dir': config.get('PROFILE_DIR') or None
+    }
+
+
+def install_profile_signal(app):
+    """SIGUSR2 profiles every request for PROFILE_SIGNAL_SECONDS (main thread only)"""
+    if not hasattr(signal, 'SIGUSR2') or threading.current_thread() is not threading.main_thread():
+        return
+    settings = profile_settings(app.config)
+    seconds = app.config.get('PROFILE_SIGNAL_SECONDS', 30.0)
+
+    def handle_signal(signum, frame):
+        if not profiler.active:
+            # The sampler thread is started outside the handler's interrupted frame
+            threading.Thread(
+                target=profiler.start, kwargs={'seconds': seconds, 'trigger': 'signal', **settings}, daemon=True
+            ).start()
+
+    signal.signal(signal.SIGUSR2, handle_signal)
+
+
+def init_profiler(app):
+    @app.before_request
+    def start_request_profile():
+        if not profiler.active or request.path.startswith('/admin/'):
+            return
+        rule = request.url_rule.rule if request.url_rule else None
+        if profiler.claim(request.path, rule):
+            g.profile_label = f'{request.method} {rule or "unmatched"}'
+            g.profile_started = time.perf_counter()
+            profiler.begin(g.profile_label)
+
+    @app.teardown_request
+    def finish_request_profile(exc):
+        label = g.pop('profile_label', None)
+        if label is not None:
+            profiler.end(label, time.perf_counter() - g.profile_started)
+
+    install_profile_signal(app)
+
+    if app.config.get('ADMIN_TOKEN'):
+        app.add_url_rule('/admin/profile', 'admin_profile', admin_profile, methods=['GET', 'POST', 'DELETE'])
+
+
+def admin_profile():
+    token = request.headers.get(ADMIN_TOKEN_HEADER, '')
+    if not hmac.compare_digest(token.encode(), current_app.config['ADMIN_TOKEN'].encode()):
+        return jsonify({
+            'success': False,
+            'message': 'Invalid admin token'
+        }), 403
+
+    if request.method == 'GET':
+        if request.args.get('format') == 'collapsed':
+            return Response(profiler.collapsed(), content_type='text/plain; charset=utf-8')
+        return jsonify({
+            'success': True,
+            'data': profiler.report()
+        })
+
+    if request.method == 'DELETE':
+        stopped = profiler.stop()
+        return jsonify({
+            'success': True,
+            'message': 'Profile stopped' if stopped else 'No profile was running',
+            'data': profiler.report()
+        })
+
+    try:
+        data = ProfileRequestSchema().load(request.json or {})
+    except ValidationError as err:
+        return jsonify({
+            'success': False,
+            'message': 'Validation error',
+            'errors': err.messages
+        }), 400
+    settings = profile_settings(current_app.config)
+    if 'interval_ms' in data:
+        settings['interval_ms'] = data.pop('interval_ms')
+    try:
+        profiler.start(**data, **settings)
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'data': profiler.report()
+        }), 409
+    return jsonify({
+        'success': True,
+        'message': 'Profile started',
+        'data': profiler.report()
+    }), 202
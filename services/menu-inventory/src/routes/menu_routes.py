@@ -1,12 +1,16 @@
-from flask import Blueprint, request, jsonify
-from models import db, MenuItem
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
+from models import db, MenuItem, MenuChange, record_menu_changes, get_menu_version
+from db_routing import read_only
+from serialization import serialize_menu_item, serialize_menu_change, parse_fields, project_row, MENU_ITEM_FIELDS
+from json_provider import json_dumps
+from outbox import add_outbox_event
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import inspect, text
-from marshmallow import Schema, fields, ValidationError
+from sqlalchemy import inspect, text, select, update, func, case, or_
+from marshmallow import Schema, fields, ValidationError, EXCLUDE
 import uuid
 import json
-import psycopg2
-import os
+import csv
+import io
 
 menu_bp = Blueprint('menu', __name__)
 
@@ -18,61 +22,103 @@ class MenuItemSchema(Schema):
     category = fields.Str(required=True, validate=lambda x: x in ['appetizer', 'main', 'dessert', 'beverage', 'side'])
     is_available = fields.Bool()
     preparation_time = fields.Int(required=True, validate=lambda x: x >= 1)
+    stock_quantity = fields.Int(allow_none=True, validate=lambda x: x >= 0)
     allergens = fields.List(fields.Str(), allow_none=True)
     nutritional_info = fields.Dict(allow_none=True)
 
 menu_item_schema = MenuItemSchema()
 menu_items_schema = MenuItemSchema(many=True)
 
-def get_db_connection():
-    """Get database connection using app config"""
-    from flask import current_app
-    config = current_app.config
-    
-    # Try to get connection info from Flask config first
-    try:
-        # Use the config values directly (these come from environment variables)
-        return psycopg2.connect(
-            host=config.get('DB_HOST', 'localhost'),
-            port=int(config.get('DB_PORT', '5432')),
-            database=config.get('DB_NAME', 'menu_inventory_db'),
-            user=config.get('DB_USER', 'menu_user'),
-            password=config.get('DB_PASSWORD', 'menu_password')
-        )
-    except Exception as e:
-        # Fallback to direct environment variables
-        print(f"Failed to connect using config, trying env vars: {e}")
-        return psycopg2.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            port=int(os.getenv('DB_PORT', '5432')),
-            database=os.getenv('DB_NAME', 'menu_inventory_db'),
-            user=os.getenv('DB_USER', 'menu_user'),
-            password=os.getenv('DB_PASSWORD', 'menu_password')
-        )
+class AvailabilityUpdateSchema(Schema):
+    is_available = fields.Bool(required=True)
+    ids = fields.List(fields.Str(), validate=lambda x: len(x) > 0)
+    category = fields.Str(validate=lambda x: x in ['appetizer', 'main', 'dessert', 'beverage', 'side'])
+    allergen = fields.Str(validate=lambda x: len(x) > 0)
+
+availability_update_schema = AvailabilityUpdateSchema()
+
+class ReservationItemSchema(Schema):
+    menu_item_id = fields.Str(required=True)
+    quantity = fields.Int(required=True, validate=lambda x: x > 0)
+
+    class Meta:
+        unknown = EXCLUDE
+
+class ReservationSchema(Schema):
+    items = fields.List(fields.Nested(ReservationItemSchema), required=True, validate=lambda x: len(x) > 0)
+
+reservation_schema = ReservationSchema()
+
+# Bulk imports may carry exported columns (id, timestamps) that are ignored
+menu_item_import_schema = MenuItemSchema(unknown=EXCLUDE)
+
+def select_menu_items(fields=None):
+    """SELECT over the menu item columns needed for the requested fields"""
+    if fields is None:
+        return select(MenuItem.__table__)
+    return select(*[MenuItem.__table__.c[field] for field in fields])
+
+def serialize_menu_rows(rows, fields=None):
+    if fields is None:
+        return [serialize_menu_item(row) for row in rows]
+    return [project_row(row, fields, MENU_ITEM_FIELDS) for row in rows]
+
+def fetch_menu_items(*conditions, order_by=(MenuItem.category, MenuItem.name), fields=None):
+    """Select menu item rows (no ORM objects) and serialize them"""
+    statement = select_menu_items(fields).where(*conditions).order_by(*order_by)
+    return serialize_menu_rows(db.session.execute(statement), fields)
+
+def invalid_fields_response(error):
+    return jsonify({
+        'success': False,
+        'message': 'Invalid fields parameter',
+        'error': str(error)
+    }), 400
+
+def log_menu_changes(changes):
+    """Record (change_type, menu_item_id, item_dict) entries in the menu change feed
+    and queue a menu.item.<change_type> event for each of them"""
+    version = record_menu_changes(
+        changes,
+        retention=current_app.config.get('MENU_CHANGE_RETENTION', 1000),
+        compact_every=current_app.config.get('MENU_CHANGE_COMPACT_EVERY', 100)
+    )
+    for change_type, menu_item_id, item in changes:
+        add_outbox_event(f'menu.item.{change_type}', menu_item_id, {
+            'menu_item_id': menu_item_id,
+            'version': version,
+            'item': item
+        })
+    return version
 
 @menu_bp.route('/', methods=['GET'])
+@read_only
 def get_all_menu_items():
     """Get all menu items with optional filtering"""
     try:
         # Get query parameters
         category = request.args.get('category')
         available = request.args.get('available')
+        try:
+            selected_fields = parse_fields(request.args.get('fields'), MENU_ITEM_FIELDS)
+        except ValueError as e:
+            return invalid_fields_response(e)
         
-        # Build query
-        query = MenuItem.query
+        # Build filters
+        conditions = []
         
         if category:
-            query = query.filter(MenuItem.category == category)
+            conditions.append(MenuItem.category == category)
         if available is not None:
             is_available = available.lower() == 'true'
-            query = query.filter(MenuItem.is_available == is_available)
+            conditions.append(MenuItem.is_available == is_available)
         
         # Execute query and order results
-        menu_items = query.order_by(MenuItem.category, MenuItem.name).all()
+        menu_items = fetch_menu_items(*conditions, fields=selected_fields)
         
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in menu_items],
+            'data': menu_items,
             'count': len(menu_items)
         })
         
@@ -84,14 +130,20 @@ def get_all_menu_items():
         }), 500
 
 @menu_bp.route('/available', methods=['GET'])
+@read_only
 def get_available_menu_items():
     """Get available menu items for ordering"""
     try:
-        menu_items = MenuItem.query.filter(MenuItem.is_available == True).all()
+        try:
+            selected_fields = parse_fields(request.args.get('fields'), MENU_ITEM_FIELDS)
+        except ValueError as e:
+            return invalid_fields_response(e)
+        
+        menu_items = fetch_menu_items(MenuItem.is_available == True, order_by=(), fields=selected_fields)
         
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in menu_items],
+            'data': menu_items,
             'count': len(menu_items)
         })
         
@@ -102,7 +154,63 @@ def get_available_menu_items():
             'error': str(e)
         }), 500
 
+@menu_bp.route('/availability', methods=['PATCH'])
+def update_menu_availability():
+    """Set is_available on many menu items at once (the "86 list")"""
+    try:
+        try:
+            data = availability_update_schema.load(request.json or {})
+        except ValidationError as err:
+            return jsonify({
+                'success': False,
+                'message': 'Validation error',
+                'errors': err.messages
+            }), 400
+
+        if not any(key in data for key in ('ids', 'category', 'allergen')):
+            return jsonify({
+                'success': False,
+                'message': 'Provide ids or a filter (category, allergen)'
+            }), 400
+
+        conditions = []
+        if 'ids' in data:
+            conditions.append(MenuItem.id.in_(data['ids']))
+        if 'category' in data:
+            conditions.append(MenuItem.category == data['category'])
+        if 'allergen' in data:
+            # Allergens are stored as a JSON list string; % and _ in the name are matched literally
+            conditions.append(MenuItem.allergens.contains(json.dumps(data['allergen']), autoescape=True))
+
+        result = db.session.execute(
+            update(MenuItem)
+            .where(*conditions)
+            .values(is_available=data['is_available'], sold_out=False, updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+        items_data = fetch_menu_items(*conditions)
+        version = log_menu_changes([('availability', item['id'], item) for item in items_data])
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': 'Menu availability updated successfully',
+            'updated': result.rowcount,
+            'version': version,
+            'data': items_data
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Error updating menu availability',
+            'error': str(e)
+        }), 500
+
 @menu_bp.route('/<string:menu_id>', methods=['GET'])
+@read_only
 def get_menu_item_by_id(menu_id):
     """Get menu item by ID"""
     try:
@@ -115,10 +223,14 @@ def get_menu_item_by_id(menu_id):
                 'message': 'Invalid menu item ID format'
             }), 400
         
-        # Check if the item exists using text() for explicit SQL
+        try:
+            selected_fields = parse_fields(request.args.get('fields'), MENU_ITEM_FIELDS)
+        except ValueError as e:
+            return invalid_fields_response(e)
+        
+        # Check if the item exists
         result = db.session.execute(
-            text("SELECT * FROM menu_items WHERE id = :menu_id"),
-            {'menu_id': menu_id}
+            select_menu_items(selected_fields).where(MenuItem.id == menu_id)
         ).fetchone()
         
         if not result:
@@ -127,21 +239,7 @@ def get_menu_item_by_id(menu_id):
                 'message': 'Menu item not found'
             }), 404
         
-        # Convert result to dict format
-        row_dict = dict(result._mapping)
-        menu_item_dict = {
-            'id': row_dict['id'],
-            'name': row_dict['name'],
-            'description': row_dict['description'],
-            'price': float(row_dict['price']) if row_dict['price'] else 0,
-            'category': row_dict['category'],
-            'is_available': row_dict['is_available'],
-            'preparation_time': row_dict['preparation_time'],
-            'allergens': json.loads(row_dict['allergens']) if row_dict['allergens'] else [],
-            'nutritional_info': json.loads(row_dict['nutritional_info']) if row_dict['nutritional_info'] else {},
-            'created_at': row_dict['created_at'].isoformat() if row_dict['created_at'] else None,
-            'updated_at': row_dict['updated_at'].isoformat() if row_dict['updated_at'] else None
-        }
+        menu_item_dict = serialize_menu_rows([result], selected_fields)[0]
         
         return jsonify({
             'success': True,
@@ -177,17 +275,21 @@ def create_menu_item():
             category=data['category'],
             is_available=data.get('is_available', True),
             preparation_time=data['preparation_time'],
+            stock_quantity=data.get('stock_quantity'),
             allergens=json.dumps(data.get('allergens')) if data.get('allergens') is not None else None,
             nutritional_info=json.dumps(data.get('nutritional_info')) if data.get('nutritional_info') is not None else None
         )
         
         db.session.add(menu_item)
+        db.session.flush()
+        menu_item_dict = menu_item.to_dict()
+        log_menu_changes([('create', menu_item.id, menu_item_dict)])
         db.session.commit()
         
         return jsonify({
             'success': True,
             'message': 'Menu item created successfully',
-            'data': menu_item.to_dict()
+            'data': menu_item_dict
         }), 201
         
     except IntegrityError as e:
@@ -226,93 +328,71 @@ def update_menu_item(menu_id):
                 'message': 'No data provided'
             }), 400
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Check if item exists
+        if not db.session.execute(
+            text("SELECT id FROM menu_items WHERE id = :menu_id"),
+            {'menu_id': menu_id}
+        ).fetchone():
+            return jsonify({
+                'success': False,
+                'message': 'Menu item not found'
+            }), 404
+        
+        # Build update query dynamically
+        update_fields = []
+        update_values = {'menu_id': menu_id}
+        
+        if 'is_available' in data:
+            # A manager's decision: stock releases must not override it
+            update_fields.append("is_available = :is_available")
+            update_fields.append("sold_out = :sold_out")
+            update_values['is_available'] = bool(data['is_available'])
+            update_values['sold_out'] = False
+        if 'name' in data:
+            update_fields.append("name = :name")
+            update_values['name'] = data['name']
+        if 'description' in data:
+            update_fields.append("description = :description")
+            update_values['description'] = data['description']
+        if 'price' in data:
+            update_fields.append("price = :price")
+            update_values['price'] = float(data['price'])
+        if 'category' in data:
+            update_fields.append("category = :category")
+            update_values['category'] = data['category']
+        if 'preparation_time' in data:
+            update_fields.append("preparation_time = :preparation_time")
+            update_values['preparation_time'] = int(data['preparation_time'])
+        if 'stock_quantity' in data:
+            update_fields.append("stock_quantity = :stock_quantity")
+            update_values['stock_quantity'] = int(data['stock_quantity']) if data['stock_quantity'] is not None else None
+        if 'allergens' in data:
+            update_fields.append("allergens = :allergens")
+            update_values['allergens'] = json.dumps(data['allergens']) if data['allergens'] is not None else None
+        if 'nutritional_info' in data:
+            update_fields.append("nutritional_info = :nutritional_info")
+            update_values['nutritional_info'] = json.dumps(data['nutritional_info']) if data['nutritional_info'] is not None else None
+        
+        if update_fields:
+            update_fields.append("updated_at = CURRENT_TIMESTAMP")
+            update_query = f"UPDATE menu_items SET {', '.join(update_fields)} WHERE id = :menu_id"
+            db.session.execute(text(update_query), update_values)
+        
+        # Get updated item
+        updated_item = serialize_menu_item(db.session.execute(
+            select(MenuItem.__table__).where(MenuItem.id == menu_id)
+        ).one())
+        
+        if update_fields:
+            change_type = 'availability' if set(data) == {'is_available'} else 'update'
+            log_menu_changes([(change_type, menu_id, updated_item)])
+        db.session.commit()
         
-        try:
-            # Check if item exists
-            cursor.execute("SELECT id FROM menu_items WHERE id = %s", (menu_id,))
-            if not cursor.fetchone():
-                return jsonify({
-                    'success': False,
-                    'message': 'Menu item not found'
-                }), 404
-            
-            # Build update query dynamically
-            update_fields = []
-            update_values = []
-            
-            if 'is_available' in data:
-                update_fields.append("is_available = %s")
-                update_values.append(bool(data['is_available']))
-            if 'name' in data:
-                update_fields.append("name = %s")
-                update_values.append(data['name'])
-            if 'description' in data:
-                update_fields.append("description = %s")
-                update_values.append(data['description'])
-            if 'price' in data:
-                update_fields.append("price = %s")
-                update_values.append(float(data['price']))
-            if 'category' in data:
-                update_fields.append("category = %s")
-                update_values.append(data['category'])
-            if 'preparation_time' in data:
-                update_fields.append("preparation_time = %s")
-                update_values.append(int(data['preparation_time']))
-            if 'allergens' in data:
-                update_fields.append("allergens = %s")
-                update_values.append(json.dumps(data['allergens']) if data['allergens'] is not None else None)
-            if 'nutritional_info' in data:
-                update_fields.append("nutritional_info = %s")
-                update_values.append(json.dumps(data['nutritional_info']) if data['nutritional_info'] is not None else None)
-            
-            if update_fields:
-                update_fields.append("updated_at = CURRENT_TIMESTAMP")
-                update_query = f"UPDATE menu_items SET {', '.join(update_fields)} WHERE id = %s"
-                update_values.append(menu_id)
-                
-                cursor.execute(update_query, update_values)
-                conn.commit()
-            
-            # Get updated item
-            cursor.execute("SELECT * FROM menu_items WHERE id = %s", (menu_id,))
-            result = cursor.fetchone()
-            
-            if result:
-                columns = [desc[0] for desc in cursor.description]
-                row_dict = dict(zip(columns, result))
-                
-                updated_item = {
-                    'id': row_dict['id'],
-                    'name': row_dict['name'],
-                    'description': row_dict['description'],
-                    'price': float(row_dict['price']) if row_dict['price'] else 0,
-                    'category': row_dict['category'],
-                    'is_available': row_dict['is_available'],
-                    'preparation_time': row_dict['preparation_time'],
-                    'allergens': json.loads(row_dict['allergens']) if row_dict['allergens'] else [],
-                    'nutritional_info': json.loads(row_dict['nutritional_info']) if row_dict['nutritional_info'] else {},
-                    'created_at': row_dict['created_at'].isoformat() if row_dict['created_at'] else None,
-                    'updated_at': row_dict['updated_at'].isoformat() if row_dict['updated_at'] else None
-                }
-                
-                return jsonify({
-                    'success': True,
-                    'message': 'Menu item updated successfully',
-                    'data': updated_item
-                })
-            
-        finally:
-            cursor.close()
-            conn.close()
-            
-    except Exception as e:
         return jsonify({
-            'success': False,
-            'message': 'Error updating menu item',
-            'error': str(e)
-        }), 500
+            'success': True,
+            'message': 'Menu item updated successfully',
+            'data': updated_item
+        })
         
     except IntegrityError as e:
         db.session.rollback()
@@ -342,36 +422,429 @@ def delete_menu_item(menu_id):
                 'message': 'Invalid menu item ID format'
             }), 400
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Check if item exists
+        result = db.session.execute(
+            text("SELECT id FROM menu_items WHERE id = :menu_id"),
+            {'menu_id': menu_id}
+        ).fetchone()
+        
+        if not result:
+            return jsonify({
+                'success': False,
+                'message': 'Menu item not found'
+            }), 404
+
+        # Delete using explicit SQL
+        db.session.execute(
+            text("DELETE FROM menu_items WHERE id = :menu_id"),
+            {'menu_id': menu_id}
+        )
+        log_menu_changes([('delete', menu_id, None)])
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Menu item deleted successfully'
+        })
         
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Error deleting menu item',
+            'error': str(e)
+        }), 500
+
+
+def aggregate_reservation(items):
+    """Sum quantities per menu item, sorted by id so rows are always locked in the same order"""
+    quantities = {}
+    for item in items:
+        quantities[item['menu_item_id']] = quantities.get(item['menu_item_id'], 0) + item['quantity']
+    return sorted(quantities.items())
+
+
+@menu_bp.route('/reservations', methods=['POST'])
+def reserve_menu_items():
+    """Atomically decrement stock for every item of an order.
+
+    Each item is reserved with a conditional UPDATE, so concurrent orders cannot
+    oversell the last portions. Items reaching zero become unavailable. If any
+    item cannot be reserved the whole reservation is rolled back.
+    """
+    try:
+        try:
+            data = reservation_schema.load(request.json or {})
+        except ValidationError as err:
+            return jsonify({
+                'success': False,
+                'message': 'Validation error',
+                'errors': err.messages
+            }), 400
+
+        quantities = aggregate_reservation(data['items'])
+        unavailable_items = []
+
+        for menu_item_id, quantity in quantities:
+            remaining = MenuItem.stock_quantity - quantity
+            result = db.session.execute(
+                update(MenuItem)
+                .where(
+                    MenuItem.id == menu_item_id,
+                    MenuItem.is_available == True,
+                    or_(MenuItem.stock_quantity.is_(None), MenuItem.stock_quantity >= quantity)
+                )
+                .values(
+                    stock_quantity=remaining,
+                    is_available=case((remaining <= 0, False), else_=MenuItem.is_available),
+                    sold_out=case((remaining <= 0, True), else_=MenuItem.sold_out),
+                    updated_at=case((MenuItem.stock_quantity.is_(None), MenuItem.updated_at), else_=func.now())
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                unavailable_items.append(menu_item_id)
+
+        if unavailable_items:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'Some menu items are not available',
+                'unavailable_items': unavailable_items
+            }), 409
+
+        items_data = fetch_menu_items(MenuItem.id.in_([menu_item_id for menu_item_id, _ in quantities]))
+
+        # Only stock-tracked items actually changed
+        changes = [
+            ('availability' if not item['is_available'] else 'update', item['id'], item)
+            for item in items_data if item['stock_quantity'] is not None
+        ]
+        if changes:
+            log_menu_changes(changes)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': 'Menu items reserved successfully',
+            'data': items_data
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Error reserving menu items',
+            'error': str(e)
+        }), 500
+
+
+def release_stock(quantities):
+    """Add (menu_item_id, quantity) pairs back to stock in the current transaction"""
+    for menu_item_id, quantity in quantities:
+        db.session.execute(
+            update(MenuItem)
+            .where(MenuItem.id == menu_item_id, MenuItem.stock_quantity.isnot(None))
+            .values(
+                stock_quantity=MenuItem.stock_quantity + quantity,
+                # Items that were sold out by a reservation become orderable again,
+                # items taken off the menu by a manager stay off
+                is_available=case((MenuItem.sold_out, True), else_=MenuItem.is_available),
+                sold_out=False,
+                updated_at=func.now()
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    items_data = fetch_menu_items(
+        MenuItem.id.in_([menu_item_id for menu_item_id, _ in quantities]),
+        MenuItem.stock_quantity.isnot(None)
+    )
+    if items_data:
+        log_menu_changes([('update', item['id'], item) for item in items_data])
+    return items_data
+
+
+@menu_bp.route('/reservations/release', methods=['POST'])
+def release_menu_items():
+    """Give back stock from a reservation that was not used"""
+    try:
         try:
-            # Check if item exists
-            cursor.execute("SELECT id FROM menu_items WHERE id = %s", (menu_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                return jsonify({
-                    'success': False,
-                    'message': 'Menu item not found'
-                }), 404
-
-            # Delete using explicit SQL
-            cursor.execute("DELETE FROM menu_items WHERE id = %s", (menu_id,))
-            conn.commit()
-            
+            data = reservation_schema.load(request.json or {})
+        except ValidationError as err:
+            return jsonify({
+                'success': False,
+                'message': 'Validation error',
+                'errors': err.messages
+            }), 400
+
+        items_data = release_stock(aggregate_reservation(data['items']))
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': 'Menu items released successfully',
+            'data': items_data
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Error releasing menu items',
+            'error': str(e)
+        }), 500
+
+
+@menu_bp.route('/changes', methods=['GET'])
+@read_only
+def get_menu_changes():
+    """Get menu changes newer than ?since=<version>"""
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'since must be an integer version'
+            }), 400
+
+        version, compacted_version = get_menu_version()
+
+        # The log no longer covers the requested range: client must reload the full menu
+        if since < compacted_version:
             return jsonify({
                 'success': True,
-                'message': 'Menu item deleted successfully'
+                'version': version,
+                'since': since,
+                'reset': True,
+                'data': [],
+                'count': 0
             })
-            
-        finally:
-            cursor.close()
-            conn.close()
-        
+
+        changes = db.session.execute(
+            select(MenuChange.__table__).where(MenuChange.version > since).order_by(MenuChange.version)
+        ).all()
+
+        return jsonify({
+            'success': True,
+            'version': version,
+            'since': since,
+            'reset': False,
+            'data': [serialize_menu_change(change) for change in changes],
+            'count': len(changes)
+        })
+
     except Exception as e:
         return jsonify({
             'success': False,
-            'message': 'Error deleting menu item',
+            'message': 'Error fetching menu changes',
             'error': str(e)
         }), 500
+
+
+# Columns used by the CSV import/export format
+MENU_CSV_COLUMNS = [
+    'id', 'name', 'description', 'price', 'category', 'is_available',
+    'preparation_time', 'stock_quantity', 'allergens', 'nutritional_info', 'created_at', 'updated_at'
+]
+
+
+def parse_csv_row(row):
+    """Turn a CSV row into a payload for MenuItemSchema"""
+    payload = {}
+    for key, value in row.items():
+        if key is None or value is None or value.strip() == '':
+            continue
+        value = value.strip()
+        if key == 'allergens':
+            # Accept either a JSON list or a ';'-separated list
+            payload[key] = json.loads(value) if value.startswith('[') else [a.strip() for a in value.split(';') if a.strip()]
+        elif key == 'nutritional_info':
+            payload[key] = json.loads(value)
+        else:
+            payload[key] = value
+    return payload
+
+
+def iter_bulk_rows(stream, data_format):
+    """Yield (line_number, payload, error) tuples from an NDJSON or CSV stream"""
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    if data_format == 'csv':
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            try:
+                yield reader.line_num, parse_csv_row(row), None
+            except ValueError as e:
+                yield reader.line_num, None, {'_row': [f'Invalid JSON value: {str(e)}']}
+        return
+
+    for line_number, line in enumerate(text_stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, {'_row': [f'Invalid JSON: {str(e)}']}
+            continue
+        if not isinstance(payload, dict):
+            yield line_number, None, {'_row': ['Each line must be a JSON object']}
+            continue
+        yield line_number, payload, None
+
+
+def apply_menu_batch(batch):
+    """Upsert a batch of validated menu items by name in one transaction"""
+    names = [data['name'] for _, data in batch]
+    existing = {}
+    for item in MenuItem.query.filter(MenuItem.name.in_(names)).all():
+        existing.setdefault(item.name, item)
+
+    created = 0
+    updated = 0
+    changes = []
+    for _, data in batch:
+        values = {
+            'description': data.get('description'),
+            'price': data['price'],
+            'category': data['category'],
+            'is_available': data.get('is_available', True),
+            'sold_out': False,
+            'preparation_time': data['preparation_time'],
+            'stock_quantity': data.get('stock_quantity'),
+            'allergens': json.dumps(data.get('allergens')) if data.get('allergens') is not None else None,
+            'nutritional_info': json.dumps(data.get('nutritional_info')) if data.get('nutritional_info') is not None else None
+        }
+        menu_item = existing.get(data['name'])
+        if menu_item:
+            for key, value in values.items():
+                setattr(menu_item, key, value)
+            changes.append(('update', menu_item))
+            updated += 1
+        else:
+            menu_item = MenuItem(name=data['name'], **values)
+            db.session.add(menu_item)
+            existing[data['name']] = menu_item
+            changes.append(('create', menu_item))
+            created += 1
+
+    db.session.flush()
+    log_menu_changes([(change_type, item.id, item.to_dict()) for change_type, item in changes])
+    db.session.commit()
+    return created, updated
+
+
+@menu_bp.route('/bulk', methods=['POST'])
+def bulk_import_menu_items():
+    """Import menu items from an NDJSON or CSV body, upserting by name"""
+    data_format = request.args.get('format')
+    if not data_format:
+        content_type = (request.mimetype or '').lower()
+        data_format = 'csv' if content_type in ('text/csv', 'application/csv') else 'ndjson'
+
+    if data_format not in ('csv', 'ndjson'):
+        return jsonify({
+            'success': False,
+            'message': 'Invalid format. Must be one of: csv, ndjson'
+        }), 400
+
+    batch_size = current_app.config.get('BULK_BATCH_SIZE', 500)
+    created = 0
+    updated = 0
+    errors = []
+    batch = []
+
+    try:
+        for line_number, payload, error in iter_bulk_rows(request.stream, data_format):
+            if error is None:
+                try:
+                    payload = menu_item_import_schema.load(payload)
+                except ValidationError as err:
+                    error = err.messages
+            if error is not None:
+                errors.append({'line': line_number, 'errors': error})
+                continue
+
+            batch.append((line_number, payload))
+            if len(batch) >= batch_size:
+                batch_created, batch_updated = apply_menu_batch(batch)
+                created += batch_created
+                updated += batch_updated
+                batch = []
+
+        if batch:
+            batch_created, batch_updated = apply_menu_batch(batch)
+            created += batch_created
+            updated += batch_updated
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Error importing menu items',
+            'error': str(e),
+            'created': created,
+            'updated': updated,
+            'failed': len(errors),
+            'errors': errors
+        }), 500
+
+    return jsonify({
+        'success': len(errors) == 0,
+        'message': 'Menu items imported' if not errors else 'Menu items imported with errors',
+        'created': created,
+        'updated': updated,
+        'failed': len(errors),
+        'errors': errors
+    }), 200 if not errors else 207
+
+
+@menu_bp.route('/export', methods=['GET'])
+@read_only
+def export_menu_items():
+    """Stream all menu items as NDJSON or CSV without loading the whole table"""
+    data_format = request.args.get('format', 'ndjson')
+    if data_format not in ('csv', 'ndjson'):
+        return jsonify({
+            'success': False,
+            'message': 'Invalid format. Must be one of: csv, ndjson'
+        }), 400
+
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 500)
+
+    def iter_items():
+        statement = select(MenuItem.__table__).order_by(MenuItem.category, MenuItem.name).execution_options(
+            yield_per=batch_size
+        )
+        for row in db.session.execute(statement):
+            yield serialize_menu_item(row)
+
+    def generate_ndjson():
+        for item in iter_items():
+            yield json_dumps(item) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=MENU_CSV_COLUMNS)
+        writer.writeheader()
+        for item in iter_items():
+            item['allergens'] = json.dumps(item['allergens'])
+            item['nutritional_info'] = json.dumps(item['nutritional_info'])
+            for key in ('created_at', 'updated_at'):
+                if hasattr(item[key], 'isoformat'):
+                    item[key] = item[key].isoformat()
+            writer.writerow(item)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    if data_format == 'csv':
+        return Response(
+            stream_with_context(generate_csv()),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=menu.csv'}
+        )
+
+    return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
@@ -0,0 +1,79 @@
+"""Row-oriented serializers shared by models and routes.
+
+Serializers only use attribute access, so they accept ORM instances as well
+as SQLAlchemy Row objects from Core selects (which skip ORM object overhead).
+"""
+from json_provider import json_loads, NATIVE_DATETIME
+
+
+def format_datetime(value):
+    """ISO 8601 datetime; left to the JSON encoder when it formats datetimes natively"""
+    if value is None or NATIVE_DATETIME:
+        return value
+    # Drivers without native datetimes (SQLite raw SQL) already return text
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def serialize_menu_item(row):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'description': row.description,
+        'price': float(row.price) if row.price else 0,
+        'category': row.category,
+        'is_available': row.is_available,
+        'preparation_time': row.preparation_time,
+        'stock_quantity': row.stock_quantity,
+        'allergens': json_loads(row.allergens) if row.allergens else [],
+        'nutritional_info': json_loads(row.nutritional_info) if row.nutritional_info else {},
+        'created_at': format_datetime(row.created_at),
+        'updated_at': format_datetime(row.updated_at)
+    }
+
+
+# Sparse fieldsets: output field -> converter applied to the column of the same name
+MENU_ITEM_FIELDS = {
+    'id': None,
+    'name': None,
+    'description': None,
+    'price': lambda value: float(value) if value else 0,
+    'category': None,
+    'is_available': None,
+    'preparation_time': None,
+    'stock_quantity': None,
+    'allergens': lambda value: json_loads(value) if value else [],
+    'nutritional_info': lambda value: json_loads(value) if value else {},
+    'created_at': format_datetime,
+    'updated_at': format_datetime
+}
+
+
+def parse_fields(value, allowed):
+    """Parse a ?fields= list; None means all fields. Raises ValueError on unknown fields."""
+    if not value:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields or None
+
+
+def project_row(row, fields, converters):
+    """Serialize only the requested fields of a row"""
+    data = {}
+    for field in fields:
+        convert = converters[field]
+        value = getattr(row, field)
+        data[field] = convert(value) if convert is not None else value
+    return data
+
+
+def serialize_menu_change(row):
+    return {
+        'version': row.version,
+        'menu_item_id': row.menu_item_id,
+        'change_type': row.change_type,
+        'item': json_loads(row.data) if row.data else None,
+        'created_at': format_datetime(row.created_at)
+    }
@@ -0,0 +1,95 @@
+"""Per-request SQL counters and the slow-query log.
+
+Engine event hooks time every statement on the app's engines (primary and
+replicas). Inside a request the count and the total database time are added
+to the response as X-Query-Count and Server-Timing headers; any statement
+slower than SLOW_QUERY_THRESHOLD_MS is logged on the 'sql.slow' logger with
+its shape, the number of bound parameters and the endpoint that ran it.
+"""
+import logging
+import re
+import time
+
+from flask import g, request, current_app, has_app_context, has_request_context
+from sqlalchemy import event
+
+from tracing import record_span, tracing_enabled
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+slow_query_logger = logging.getLogger('sql.slow')
+
+# Expanded IN lists and VALUES rows differ only by how many placeholders they have
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+MAX_STATEMENT_LENGTH = 1000
+
+
+def statement_shape(statement):
+    """Statement text with whitespace collapsed and placeholder lists folded to (...)"""
+    shape = _PLACEHOLDER_LIST.sub('(...)', _WHITESPACE.sub(' ', statement).strip())
+    return shape if len(shape) <= MAX_STATEMENT_LENGTH else shape[:MAX_STATEMENT_LENGTH] + '...'
+
+
+def is_batch(parameters, executemany):
+    # insertmanyvalues reports executemany for what reaches the cursor as one flat row
+    return executemany and bool(parameters) and isinstance(parameters[0], (list, tuple, dict))
+
+
+def parameter_count(parameters, executemany):
+    if not parameters:
+        return 0
+    if is_batch(parameters, executemany):
+        return sum(len(row) for row in parameters)
+    return len(parameters)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    in_request = has_request_context()
+    if in_request:
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_time = g.get('query_time', 0.0) + elapsed
+        if tracing_enabled():
+            record_span('db.query', elapsed, {'db.statement': statement_shape(statement)}, kind='client')
+    threshold_ms = current_app.config.get('SLOW_QUERY_THRESHOLD_MS') if has_app_context() else None
+    if threshold_ms is not None and elapsed * 1000 >= threshold_ms:
+        slow_query_logger.warning('Slow query (%.1f ms)', elapsed * 1000, extra={
+            'statement': statement_shape(statement),
+            'parameter_count': parameter_count(parameters, executemany),
+            'rows': len(parameters) if is_batch(parameters, executemany) else None,
+            'endpoint': request.endpoint if in_request else None,
+            'duration_ms': round(elapsed * 1000, 2)
+        })
+
+
+def handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def init_sql_instrumentation(app, db):
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'handle_error', handle_error)
+
+    @app.after_request
+    def add_query_headers(response):
+        count = g.get('query_count', 0)
+        response.headers[QUERY_COUNT_HEADER] = str(count)
+        timing = f'db;dur={g.get("query_time", 0.0) * 1000:.2f};desc="{count} queries"'
+        existing = response.headers.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        return response
@@ -0,0 +1,111 @@
+"""
+Migration script to add the 'stock_reserved' column to orders
+
+This script adds the 'stock_reserved' column to the existing orders table in PostgreSQL.
+New databases get the column from the models; run this migration on databases created before.
+
+Usage:
+    python migrate_add_stock_reserved.py
+"""
+
+import psycopg2
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5433'),
+    'database': os.getenv('DB_NAME', 'byteristo_orders'),
+    'user': os.getenv('DB_USER', 'byteristo'),
+    'password': os.getenv('DB_PASSWORD', 'byteristo123')
+}
+
+def migrate():
+    """Add 'stock_reserved' to orders"""
+    conn = None
+    cursor = None
+    
+    try:
+        # Connect to the database
+        print(f"Connecting to database {DB_CONFIG['database']}...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        
+        print("Adding 'stock_reserved' column to orders...")
+        # Orders created before were cancelled with a stock release: keep that for them,
+        # new orders start unreserved until the menu service confirms the reservation
+        cursor.execute("""
+            ALTER TABLE orders ADD COLUMN IF NOT EXISTS stock_reserved BOOLEAN NOT NULL DEFAULT TRUE;
+        """)
+        cursor.execute("""
+            ALTER TABLE orders ALTER COLUMN stock_reserved SET DEFAULT FALSE;
+        """)
+        
+        conn.commit()
+        print("✓ Migration completed successfully!")
+        print("  - Added 'stock_reserved' column to orders")
+        
+    except psycopg2.Error as e:
+        print(f"✗ Database error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print("Database connection closed.")
+
+
+def verify_migration():
+    """Verify that the migration was successful"""
+    conn = None
+    cursor = None
+    
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        
+        print("\nVerifying migration...")
+        
+        cursor.execute("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'orders' AND column_name = 'stock_reserved';
+        """)
+        
+        if cursor.fetchone():
+            print("✓ Verification successful: 'stock_reserved' column is present")
+        else:
+            print("✗ Verification failed: 'stock_reserved' column missing on orders")
+        
+    except Exception as e:
+        print(f"✗ Verification error: {e}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Order Migration: Adding 'stock_reserved' column")
+    print("=" * 60)
+    
+    try:
+        migrate()
+        verify_migration()
+        print("\n✓ Migration process completed!")
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        exit(1)
@@ -0,0 +1,113 @@
+"""
+Migration script to add the optimistic concurrency 'version' columns
+
+This script adds the 'version' column to the existing orders and order_items tables in PostgreSQL.
+New databases get the columns from the models; run this migration on databases created before.
+
+Usage:
+    python migrate_add_version_columns.py
+"""
+
+import psycopg2
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5433'),
+    'database': os.getenv('DB_NAME', 'byteristo_orders'),
+    'user': os.getenv('DB_USER', 'byteristo'),
+    'password': os.getenv('DB_PASSWORD', 'byteristo123')
+}
+
+TABLES = ['orders', 'order_items']
+
+
+def migrate():
+    """Add 'version' to orders and order_items"""
+    conn = None
+    cursor = None
+    
+    try:
+        # Connect to the database
+        print(f"Connecting to database {DB_CONFIG['database']}...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        
+        for table in TABLES:
+            print(f"Adding 'version' column to {table}...")
+            # Existing rows start at version 1, like new ones
+            cursor.execute(f"""
+                ALTER TABLE {table} ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+            """)
+        
+        conn.commit()
+        print("✓ Migration completed successfully!")
+        print(f"  - Added 'version' column to {', '.join(TABLES)}")
+        
+    except psycopg2.Error as e:
+        print(f"✗ Database error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print("Database connection closed.")
+
+
+def verify_migration():
+    """Verify that the migration was successful"""
+    conn = None
+    cursor = None
+    
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        
+        print("\nVerifying migration...")
+        
+        cursor.execute("""
+            SELECT table_name
+            FROM information_schema.columns
+            WHERE column_name = 'version' AND table_name = ANY(%s);
+        """, (TABLES,))
+        
+        tables = {row[0] for row in cursor.fetchall()}
+        missing = [table for table in TABLES if table not in tables]
+        if missing:
+            print(f"✗ Verification failed: 'version' column missing on {', '.join(missing)}")
+        else:
+            print("✓ Verification successful: 'version' column is present")
+        
+    except Exception as e:
+        print(f"✗ Verification error: {e}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Order Migration: Adding 'version' columns")
+    print("=" * 60)
+    
+    try:
+        migrate()
+        verify_migration()
+        print("\n✓ Migration process completed!")
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        exit(1)
@@ -2,22 +2,45 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from datetime import datetime
 import os
-import time
 
 from config import config
+from json_provider import FastJSONProvider
+from logging_utils import init_logging
+from metrics import init_metrics, metrics_response, process_uptime
+from profiler import init_profiler
+from tracing import init_tracing
 from models import db
+from db_routing import init_read_replicas
+from sql_instrumentation import init_sql_instrumentation
+from schema import ensure_schema
 from routes.order_routes import order_bp
+from routes.report_routes import report_bp
+from routes.table_routes import table_bp
+from outbox import init_events, start_event_workers
+from event_handlers import EVENT_HANDLERS, BROADCAST_EVENT_HANDLERS
+from order_processing import init_order_workers, start_order_workers
+from kitchen import init_kitchen
 
 def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = FastJSONProvider(app)
+    init_logging(app, 'order-management-service')
     
     # Initialize extensions
     db.init_app(app)
+    init_read_replicas(app, db)
+    init_sql_instrumentation(app, db)
+    init_metrics(app, db)
+    init_profiler(app)
+    init_tracing(app, 'order-management-service')
     CORS(app)
+    init_kitchen(app)
     
     # Register blueprints
     app.register_blueprint(order_bp, url_prefix='/api/orders')
+    app.register_blueprint(report_bp, url_prefix='/api/reports')
+    app.register_blueprint(table_bp, url_prefix='/api/tables')
     
     # Health check endpoint
     @app.route('/health')
@@ -26,9 +49,14 @@ def create_app(config_name='default'):
             'status': 'healthy',
             'service': 'order-management-service',
             'timestamp': datetime.utcnow().isoformat(),
-            'uptime': time.process_time()
+            'uptime': round(process_uptime(), 3)
         })
     
+    # Metrics endpoint (Prometheus text format)
+    @app.route('/metrics')
+    def metrics():
+        return metrics_response()
+    
     # API Overview endpoint
     @app.route('/api')
     def api_overview():
@@ -37,12 +65,27 @@ def create_app(config_name='default'):
             'version': '2.0.0',
             'endpoints': {
                 'orders': {
-                    'GET /api/orders/': 'Get all orders (filter by status, table_number, order_type)',
-                    'POST /api/orders/': 'Create new order',
+                    'GET /api/orders/': 'Get all orders (filter by status, table_number, order_type; ?fields=order_number,items.quantity,...)',
+                    'POST /api/orders/': 'Create new order (optional Idempotency-Key header; Prefer: respond-async answers 202 and confirms in background)',
                     'GET /api/orders/{id}': 'Get order by ID',
-                    'PUT /api/orders/{id}/status': 'Update order status',
-                    'PUT /api/orders/{id}/items/{item_id}/status': 'Update order item status',
+                    'GET /api/orders/export': 'Stream orders as NDJSON or CSV (?format=, ?from=, ?to=, ?status=payed)',
+                    'GET /api/orders/prep-list': 'Get quantities to prepare per menu item and item status across active orders (?status=)',
+                    'GET /api/orders/stats/prep-times': 'Get observed preparation times per menu item (?menu_item_id=, ?hour=)',
+                    'GET /api/orders/kitchen/load': 'Get outstanding kitchen work and expected wait per station',
+                    'GET /api/orders/{id}/processing': 'Get the processing state of an order accepted asynchronously',
+                    'PUT /api/orders/status': 'Update the status of several orders at once (all or nothing)',
+                    'PUT /api/orders/{id}/status': 'Update order status (optional version, 409 with the current order on conflict)',
+                    'PUT /api/orders/{id}/items/{item_id}/status': 'Update order item status (optional version, 409 with the current order on conflict)',
                     'DELETE /api/orders/{id}': 'Delete order (pending/cancelled only)'
+                },
+                'tables': {
+                    'GET /api/tables/{n}/bill': 'Get the open bill of a table (all unpaid orders)',
+                    'POST /api/tables/{n}/pay': 'Pay all ready orders of a table in one transaction (optional split by amount or item)'
+                },
+                'reports': {
+                    'GET /api/reports/summary': 'Sales totals and throughput per hour (?from=, ?to= as YYYY-MM-DD, default today)',
+                    'GET /api/reports/sales': 'Sales grouped by day, hour, order_type or payment_method (?group_by=)',
+                    'GET /api/reports/menu-items': 'Best selling menu items (?sort=quantity|revenue, ?limit=)'
                 }
             }
         })
@@ -70,16 +113,43 @@ def create_app(config_name='default'):
             'message': 'Bad request'
         }), 400
     
-    # Initialize database
+    # CLI commands (run with: flask --app "app:create_app('production')" <command>)
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables and record the schema version"""
+        if ensure_schema():
+            print("✅ Database schema created/updated")
+        else:
+            print("✅ Database schema already up to date")
+    
+    @app.cli.command('rebuild-reports')
+    def rebuild_reports_command():
+        """Recompute the report rollups from the order history"""
+        from reporting import rebuild_rollups
+        ensure_schema()
+        print(f"✅ Rebuilt report rollups from {rebuild_rollups()} orders")
+    
+    # Initialize database (DDL only runs when the schema version changed)
     with app.app_context():
         try:
-            db.create_all()
-            print("✅ Database tables created successfully")
+            if ensure_schema():
+                print("✅ Database tables created successfully")
         except Exception as e:
             print(f"❌ Error creating database tables: {str(e)}")
     
+    # Events: the outbox relay and the broker consumers run as background threads
+    init_events(app, 'order-management', EVENT_HANDLERS, BROADCAST_EVENT_HANDLERS)
+    init_order_workers(app)
+    if app.config.get('START_EVENT_WORKERS'):
+        start_background_workers(app)
+    
     return app
 
+def start_background_workers(app):
+    """Start the outbox relay, event consumers and order sweep threads of this process"""
+    start_event_workers(app)
+    start_order_workers(app)
+
 if __name__ == '__main__':
     config_name = os.environ.get('FLASK_ENV', 'default')
     app = create_app(config_name)
@@ -15,10 +15,74 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///order_management.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read replicas (comma separated URLs): read-only endpoints use them while they are in sync
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    SQLALCHEMY_BINDS = {f'replica_{index}': url for index, url in enumerate(DATABASE_REPLICA_URLS)}
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 1.0))
+    REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 5.0))
+    
+    # Idempotency keys for POST /api/orders
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS = int(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL_SECONDS', 60))
+    
+    # Order creation: 'sync' confirms in the request, 'async' answers 202 and confirms in
+    # background workers (clients can also ask per request with `Prefer: respond-async`)
+    ORDER_PROCESSING_MODE = os.environ.get('ORDER_PROCESSING_MODE', 'sync')
+    ORDER_WORKER_THREADS = int(os.environ.get('ORDER_WORKER_THREADS', 4))
+    ORDER_PROCESSING_SWEEP_SECONDS = int(os.environ.get('ORDER_PROCESSING_SWEEP_SECONDS', 30))
+    ORDER_PROCESSING_TIMEOUT_SECONDS = int(os.environ.get('ORDER_PROCESSING_TIMEOUT_SECONDS', 120))
+    
+    # Kitchen queue model for completion time estimates
+    KITCHEN_STATION_CAPACITY = os.environ.get('KITCHEN_STATION_CAPACITY', '')  # e.g. 'main=3,dessert=1'
+    KITCHEN_DEFAULT_CAPACITY = int(os.environ.get('KITCHEN_DEFAULT_CAPACITY', 1))
+    KITCHEN_ETA_BUFFER_MINUTES = int(os.environ.get('KITCHEN_ETA_BUFFER_MINUTES', 5))
+    KITCHEN_RESYNC_SECONDS = float(os.environ.get('KITCHEN_RESYNC_SECONDS', 5))  # max age of a worker's queue copy
+    
+    # Observed preparation times (used for estimates once an item has PREP_STATS_MIN_SAMPLES samples)
+    PREP_STATS_WINDOW = int(os.environ.get('PREP_STATS_WINDOW', 100))
+    PREP_STATS_MIN_SAMPLES = int(os.environ.get('PREP_STATS_MIN_SAMPLES', 5))
+    PREP_ESTIMATE_STATISTIC = os.environ.get('PREP_ESTIMATE_STATISTIC', 'p50')  # mean, p50 or p90
+    
+    # Events (transactional outbox + message broker)
+    EVENT_BROKER_URL = os.environ.get('EVENT_BROKER_URL', 'memory://')  # memory://, sqlite:///path, amqp://...
+    START_EVENT_WORKERS = os.environ.get('START_EVENT_WORKERS', 'true').lower() == 'true'
+    OUTBOX_RELAY_ENABLED = os.environ.get('OUTBOX_RELAY_ENABLED', 'true').lower() == 'true'
+    OUTBOX_RELAY_INTERVAL_SECONDS = float(os.environ.get('OUTBOX_RELAY_INTERVAL_SECONDS', 1.0))
+    OUTBOX_RELAY_BATCH_SIZE = int(os.environ.get('OUTBOX_RELAY_BATCH_SIZE', 100))
+    OUTBOX_RETENTION_HOURS = int(os.environ.get('OUTBOX_RETENTION_HOURS', 24))
+    EVENT_CONSUMERS_ENABLED = os.environ.get('EVENT_CONSUMERS_ENABLED', 'true').lower() == 'true'
+    
+    # Streaming exports
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+    
     # External Services
     MENU_SERVICE_URL = os.environ.get('MENU_SERVICE_URL', 'http://localhost:3001')
     PAYMENT_SERVICE_URL = os.environ.get('PAYMENT_SERVICE_URL', 'http://localhost:3003')
     
+    # Logging: JSON lines written by a background thread (see logging_utils)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', 'werkzeug=WARNING')  # e.g. 'routes.order_routes=DEBUG'
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')  # e.g. 'access=0.1' keeps 10% of successful requests
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json or text
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # Metrics: with several worker processes, a directory shared by them so /metrics covers all workers
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    # Admin endpoints (/admin/profile) exist only when ADMIN_TOKEN is set
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    # Sampling profiler (profiler.py): collapsed stacks are written to PROFILE_DIR
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/profiles')
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 300))
+    PROFILE_SIGNAL_SECONDS = float(os.environ.get('PROFILE_SIGNAL_SECONDS', 30))
+    # Tracing: TRACE_EXPORTER is '' (propagate only), 'memory' or 'file' (JSON lines in TRACE_FILE)
+    TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', '')
+    TRACE_FILE = os.environ.get('TRACE_FILE', '/tmp/traces/{service}.jsonl')
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 1.0))
+    TRACE_MEMORY_SPANS = int(os.environ.get('TRACE_MEMORY_SPANS', 10000))
+    # Statements slower than this are logged on the 'sql.slow' logger
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    
     # Flask settings
     PORT = int(os.environ.get('PORT', 3002))
     DEBUG = os.environ.get('FLASK_ENV') == 'development'
@@ -30,7 +94,7 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
-    MENU_SERVICE_URL = 'http://localhost:3001'
+    MENU_SERVICE_URL = os.environ.get('MENU_SERVICE_URL', 'http://localhost:3001')
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -41,6 +105,8 @@ class TestConfig(Config):
     """Test configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_BINDS = {}
+    START_EVENT_WORKERS = False
 
 config = {
     'development': DevelopmentConfig,
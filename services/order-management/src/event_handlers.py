@@ -0,0 +1,45 @@
+"""Handlers for events consumed by the order service"""
+import threading
+
+from metrics import record_cache_lookup
+
+# Latest menu item data seen on menu.item.* events, keyed by menu item id
+_menu_cache = {}
+_menu_cache_lock = threading.Lock()
+
+
+def get_cached_menu_item(menu_item_id):
+    """Menu item data from the events cache, or None if no event was seen yet"""
+    item = _menu_cache.get(menu_item_id)
+    record_cache_lookup('menu_items', item is not None)
+    return item
+
+
+def handle_menu_item_event(event):
+    """Keep the local menu cache in sync with menu-inventory"""
+    payload = event['payload']
+    with _menu_cache_lock:
+        if event['event_type'] == 'menu.item.delete' or payload.get('item') is None:
+            _menu_cache.pop(payload['menu_item_id'], None)
+            return
+        current = _menu_cache.get(payload['menu_item_id'])
+        # Events may be redelivered or arrive out of order: keep the newest version
+        if current and current['version'] > payload['version']:
+            return
+        item = payload['item']
+        _menu_cache[payload['menu_item_id']] = {
+            'version': payload['version'],
+            'name': item.get('name'),
+            'price': item.get('price'),
+            'preparation_time': item.get('preparation_time'),
+            'category': item.get('category'),
+            'is_available': item.get('is_available')
+        }
+
+
+EVENT_HANDLERS = {}
+
+# The menu cache lives in each worker process, so every process needs every menu event
+BROADCAST_EVENT_HANDLERS = {
+    'menu.item.#': handle_menu_item_event
+}
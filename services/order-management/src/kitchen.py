@@ -0,0 +1,231 @@
+"""Queue-aware kitchen completion time estimates.
+
+Every order item is a task on a station (its menu category) taking its
+preparation time. KitchenQueue keeps the outstanding minutes per station in
+memory and updates them as orders are confirmed and items complete, so the ETA
+of a new order only looks at its own items:
+
+    wait(station) = backlog(station) / capacity(station)
+    eta = now + max over the order's stations of (wait + own work) + buffer
+
+Queued orders are re-estimated in FIFO order when work completes. Each process
+keeps its own copy, which only sees its own orders as they happen, so it is
+rebuilt from the database whenever it is read (estimates, station load, ETA
+refresh) and is older than KITCHEN_RESYNC_SECONDS; with several workers this
+bounds what an estimate misses to the last few seconds of the other workers'
+orders.
+"""
+from collections import OrderedDict
+from datetime import timedelta
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select, update, bindparam
+
+from models import db, Order, OrderItem, KitchenTask, italy_now
+
+DEFAULT_STATION = 'kitchen'
+DEFAULT_PREPARATION_TIME = 15
+# Statuses in which an order/item still needs kitchen work
+ACTIVE_ORDER_STATUSES = ('confirmed', 'preparing')
+ACTIVE_ITEM_STATUSES = ('pending', 'preparing')
+
+
+def parse_station_capacity(value):
+    """Parse 'main=2,dessert=1' into {'main': 2, 'dessert': 1}"""
+    capacities = {}
+    for entry in (value or '').split(','):
+        if '=' in entry:
+            station, capacity = entry.split('=', 1)
+            capacities[station.strip()] = max(int(capacity), 1)
+    return capacities
+
+
+class KitchenQueue:
+    """Outstanding kitchen work per station, maintained incrementally"""
+
+    def __init__(self, capacities=None, default_capacity=1, buffer_minutes=5, resync_seconds=5):
+        self.capacities = capacities or {}
+        self.default_capacity = default_capacity
+        self.buffer_minutes = buffer_minutes
+        self.resync_seconds = resync_seconds
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._tasks = {}              # order_item_id -> (order_id, station, minutes)
+        self._orders = OrderedDict()  # order_id -> set of order_item_ids, in queue order
+        self._backlog = {}            # station -> outstanding minutes
+        self._etas = {}               # order_id -> last estimated completion time
+        self._synced_at = 0.0
+
+    def capacity(self, station):
+        return self.capacities.get(station, self.default_capacity)
+
+    def _add_task(self, order_id, order_item_id, station, minutes):
+        if order_item_id in self._tasks:
+            return
+        self._tasks[order_item_id] = (order_id, station, minutes)
+        self._orders.setdefault(order_id, set()).add(order_item_id)
+        self._backlog[station] = self._backlog.get(station, 0) + minutes
+
+    def _remove_task(self, order_item_id):
+        task = self._tasks.pop(order_item_id, None)
+        if task is None:
+            return
+        order_id, station, minutes = task
+        self._backlog[station] = max(self._backlog.get(station, 0) - minutes, 0)
+        remaining = self._orders.get(order_id)
+        if remaining is not None:
+            remaining.discard(order_item_id)
+            if not remaining:
+                del self._orders[order_id]
+                self._etas.pop(order_id, None)
+
+    def estimate_minutes(self, tasks, backlog=None):
+        """Minutes until an order with tasks [(station, minutes)] is done, given the backlog"""
+        backlog = self._backlog if backlog is None else backlog
+        own_work = {}
+        for station, minutes in tasks:
+            total, longest = own_work.get(station, (0, 0))
+            own_work[station] = (total + minutes, max(longest, minutes))
+        finish = 0
+        for station, (total, longest) in own_work.items():
+            capacity = self.capacity(station)
+            # Own items run in parallel up to the station capacity
+            finish = max(finish, backlog.get(station, 0) / capacity + max(total / capacity, longest))
+        return finish + self.buffer_minutes
+
+    def estimate_completion_time(self, tasks):
+        """ETA of a new order, in time proportional to its own items only"""
+        self.ensure_synced()
+        with self._lock:
+            return italy_now() + timedelta(minutes=self.estimate_minutes(tasks))
+
+    def add_order(self, order_id, tasks, eta=None):
+        """Queue the tasks [(order_item_id, station, minutes)] of a confirmed order"""
+        with self._lock:
+            for order_item_id, station, minutes in tasks:
+                self._add_task(order_id, order_item_id, station, minutes)
+            if eta is not None and order_id in self._orders:
+                self._etas[order_id] = eta
+
+    def complete_items(self, order_item_ids):
+        with self._lock:
+            for order_item_id in order_item_ids:
+                self._remove_task(order_item_id)
+
+    def complete_order(self, order_id):
+        with self._lock:
+            for order_item_id in list(self._orders.get(order_id, ())):
+                self._remove_task(order_item_id)
+
+    def station_load(self):
+        """Outstanding minutes and expected wait per station"""
+        self.ensure_synced()
+        with self._lock:
+            return {
+                station: {
+                    'backlog_minutes': round(minutes, 1),
+                    'capacity': self.capacity(station),
+                    'wait_minutes': round(minutes / self.capacity(station), 1)
+                }
+                for station, minutes in sorted(self._backlog.items())
+            }
+
+    def queued_etas(self):
+        """Re-estimate every queued order in FIFO order; returns {order_id: eta}"""
+        now = italy_now()
+        ahead = {}
+        etas = {}
+        with self._lock:
+            for order_id, order_item_ids in self._orders.items():
+                tasks = [self._tasks[order_item_id][1:] for order_item_id in order_item_ids]
+                etas[order_id] = now + timedelta(minutes=self.estimate_minutes(tasks, ahead))
+                for station, minutes in tasks:
+                    ahead[station] = ahead.get(station, 0) + minutes
+        return etas
+
+    def refresh_queued_etas(self, min_change_minutes=1):
+        """Write back the ETAs of queued orders that moved by at least min_change_minutes"""
+        # Every worker writes ETAs: they must account for the orders of the others too
+        self.ensure_synced()
+        changed = []
+        with self._lock:
+            for order_id, eta in self.queued_etas().items():
+                previous = self._etas.get(order_id)
+                if previous is None or abs((eta - previous).total_seconds()) >= min_change_minutes * 60:
+                    self._etas[order_id] = eta
+                    changed.append({'order_key': order_id, 'eta': eta})
+        if changed:
+            orders = Order.__table__
+            db.session.execute(
+                update(orders)
+                .where(orders.c.id == bindparam('order_key'))
+                # An ETA refresh is not a change of the order itself
+                .values(estimated_completion_time=bindparam('eta'), updated_at=orders.c.updated_at),
+                changed
+            )
+            db.session.commit()
+        return len(changed)
+
+    def ensure_synced(self):
+        if time.monotonic() - self._synced_at >= self.resync_seconds:
+            self.rebuild()
+
+    def rebuild(self):
+        """Reload outstanding work from the live orders in the database"""
+        rows = db.session.execute(
+            select(
+                KitchenTask.order_id, KitchenTask.order_item_id, KitchenTask.station,
+                KitchenTask.preparation_time, Order.estimated_completion_time
+            )
+            .join(OrderItem, OrderItem.id == KitchenTask.order_item_id)
+            .join(Order, Order.id == KitchenTask.order_id)
+            .where(Order.status.in_(ACTIVE_ORDER_STATUSES), OrderItem.status.in_(ACTIVE_ITEM_STATUSES))
+            .order_by(Order.created_at, KitchenTask.order_id)
+        ).all()
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add_task(row.order_id, row.order_item_id, row.station, row.preparation_time)
+                if row.estimated_completion_time is not None:
+                    self._etas[row.order_id] = row.estimated_completion_time
+            self._synced_at = time.monotonic()
+
+
+def init_kitchen(app):
+    app.extensions['kitchen_queue'] = KitchenQueue(
+        capacities=parse_station_capacity(app.config.get('KITCHEN_STATION_CAPACITY')),
+        default_capacity=app.config.get('KITCHEN_DEFAULT_CAPACITY', 1),
+        buffer_minutes=app.config.get('KITCHEN_ETA_BUFFER_MINUTES', 5),
+        resync_seconds=app.config.get('KITCHEN_RESYNC_SECONDS', 5)
+    )
+
+
+def get_kitchen_queue():
+    return current_app.extensions['kitchen_queue']
+
+
+def order_tasks(order_items, items_data):
+    """Pair OrderItem rows with their menu details: [(order_item_id, station, minutes)]"""
+    return [
+        (
+            order_item.id,
+            item_data.get('station') or DEFAULT_STATION,
+            item_data.get('preparation_time') or DEFAULT_PREPARATION_TIME
+        )
+        for order_item, item_data in zip(order_items, items_data)
+    ]
+
+
+def add_kitchen_tasks(order_id, tasks):
+    """Persist the kitchen tasks of an order in the current transaction"""
+    for order_item_id, station, minutes in tasks:
+        db.session.add(KitchenTask(
+            order_item_id=order_item_id,
+            order_id=order_id,
+            station=station,
+            preparation_time=minutes
+        ))
@@ -4,7 +4,11 @@ import uuid
 from datetime import datetime
 import pytz
 
-db = SQLAlchemy()
+from json_provider import json_dumps, json_loads
+from db_routing import RoutingSession
+from serialization import serialize_order, serialize_order_item
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Timezone italiana
 ITALY_TZ = pytz.timezone('Europe/Rome')
@@ -31,28 +35,18 @@ class Order(db.Model):
     estimated_completion_time = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=italy_now)
     updated_at = db.Column(db.DateTime, default=italy_now, onupdate=italy_now)
+    # Optimistic concurrency: bumped by every change to the order or one of its items
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # True once the menu service reserved the items' stock; only then does cancelling give it back
+    stock_reserved = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     # Relationship with order items
     items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan')
 
+    __mapper_args__ = {'version_id_col': version}
+
     def to_dict(self):
-        return {
-            'id': str(self.id),
-            'order_number': self.order_number,
-            'table_number': self.table_number,
-            'customer_name': self.customer_name,
-            'status': self.status,
-            'order_type': self.order_type,
-            'total_amount': float(self.total_amount),
-            'tax_amount': float(self.tax_amount),
-            'discount_amount': float(self.discount_amount),
-            'final_amount': float(self.final_amount),
-            'special_instructions': self.special_instructions,
-            'estimated_completion_time': self.estimated_completion_time.isoformat() if self.estimated_completion_time else None,
-            'items': [item.to_dict() for item in self.items],
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return serialize_order(self, [item.to_dict() for item in self.items])
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
@@ -69,17 +63,155 @@ class OrderItem(db.Model):
                       default='pending', nullable=False)
     created_at = db.Column(db.DateTime, default=italy_now)
     updated_at = db.Column(db.DateTime, default=italy_now, onupdate=italy_now)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+    def to_dict(self):
+        return serialize_order_item(self)
+
+class KitchenTask(db.Model):
+    """Kitchen work of an order item: the station (menu category) and its preparation time"""
+    __tablename__ = 'kitchen_tasks'
+
+    order_item_id = db.Column(db.String(36), db.ForeignKey('order_items.id', ondelete='CASCADE'), primary_key=True)
+    order_id = db.Column(db.String(36), db.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False, index=True)
+    station = db.Column(db.String(20), nullable=False)
+    preparation_time = db.Column(db.Integer, nullable=False)  # minutes
+    created_at = db.Column(db.DateTime, default=italy_now, nullable=False)
+
+class ItemStatusTransition(db.Model):
+    """Timestamped status change of an order item"""
+    __tablename__ = 'item_status_transitions'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    order_item_id = db.Column(db.String(36), db.ForeignKey('order_items.id', ondelete='CASCADE'), nullable=False, index=True)
+    order_id = db.Column(db.String(36), nullable=False)
+    menu_item_id = db.Column(db.String(36), nullable=False)
+    from_status = db.Column(db.String(20))
+    to_status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=italy_now, nullable=False)
+
+class PrepTimeStat(db.Model):
+    """Observed preparation times of a menu item, per hour of day (hour -1 = all day)"""
+    __tablename__ = 'prep_time_stats'
+
+    menu_item_id = db.Column(db.String(36), primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)
+    menu_item_name = db.Column(db.String(100))
+    sample_count = db.Column(db.Integer, nullable=False, default=0)  # all samples ever seen
+    samples = db.Column(db.Text, nullable=False, default='[]')  # JSON list, most recent window only
+    mean_minutes = db.Column(db.Float)
+    p50_minutes = db.Column(db.Float)
+    p90_minutes = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=italy_now, onupdate=italy_now)
 
     def to_dict(self):
         return {
-            'id': str(self.id),
-            'menu_item_id': str(self.menu_item_id),
+            'menu_item_id': self.menu_item_id,
             'menu_item_name': self.menu_item_name,
-            'quantity': self.quantity,
-            'unit_price': float(self.unit_price),
-            'total_price': float(self.total_price),
-            'special_instructions': self.special_instructions,
-            'status': self.status,
+            'hour': None if self.hour < 0 else self.hour,
+            'sample_count': self.sample_count,
+            'window_size': len(json_loads(self.samples)),
+            'mean_minutes': self.mean_minutes,
+            'p50_minutes': self.p50_minutes,
+            'p90_minutes': self.p90_minutes,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class SalesRollup(db.Model):
+    """Paid and cancelled orders aggregated per hour, order type and payment method"""
+    __tablename__ = 'sales_rollup_hourly'
+
+    day = db.Column(db.Date, primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)
+    order_type = db.Column(db.String(20), primary_key=True)
+    payment_method = db.Column(db.String(20), primary_key=True)  # 'none' for cancelled orders
+    paid_orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    items_sold = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_orders = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+class MenuItemSalesRollup(db.Model):
+    """Paid and cancelled quantities of a menu item per day"""
+    __tablename__ = 'menu_item_sales_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    menu_item_id = db.Column(db.String(36), primary_key=True)
+    menu_item_name = db.Column(db.String(100))
+    quantity_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    quantity_cancelled = db.Column(db.Integer, nullable=False, default=0)
+
+class IdempotencyKey(db.Model):
+    """Response of a POST /api/orders call, replayed for retries with the same key"""
+    __tablename__ = 'idempotency_keys'
+
+    # Primary key doubles as the unique constraint that resolves concurrent duplicates
+    key = db.Column(db.String(255), primary_key=True)
+    order_id = db.Column(db.String(36), db.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False)
+    response_status = db.Column(db.Integer, nullable=False)
+    response_body = db.Column(db.Text, nullable=False)  # Stored as JSON string
+    created_at = db.Column(db.DateTime, default=italy_now, nullable=False, index=True)
+
+class OrderProcessing(db.Model):
+    """Background processing state of an order accepted asynchronously"""
+    __tablename__ = 'order_processing'
+
+    order_id = db.Column(db.String(36), db.ForeignKey('orders.id', ondelete='CASCADE'), primary_key=True)
+    state = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, processing, confirmed, rejected, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    unavailable_items = db.Column(db.Text)  # Stored as JSON string
+    created_at = db.Column(db.DateTime, default=italy_now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=italy_now, onupdate=italy_now, nullable=False)
+
+    def to_dict(self):
+        return {
+            'order_id': self.order_id,
+            'state': self.state,
+            'attempts': self.attempts,
+            'error': self.error,
+            'unavailable_items': json_loads(self.unavailable_items) if self.unavailable_items else [],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+class SchemaMetadata(db.Model):
+    """Key/value metadata about the database itself (e.g. applied schema version)"""
+    __tablename__ = 'schema_metadata'
+
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(100))
+
+
+class OutboxEvent(db.Model):
+    """Event written with the business change, published later by the outbox relay"""
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event_id = db.Column(db.String(36), unique=True, nullable=False)
+    event_type = db.Column(db.String(100), nullable=False)
+    aggregate_id = db.Column(db.String(36), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # Stored as JSON string
+    created_at = db.Column(db.DateTime, nullable=False)
+    published_at = db.Column(db.DateTime, index=True)
+
+    def envelope(self):
+        """Message body sent to the broker"""
+        return json_dumps({
+            'event_id': self.event_id,
+            'event_type': self.event_type,
+            'aggregate_id': self.aggregate_id,
+            'occurred_at': self.created_at.isoformat(),
+            'payload': json_loads(self.payload)
+        })
+
+
+class ProcessedEvent(db.Model):
+    """Ids of consumed events, used to make handlers idempotent"""
+    __tablename__ = 'processed_events'
+
+    event_id = db.Column(db.String(36), primary_key=True)
+    processed_at = db.Column(db.DateTime, nullable=False, index=True)
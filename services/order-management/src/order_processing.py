@@ -0,0 +1,175 @@
+"""Background processing of orders accepted asynchronously.
+
+In async mode POST /api/orders only validates and stores the order as
+`pending`. A worker pool then reserves stock on the menu service, fills in
+preparation times and the estimated completion time, and confirms or rejects
+the order. Clients follow the outcome on GET /api/orders/<id>/processing.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from json_provider import json_dumps
+from models import db, Order, OrderProcessing, italy_now
+from outbox import add_outbox_event
+from kitchen import get_kitchen_queue, order_tasks, add_kitchen_tasks
+from prep_stats import record_item_transitions
+
+logger = logging.getLogger(__name__)
+
+
+def init_order_workers(app):
+    """Create the worker pool (threads are only started on first use)"""
+    app.extensions['order_workers'] = ThreadPoolExecutor(
+        max_workers=app.config.get('ORDER_WORKER_THREADS', 4),
+        thread_name_prefix='order-worker'
+    )
+
+
+def enqueue_order_processing(order_id):
+    """Hand an accepted order to the worker pool; call after the order is committed"""
+    app = current_app._get_current_object()
+    app.extensions['order_workers'].submit(process_order, app, order_id)
+
+
+def claim_order(order_id):
+    """Move a queued order to processing; False if another worker already claimed it"""
+    result = db.session.execute(
+        update(OrderProcessing)
+        .where(OrderProcessing.order_id == order_id, OrderProcessing.state == 'queued')
+        .values(state='processing', attempts=OrderProcessing.attempts + 1, updated_at=italy_now())
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def finish_order(order, processing, state, error=None, unavailable_items=None):
+    """Record a rejected or failed order and cancel it"""
+    from routes.order_routes import apply_order_transition, release_kitchen_work
+
+    # The state machine cancels the items too, and records the event and the report rollup
+    cancelled = order.status != 'cancelled' and apply_order_transition([order], 'cancelled')
+    if not cancelled:
+        # Already cancelled, final or changed by another request: leave the order as it is
+        db.session.rollback()
+    processing.state = state
+    processing.error = error
+    processing.unavailable_items = json_dumps(unavailable_items) if unavailable_items else None
+    db.session.commit()
+    if cancelled:
+        release_kitchen_work(order_ids=[order.id])
+
+
+def process_order(app, order_id):
+    """Worker entry point: confirm or reject one pending order"""
+    with app.app_context():
+        try:
+            confirm_order(order_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Error processing order %s', order_id)
+            order = db.session.get(Order, order_id)
+            processing = db.session.get(OrderProcessing, order_id)
+            if order and processing:
+                finish_order(order, processing, 'failed', error=str(e))
+
+
+def confirm_order(order_id):
+    """Reserve stock and confirm an order accepted asynchronously"""
+    from routes.order_routes import (
+        reserve_menu_items, release_menu_items, apply_menu_details,
+        calculate_estimated_completion_time
+    )
+
+    if not claim_order(order_id):
+        return
+
+    order = db.session.get(Order, order_id)
+    processing = db.session.get(OrderProcessing, order_id)
+    if order is None or processing is None:
+        return  # Deleted while queued
+    if order.status != 'pending':
+        processing.state = 'rejected'
+        processing.error = f'Order status changed to {order.status} before processing'
+        db.session.commit()
+        return
+
+    items = [{'menu_item_id': item.menu_item_id, 'quantity': item.quantity} for item in order.items]
+    reserved_items, unavailable_items = reserve_menu_items(items)
+    if unavailable_items:
+        finish_order(order, processing, 'rejected', 'Some menu items are not available', unavailable_items)
+        return
+
+    try:
+        apply_menu_details(items, reserved_items)
+        kitchen_tasks = order_tasks(order.items, items)
+        add_kitchen_tasks(order.id, kitchen_tasks)
+        # Items go to the kitchen as in a synchronous create_order; their preparation starts now
+        pending_items = [item for item in order.items if item.status == 'pending']
+        record_item_transitions(
+            [(item.id, order.id, item.menu_item_id, item.status) for item in pending_items], 'preparing'
+        )
+        for item in pending_items:
+            item.status = 'preparing'
+        order.status = 'confirmed'
+        order.stock_reserved = reserved_items is not None
+        order.estimated_completion_time = calculate_estimated_completion_time(items)
+        processing.state = 'confirmed'
+        processing.error = None
+        db.session.flush()
+        add_outbox_event('order.created', order.id, order.to_dict())
+        db.session.commit()
+        get_kitchen_queue().add_order(order.id, kitchen_tasks, order.estimated_completion_time)
+        logger.info('Order confirmed asynchronously: %s', order.order_number, extra={'order_id': order.id})
+    except Exception:
+        db.session.rollback()
+        if reserved_items:
+            release_menu_items(items)
+        raise
+
+
+def requeue_stale_orders():
+    """Re-submit orders lost by a restart: queued ones never picked up, and
+    processing ones whose worker died. Returns how many were re-submitted."""
+    now = italy_now()
+    queued_cutoff = now - timedelta(seconds=current_app.config.get('ORDER_PROCESSING_SWEEP_SECONDS', 30))
+    processing_cutoff = now - timedelta(seconds=current_app.config.get('ORDER_PROCESSING_TIMEOUT_SECONDS', 120))
+
+    db.session.execute(
+        update(OrderProcessing)
+        .where(OrderProcessing.state == 'processing', OrderProcessing.updated_at < processing_cutoff)
+        .values(state='queued', updated_at=queued_cutoff)
+    )
+    order_ids = db.session.scalars(
+        select(OrderProcessing.order_id)
+        .where(OrderProcessing.state == 'queued', OrderProcessing.updated_at <= queued_cutoff)
+    ).all()
+    db.session.commit()
+
+    # Claiming is conditional, so an order already waiting in the pool is only processed once
+    for order_id in order_ids:
+        enqueue_order_processing(order_id)
+    return len(order_ids)
+
+
+def start_order_workers(app):
+    """Start the thread re-submitting stale queued orders"""
+    interval = app.config.get('ORDER_PROCESSING_SWEEP_SECONDS', 30)
+
+    def sweep():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    requeued = requeue_stale_orders()
+                    if requeued:
+                        logger.info('Re-queued %s pending orders', requeued)
+            except Exception as e:
+                logger.exception('Order processing sweep error')
+
+    threading.Thread(target=sweep, name='order-processing-sweep', daemon=True).start()
@@ -0,0 +1,139 @@
+"""Transactional outbox: events are written in the same transaction as the
+business change and published to the broker by a background relay.
+
+Consumers get at-least-once delivery; mark_event_processed() lets a handler
+deduplicate inside its own transaction.
+"""
+from datetime import datetime, timedelta
+import logging
+import threading
+import time
+import uuid
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from events import create_broker
+from json_provider import json_dumps
+from models import db, OutboxEvent, ProcessedEvent
+
+logger = logging.getLogger(__name__)
+
+
+def add_outbox_event(event_type, aggregate_id, payload):
+    """Queue an event in the current transaction; it is published only if the transaction commits"""
+    db.session.add(OutboxEvent(
+        event_id=str(uuid.uuid4()),
+        event_type=event_type,
+        aggregate_id=str(aggregate_id),
+        payload=json_dumps(payload),
+        created_at=datetime.utcnow()
+    ))
+
+
+def mark_event_processed(event_id):
+    """Record a consumed event id; returns False if it was already processed"""
+    try:
+        with db.session.begin_nested():
+            db.session.add(ProcessedEvent(event_id=event_id, processed_at=datetime.utcnow()))
+        return True
+    except IntegrityError:
+        return False
+
+
+def relay_outbox_once(broker, batch_size=100):
+    """Publish one batch of pending outbox events; returns how many were published"""
+    query = (
+        db.select(OutboxEvent)
+        .where(OutboxEvent.published_at.is_(None))
+        .order_by(OutboxEvent.id)
+        .limit(batch_size)
+    )
+    if db.engine.dialect.name == 'postgresql':
+        # Several workers can relay concurrently without publishing the same rows
+        query = query.with_for_update(skip_locked=True)
+
+    published = 0
+    try:
+        for event in db.session.scalars(query).all():
+            broker.publish(event.event_type, event.envelope())
+            event.published_at = datetime.utcnow()
+            published += 1
+    except Exception as e:
+        logger.warning('Outbox relay publish failed: %s', e)
+    finally:
+        # Keep what was published; the rest is retried on the next run
+        db.session.commit()
+    return published
+
+
+def purge_published_events(retention_hours):
+    """Delete published outbox events and processed event ids older than the retention"""
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    db.session.execute(db.delete(OutboxEvent).where(OutboxEvent.published_at < cutoff))
+    db.session.execute(db.delete(ProcessedEvent).where(ProcessedEvent.processed_at < cutoff))
+    db.session.commit()
+
+
+def init_events(app, group, handlers=None, broadcast_handlers=None):
+    """Create the broker for the app and subscribe handlers ({pattern: handler}).
+
+    handlers are shared by the service's processes; broadcast_handlers run in
+    every process (per-process state such as caches).
+    """
+    broker = create_broker(app.config.get('EVENT_BROKER_URL'), group)
+    for pattern, handler in (handlers or {}).items():
+        broker.subscribe(pattern, with_app_context(app, handler))
+    for pattern, handler in (broadcast_handlers or {}).items():
+        broker.subscribe(pattern, with_app_context(app, handler), broadcast=True)
+    app.extensions['event_broker'] = broker
+    return broker
+
+
+def with_app_context(app, handler):
+    """Run a handler inside an app context, rolling back on failure"""
+    def wrapper(event):
+        with app.app_context():
+            try:
+                handler(event)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+    wrapper.__name__ = handler.__name__
+    return wrapper
+
+
+def start_event_workers(app):
+    """Start the outbox relay thread and the broker consumers for this process"""
+    broker = app.extensions['event_broker']
+
+    if app.config.get('OUTBOX_RELAY_ENABLED', True):
+        interval = app.config.get('OUTBOX_RELAY_INTERVAL_SECONDS', 1.0)
+        batch_size = app.config.get('OUTBOX_RELAY_BATCH_SIZE', 100)
+        retention_hours = app.config.get('OUTBOX_RETENTION_HOURS', 24)
+
+        def relay():
+            last_purge = 0.0
+            while True:
+                published = 0
+                try:
+                    with app.app_context():
+                        published = relay_outbox_once(broker, batch_size)
+                        if time.monotonic() - last_purge > 3600:
+                            purge_published_events(retention_hours)
+                            last_purge = time.monotonic()
+                except Exception as e:
+                    logger.exception('Outbox relay error')
+                # Drain backlogs without waiting
+                if published < batch_size:
+                    time.sleep(interval)
+
+        threading.Thread(target=relay, name='outbox-relay', daemon=True).start()
+
+    if app.config.get('EVENT_CONSUMERS_ENABLED', True):
+        broker.start_consuming()
+
+
+def get_broker():
+    return current_app.extensions['event_broker']
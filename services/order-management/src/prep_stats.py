@@ -0,0 +1,123 @@
+"""Observed preparation times per menu item and hour of day.
+
+Item status changes are recorded in item_status_transitions. When an item
+leaves the kitchen (it becomes ready/served, or its whole order becomes
+ready/delivered) the time since it started preparing is added to the
+prep_time_stats rows for its menu item: one for the hour it started and one
+for the whole day. Each row keeps a window of the most recent samples and the
+mean/p50/p90 over that window, updated incrementally, so estimates can read
+them without scanning history.
+"""
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from json_provider import json_dumps, json_loads
+from models import db, OrderItem, ItemStatusTransition, PrepTimeStat, italy_now
+
+ALL_HOURS = -1
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def record_item_transitions(items, to_status):
+    """Record status changes of order items ([(order_item_id, order_id, menu_item_id, from_status)])"""
+    now = italy_now()
+    for order_item_id, order_id, menu_item_id, from_status in items:
+        if from_status == to_status:
+            continue
+        db.session.add(ItemStatusTransition(
+            order_item_id=order_item_id,
+            order_id=order_id,
+            menu_item_id=menu_item_id,
+            from_status=from_status,
+            to_status=to_status,
+            created_at=now
+        ))
+
+
+def record_prep_samples(order_item_ids, window_size=100):
+    """Add the preparation time of items that just left the kitchen to the stats"""
+    if not order_item_ids:
+        return
+    now = italy_now()
+    started = (
+        select(ItemStatusTransition.order_item_id, func.max(ItemStatusTransition.created_at).label('started_at'))
+        .where(
+            ItemStatusTransition.order_item_id.in_(order_item_ids),
+            ItemStatusTransition.to_status == 'preparing'
+        )
+        .group_by(ItemStatusTransition.order_item_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(OrderItem.menu_item_id, OrderItem.menu_item_name, OrderItem.created_at, started.c.started_at)
+        .outerjoin(started, started.c.order_item_id == OrderItem.id)
+        .where(OrderItem.id.in_(order_item_ids))
+    ).all()
+
+    for row in rows:
+        # Items created directly as 'preparing' start at creation
+        started_at = row.started_at or row.created_at
+        minutes = max((now - started_at).total_seconds() / 60, 0)
+        for hour in (started_at.hour, ALL_HOURS):
+            add_sample(row.menu_item_id, hour, row.menu_item_name, minutes, window_size)
+
+
+def add_sample(menu_item_id, hour, menu_item_name, minutes, window_size):
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        # Create the row before locking it: concurrent first samples then wait on the row
+        # lock instead of both inserting it and failing the status change on the key
+        insert = (postgresql if dialect == 'postgresql' else sqlite).insert(PrepTimeStat.__table__).values(
+            menu_item_id=menu_item_id, hour=hour, menu_item_name=menu_item_name, sample_count=0, samples='[]'
+        )
+        db.session.execute(insert.on_conflict_do_nothing(index_elements=['menu_item_id', 'hour']))
+    query = select(PrepTimeStat).where(PrepTimeStat.menu_item_id == menu_item_id, PrepTimeStat.hour == hour)
+    if dialect == 'postgresql':
+        query = query.with_for_update()
+    stat = db.session.scalars(query).first()
+    if stat is None:
+        stat = PrepTimeStat(menu_item_id=menu_item_id, hour=hour, sample_count=0, samples='[]')
+        db.session.add(stat)
+
+    samples = (json_loads(stat.samples) + [round(minutes, 2)])[-window_size:]
+    ordered = sorted(samples)
+    stat.menu_item_name = menu_item_name
+    stat.sample_count = (stat.sample_count or 0) + 1
+    stat.samples = json_dumps(samples)
+    stat.mean_minutes = round(sum(samples) / len(samples), 2)
+    stat.p50_minutes = round(percentile(ordered, 0.5), 2)
+    stat.p90_minutes = round(percentile(ordered, 0.9), 2)
+    db.session.flush()
+
+
+def get_prep_estimates(menu_item_ids, hour, statistic='p50', min_samples=5):
+    """Learned preparation minutes per menu item for an hour of day.
+
+    Uses the hour's stats when they have at least min_samples samples, else the
+    all-day stats; items without enough history are left out.
+    """
+    if not menu_item_ids:
+        return {}
+    column = getattr(PrepTimeStat, f'{statistic}_minutes')
+    rows = db.session.execute(
+        select(PrepTimeStat.menu_item_id, PrepTimeStat.hour, column.label('minutes'))
+        .where(
+            PrepTimeStat.menu_item_id.in_(set(menu_item_ids)),
+            PrepTimeStat.hour.in_([hour, ALL_HOURS]),
+            func.coalesce(PrepTimeStat.sample_count, 0) >= min_samples
+        )
+    ).all()
+    estimates = {}
+    for row in sorted(rows, key=lambda row: row.hour == hour):
+        # Hour-specific rows sort last and win over the all-day ones
+        estimates[row.menu_item_id] = row.minutes
+    return estimates
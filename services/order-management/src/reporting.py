@@ -0,0 +1,104 @@
+"""Sales and throughput rollups.
+
+Orders are added to the rollup tables once, in the transaction that marks them
+paid or cancelled, so reports read a few pre-aggregated rows per hour/day
+instead of scanning the order history.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Order, OrderItem, SalesRollup, MenuItemSalesRollup, italy_now
+
+NO_PAYMENT = 'none'
+
+
+def upsert_increment(model, keys, increments, values=None):
+    """INSERT a rollup row or add increments to the existing one"""
+    table = model.__table__
+    row = {**keys, **increments, **(values or {})}
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table).values(**row)
+        updates = {column: table.c[column] + insert.excluded[column] for column in increments}
+        updates.update({column: insert.excluded[column] for column in (values or {})})
+        db.session.execute(insert.on_conflict_do_update(index_elements=list(keys), set_=updates))
+        return
+
+    existing = db.session.get(model, tuple(keys[column.name] for column in table.primary_key.columns))
+    if existing is None:
+        db.session.add(model(**row))
+    else:
+        for column, amount in increments.items():
+            setattr(existing, column, getattr(existing, column) + amount)
+        for column, value in (values or {}).items():
+            setattr(existing, column, value)
+
+
+def record_order_outcome(order_id, outcome, payment_method=None, at=None):
+    """Add a paid or cancelled order to the rollups; call in the transaction changing its status"""
+    at = at or italy_now()
+    order = db.session.execute(
+        select(Order.order_type, Order.final_amount).where(Order.id == order_id)
+    ).one()
+    paid = outcome == 'paid'
+    items_query = (
+        select(OrderItem.menu_item_id, OrderItem.menu_item_name, OrderItem.quantity, OrderItem.total_price)
+        .where(OrderItem.order_id == order_id)
+    )
+    if paid:
+        items_query = items_query.where(OrderItem.status != 'cancelled')
+    # A cancelled order counts all its items: they are already cancelled along with it
+    items = db.session.execute(items_query).all()
+    amount = order.final_amount or 0
+    quantity = sum(item.quantity for item in items)
+
+    upsert_increment(
+        SalesRollup,
+        {
+            'day': at.date(),
+            'hour': at.hour,
+            'order_type': order.order_type,
+            'payment_method': (payment_method or 'unknown') if paid else NO_PAYMENT
+        },
+        {
+            'paid_orders': 1 if paid else 0,
+            'revenue': amount if paid else 0,
+            'items_sold': quantity if paid else 0,
+            'cancelled_orders': 0 if paid else 1,
+            'cancelled_amount': 0 if paid else amount
+        }
+    )
+    for item in items:
+        upsert_increment(
+            MenuItemSalesRollup,
+            {'day': at.date(), 'menu_item_id': item.menu_item_id},
+            {
+                'quantity_sold': item.quantity if paid else 0,
+                'revenue': (item.total_price or 0) if paid else 0,
+                'quantity_cancelled': 0 if paid else item.quantity
+            },
+            {'menu_item_name': item.menu_item_name}
+        )
+
+
+def rebuild_rollups():
+    """Recompute the rollups from the order history (one-off backfill).
+
+    The payment method and time are not stored on orders, so backfilled rows use
+    'unknown' and the order's last update time.
+    """
+    db.session.execute(delete(SalesRollup))
+    db.session.execute(delete(MenuItemSalesRollup))
+    orders = db.session.execute(
+        select(Order.id, Order.status, Order.updated_at).where(Order.status.in_(['payed', 'cancelled']))
+    ).all()
+    for order in orders:
+        record_order_outcome(
+            order.id,
+            'paid' if order.status == 'payed' else 'cancelled',
+            at=order.updated_at or datetime.now()
+        )
+    db.session.commit()
+    return len(orders)
@@ -1,14 +1,43 @@
-from flask import Blueprint, request, jsonify
-from models import db, Order, OrderItem
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from models import db, Order, OrderItem, IdempotencyKey, OrderProcessing, PrepTimeStat, italy_now
+from db_routing import read_only
+from json_provider import json_dumps
+from logging_utils import request_id_headers
+from metrics import observe_upstream
+from tracing import start_span, traceparent_headers
+from outbox import add_outbox_event
+from event_handlers import get_cached_menu_item
+from order_processing import enqueue_order_processing
+from kitchen import (
+    get_kitchen_queue, order_tasks, add_kitchen_tasks, DEFAULT_STATION, DEFAULT_PREPARATION_TIME,
+    ACTIVE_ORDER_STATUSES, ACTIVE_ITEM_STATUSES
+)
+from reporting import record_order_outcome
+from prep_stats import record_item_transitions, record_prep_samples, get_prep_estimates, ALL_HOURS
+from state_machine import (
+    check_order_transition, check_item_transition, cascaded_item_sources, transition_orders,
+    transition_item, item_changed, InvalidTransition, ORDER_STATUSES, ITEM_STATUSES, ORDER_ITEM_CASCADE
+)
+from serialization import (
+    serialize_order, serialize_order_item, parse_order_fields, project_row,
+    ORDER_FIELDS, ORDER_ITEM_FIELDS
+)
+from sqlalchemy import select, delete, func
 from sqlalchemy.exc import IntegrityError
 from marshmallow import Schema, fields, ValidationError
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 import requests
+import time
+import csv
+import io
+import logging
 
 order_bp = Blueprint('orders', __name__)
+logger = logging.getLogger(__name__)
 
 # Configuration - URL del menu service
 MENU_SERVICE_URL = 'http://localhost:3001'
+MAX_BULK_STATUS_ORDERS = 100
 
 # Marshmallow schemas
 class OrderItemSchema(Schema):
@@ -33,8 +62,18 @@ class OrderSchema(Schema):
     class Meta:
         unknown = 'exclude'  # Ignore unknown fields from frontend
 
+class BulkStatusOrderSchema(Schema):
+    id = fields.Str(required=True)
+    version = fields.Int(allow_none=True)
+
+class BulkStatusSchema(Schema):
+    status = fields.Str(required=True, validate=lambda x: x in ORDER_STATUSES)
+    orders = fields.List(fields.Nested(BulkStatusOrderSchema), required=True,
+                         validate=lambda x: 0 < len(x) <= MAX_BULK_STATUS_ORDERS)
+
 order_schema = OrderSchema()
 order_items_schema = OrderItemSchema(many=True)
+bulk_status_schema = BulkStatusSchema()
 
 
 def generate_order_number():
@@ -45,17 +84,240 @@ def generate_order_number():
     return f"ORD-{prefix}-{suffix}"
 
 
+def select_orders(order_fields=None):
+    """SELECT over the order columns needed for the requested fields (id is always loaded)"""
+    if order_fields is None:
+        return select(Order.__table__)
+    columns = dict.fromkeys(['id', *order_fields])
+    return select(*[Order.__table__.c[column] for column in columns])
+
+
+def fetch_orders_data(order_rows, order_fields=None, item_fields=None):
+    """Serialize order rows, loading the items of all orders with a single query.
+
+    order_fields/item_fields come from parse_order_fields: None selects every
+    field, an empty item_fields tuple skips the items query altogether.
+    """
+    items_by_order = {}
+    order_ids = [row.id for row in order_rows]
+    include_items = item_fields != ()
+    if order_ids and include_items:
+        if item_fields is None:
+            items_query = select(OrderItem.__table__)
+        else:
+            columns = dict.fromkeys(['order_id', *item_fields])
+            items_query = select(*[OrderItem.__table__.c[column] for column in columns])
+        items_result = db.session.execute(
+            items_query
+            .where(OrderItem.order_id.in_(order_ids))
+            .order_by(OrderItem.created_at)
+        )
+        for item in items_result:
+            if item_fields is None:
+                item_data = serialize_order_item(item)
+            else:
+                item_data = project_row(item, item_fields, ORDER_ITEM_FIELDS)
+            items_by_order.setdefault(item.order_id, []).append(item_data)
+
+    if order_fields is None:
+        return [serialize_order(row, items_by_order.get(row.id, [])) for row in order_rows]
+
+    orders = []
+    for row in order_rows:
+        order_data = project_row(row, order_fields, ORDER_FIELDS)
+        if include_items:
+            order_data['items'] = items_by_order.get(row.id, [])
+        orders.append(order_data)
+    return orders
+
+
+def fetch_order_data(order_id, order_fields=None, item_fields=None):
+    """Serialize a single order with its items, or None if it does not exist"""
+    order_row = db.session.execute(
+        select_orders(order_fields).where(Order.id == order_id)
+    ).fetchone()
+    if not order_row:
+        return None
+    return fetch_orders_data([order_row], order_fields, item_fields)[0]
+
+
+def fetch_orders_by_id(order_ids):
+    """Serialize several orders with their items"""
+    order_rows = db.session.execute(select_orders().where(Order.id.in_(order_ids))).all()
+    return fetch_orders_data(order_rows)
+
+
+def invalid_fields_response(error):
+    return jsonify({
+        'success': False,
+        'message': 'Invalid fields parameter',
+        'error': str(error)
+    }), 400
+
+
+def parse_expected_version(data):
+    """Optional 'version' of a request body: the version the client based its change on"""
+    version = data.get('version')
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+        raise ValueError('version must be an integer')
+    return version
+
+
+def version_conflict_response(order_id, message):
+    """Roll back and answer 409 with the current order, so the client can retry on top of it"""
+    db.session.rollback()
+    return jsonify({
+        'success': False,
+        'message': message,
+        'data': fetch_order_data(order_id)
+    }), 409
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+_last_idempotency_purge = 0.0
+
+
+def find_idempotent_response(key):
+    """Replay the stored response for an idempotency key, or None if unknown/expired"""
+    stored = db.session.get(IdempotencyKey, key)
+    if not stored:
+        return None
+
+    cutoff = italy_now() - timedelta(hours=current_app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    if stored.created_at < cutoff:
+        # Expired: free the key so the request is processed as new
+        db.session.delete(stored)
+        db.session.commit()
+        return None
+
+    response = current_app.response_class(
+        stored.response_body,
+        status=stored.response_status,
+        mimetype='application/json'
+    )
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def purge_expired_idempotency_keys():
+    """Delete expired keys, at most once per purge interval per process"""
+    global _last_idempotency_purge
+    now = time.monotonic()
+    if now - _last_idempotency_purge < current_app.config.get('IDEMPOTENCY_PURGE_INTERVAL_SECONDS', 60):
+        return
+    _last_idempotency_purge = now
+    cutoff = italy_now() - timedelta(hours=current_app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+
+
+def get_menu_service_url():
+    """Menu service base URL from app config"""
+    return current_app.config.get('MENU_SERVICE_URL', MENU_SERVICE_URL)
+
+
+def post_to_menu_service(path, payload):
+    """POST to the menu service, recording the call latency"""
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        with start_span(f'POST {path}', kind='client', **{'peer.service': 'menu-service'}) as span:
+            response = requests.post(
+                f"{get_menu_service_url()}{path}", json=payload,
+                headers={**request_id_headers(), **traceparent_headers()}, timeout=5
+            )
+            status = response.status_code
+            if span is not None:
+                span.set_attribute('http.status_code', status)
+        return response
+    finally:
+        observe_upstream('menu-service', status, time.perf_counter() - started)
+
+
+def reserve_menu_items(items):
+    """Reserve stock for the order items on the menu service.
+
+    Returns (reserved_items, unavailable_items). reserved_items is None when the
+    menu service could not be reached.
+    """
+    payload = {'items': [
+        {'menu_item_id': item['menu_item_id'], 'quantity': item['quantity']} for item in items
+    ]}
+    try:
+        response = post_to_menu_service('/api/menu/reservations', payload)
+        body = response.json()
+        if response.status_code == 409:
+            return [], body.get('unavailable_items', [])
+        if response.ok:
+            return body.get('data', []), []
+        logger.warning('Menu reservation failed with HTTP %s: %s', response.status_code, body)
+    except Exception as e:
+        logger.warning('Could not reserve menu items: %s', e)
+    return None, []
+
+
+def release_menu_items(items):
+    """Give back stock reserved for an order that was not created"""
+    payload = {'items': [
+        {'menu_item_id': item['menu_item_id'], 'quantity': item['quantity']} for item in items
+    ]}
+    try:
+        post_to_menu_service('/api/menu/reservations/release', payload)
+    except Exception as e:
+        logger.warning('Could not release menu items: %s', e)
+
+
+def apply_menu_details(items, reserved_items):
+    """Set preparation_time and station (menu category) on order items from the
+    reservation response, or from the menu events cache"""
+    menu_items = {item['id']: item for item in (reserved_items or [])}
+    for item in items:
+        menu_item = menu_items.get(item['menu_item_id']) or get_cached_menu_item(item['menu_item_id']) or {}
+        if menu_item.get('preparation_time'):
+            item['preparation_time'] = menu_item['preparation_time']
+        if menu_item.get('category'):
+            item['station'] = menu_item['category']
+    
+    # Observed preparation times replace the static menu value once there is enough history
+    learned = get_prep_estimates(
+        [item['menu_item_id'] for item in items],
+        italy_now().hour,
+        statistic=current_app.config.get('PREP_ESTIMATE_STATISTIC', 'p50'),
+        min_samples=current_app.config.get('PREP_STATS_MIN_SAMPLES', 5)
+    )
+    for item in items:
+        if learned.get(item['menu_item_id']):
+            item['preparation_time'] = max(round(learned[item['menu_item_id']]), 1)
+
+
+def wants_async_processing():
+    """Async mode is requested with `Prefer: respond-async` or enabled for every order in config"""
+    preferences = [value.strip().lower() for value in request.headers.get('Prefer', '').split(',')]
+    return 'respond-async' in preferences or current_app.config.get('ORDER_PROCESSING_MODE') == 'async'
+
+
 def calculate_estimated_completion_time(items):
-    """Calculate estimated completion time based on preparation times"""
-    from models import italy_now
-    # Get the maximum preparation time from all items
-    max_prep_time = max([item.get('preparation_time', 15) for item in items], default=15)
-    # Add 5 minutes buffer
-    estimated_minutes = max_prep_time + 5
-    return italy_now() + timedelta(minutes=estimated_minutes)
+    """Estimate completion time from the kitchen queue and the items' preparation times"""
+    return get_kitchen_queue().estimate_completion_time([
+        (item.get('station') or DEFAULT_STATION, item.get('preparation_time') or DEFAULT_PREPARATION_TIME)
+        for item in items
+    ])
+
+
+def release_kitchen_work(order_ids=(), order_item_ids=()):
+    """Drop completed work from the kitchen queue and re-estimate the orders still waiting"""
+    kitchen = get_kitchen_queue()
+    for order_id in order_ids:
+        kitchen.complete_order(order_id)
+    kitchen.complete_items(order_item_ids)
+    try:
+        kitchen.refresh_queued_etas()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning('Could not refresh queued order ETAs: %s', e)
 
 
 @order_bp.route('/', methods=['GET'])
+@read_only
 def get_all_orders():
     """Get all orders with optional filtering"""
     try:
@@ -63,34 +325,42 @@ def get_all_orders():
         status = request.args.get('status')
         table_number = request.args.get('table_number')
         order_type = request.args.get('order_type')
+        try:
+            order_fields, item_fields = parse_order_fields(request.args.get('fields'))
+        except ValueError as e:
+            return invalid_fields_response(e)
         
-        query = Order.query
+        query = select_orders(order_fields)
         
         # Apply filters
         if status:
             if status == 'active':
                 # Active orders are pending, confirmed, or preparing
-                query = query.filter(Order.status.in_(['pending', 'confirmed', 'preparing']))
+                query = query.where(Order.status.in_(['pending', 'confirmed', 'preparing']))
             else:
-                query = query.filter(Order.status == status)
+                query = query.where(Order.status == status)
         
         if table_number:
-            query = query.filter(Order.table_number == int(table_number))
+            query = query.where(Order.table_number == int(table_number))
         
         if order_type:
-            query = query.filter(Order.order_type == order_type)
+            query = query.where(Order.order_type == order_type)
         
         # Order by creation date (newest first)
-        orders = query.order_by(Order.created_at.desc()).all()
+        orders = fetch_orders_data(
+            db.session.execute(query.order_by(Order.created_at.desc())).all(),
+            order_fields,
+            item_fields
+        )
         
         return jsonify({
             'success': True,
-            'data': [order.to_dict() for order in orders],
+            'data': orders,
             'count': len(orders)
         })
         
     except Exception as e:
-        print(f"Error in get_all_orders: {str(e)}")
+        logger.exception('Error in get_all_orders')
         return jsonify({
             'success': False,
             'message': 'Error fetching orders',
@@ -98,13 +368,205 @@ def get_all_orders():
         }), 500
 
 
+ORDER_CSV_COLUMNS = [
+    'order_number', 'created_at', 'status', 'order_type', 'table_number', 'customer_name',
+    'order_total_amount', 'order_tax_amount', 'order_discount_amount', 'order_final_amount',
+    'menu_item_id', 'menu_item_name', 'quantity', 'unit_price', 'total_price', 'item_status'
+]
+
+
+def csv_datetime(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+@order_bp.route('/export', methods=['GET'])
+@read_only
+def export_orders():
+    """Stream orders as NDJSON (one order per line) or CSV (one line per item).
+
+    Orders are read through a server-side cursor in EXPORT_BATCH_SIZE batches and
+    the items of each batch are loaded with one query, so memory use does not
+    grow with the date range. ?from=/&to= (YYYY-MM-DD, inclusive) filter on
+    created_at, ?status= defaults to paid orders.
+    """
+    data_format = request.args.get('format', 'ndjson')
+    if data_format not in ('csv', 'ndjson'):
+        return jsonify({
+            'success': False,
+            'message': 'Invalid format. Must be one of: csv, ndjson'
+        }), 400
+    
+    conditions = [Order.status == request.args.get('status', 'payed')]
+    try:
+        if request.args.get('from'):
+            conditions.append(Order.created_at >= date.fromisoformat(request.args['from']))
+        if request.args.get('to'):
+            conditions.append(Order.created_at < date.fromisoformat(request.args['to']) + timedelta(days=1))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid date range',
+            'error': str(e)
+        }), 400
+    
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 500)
+    
+    def iter_orders():
+        statement = select_orders().where(*conditions).order_by(Order.created_at, Order.id).execution_options(
+            yield_per=batch_size
+        )
+        for batch in db.session.execute(statement).partitions():
+            yield from fetch_orders_data(batch)
+    
+    def generate_ndjson():
+        for order in iter_orders():
+            yield json_dumps(order) + '\n'
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=ORDER_CSV_COLUMNS)
+        writer.writeheader()
+        for order in iter_orders():
+            order_columns = {
+                'order_number': order['order_number'],
+                'created_at': csv_datetime(order['created_at']),
+                'status': order['status'],
+                'order_type': order['order_type'],
+                'table_number': order['table_number'],
+                'customer_name': order['customer_name'],
+                'order_total_amount': order['total_amount'],
+                'order_tax_amount': order['tax_amount'],
+                'order_discount_amount': order['discount_amount'],
+                'order_final_amount': order['final_amount']
+            }
+            for item in order['items']:
+                writer.writerow({
+                    **order_columns,
+                    'menu_item_id': item['menu_item_id'],
+                    'menu_item_name': item['menu_item_name'],
+                    'quantity': item['quantity'],
+                    'unit_price': item['unit_price'],
+                    'total_price': item['total_price'],
+                    'item_status': item['status']
+                })
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+    
+    if data_format == 'csv':
+        return Response(
+            stream_with_context(generate_csv()),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=orders.csv'}
+        )
+    
+    return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+
+
+@order_bp.route('/prep-list', methods=['GET'])
+@read_only
+def get_prep_list():
+    """Quantities to prepare per menu item and item status across active orders"""
+    try:
+        item_statuses = ['pending', 'preparing', 'ready']
+        if request.args.get('status'):
+            item_statuses = [status.strip() for status in request.args['status'].split(',') if status.strip()]
+        
+        # One grouped query instead of loading every active order with its items
+        rows = db.session.execute(
+            select(
+                OrderItem.menu_item_id,
+                OrderItem.menu_item_name,
+                OrderItem.status,
+                func.sum(OrderItem.quantity).label('quantity'),
+                func.count(func.distinct(OrderItem.order_id)).label('order_count')
+            )
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(Order.status.in_(ACTIVE_ORDER_STATUSES), OrderItem.status.in_(item_statuses))
+            .group_by(OrderItem.menu_item_id, OrderItem.menu_item_name, OrderItem.status)
+        ).all()
+        
+        prep_list = {}
+        for row in rows:
+            entry = prep_list.setdefault(row.menu_item_id, {
+                'menu_item_id': row.menu_item_id,
+                'menu_item_name': row.menu_item_name,
+                'total_quantity': 0,
+                'by_status': {}
+            })
+            entry['total_quantity'] += int(row.quantity)
+            entry['by_status'][row.status] = {'quantity': int(row.quantity), 'orders': row.order_count}
+        
+        data = sorted(prep_list.values(), key=lambda entry: (-entry['total_quantity'], entry['menu_item_name']))
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'count': len(data)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching prep list',
+            'error': str(e)
+        }), 500
+
+
+@order_bp.route('/stats/prep-times', methods=['GET'])
+@read_only
+def get_prep_time_stats():
+    """Observed preparation times per menu item (?menu_item_id=, ?hour=0-23, default all day)"""
+    try:
+        hour = request.args.get('hour', type=int)
+        query = select(PrepTimeStat).where(PrepTimeStat.hour == (ALL_HOURS if hour is None else hour))
+        if request.args.get('menu_item_id'):
+            query = query.where(PrepTimeStat.menu_item_id == request.args['menu_item_id'])
+        stats = db.session.scalars(query.order_by(PrepTimeStat.menu_item_name)).all()
+        
+        return jsonify({
+            'success': True,
+            'data': [stat.to_dict() for stat in stats],
+            'count': len(stats)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching preparation time stats',
+            'error': str(e)
+        }), 500
+
+
+@order_bp.route('/kitchen/load', methods=['GET'])
+def get_kitchen_load():
+    """Outstanding kitchen work per station, as used for completion time estimates"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': get_kitchen_queue().station_load()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching kitchen load',
+            'error': str(e)
+        }), 500
+
+
 @order_bp.route('/<string:order_id>', methods=['GET'])
 def get_order_by_id(order_id):
     """Get order by ID"""
     try:
-        order = Order.query.get(order_id)
+        try:
+            order_fields, item_fields = parse_order_fields(request.args.get('fields'))
+        except ValueError as e:
+            return invalid_fields_response(e)
         
-        if not order:
+        order_dict = fetch_order_data(order_id, order_fields, item_fields)
+        
+        if not order_dict:
             return jsonify({
                 'success': False,
                 'message': 'Order not found'
@@ -112,11 +574,11 @@ def get_order_by_id(order_id):
         
         return jsonify({
             'success': True,
-            'data': order.to_dict()
+            'data': order_dict
         })
         
     except Exception as e:
-        print(f"Error in get_order_by_id: {str(e)}")
+        logger.exception('Error in get_order_by_id')
         return jsonify({
             'success': False,
             'message': 'Error fetching order',
@@ -127,43 +589,49 @@ def get_order_by_id(order_id):
 @order_bp.route('/', methods=['POST'])
 def create_order():
     """Create a new order"""
+    reserved_items = None
+    validated_data = None
+    idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
     try:
+        # Retries with a known key get the original response, without re-validating or re-inserting
+        if idempotency_key:
+            if len(idempotency_key) > 255:
+                return jsonify({
+                    'success': False,
+                    'message': f'{IDEMPOTENCY_HEADER} must be at most 255 characters'
+                }), 400
+            replay = find_idempotent_response(idempotency_key)
+            if replay:
+                return replay
+        
         data = request.json
-        print(f"Received order data: {data}")
+        logger.debug('Received order data', extra={'payload': data})
         
         # Validate request data
         try:
             validated_data = order_schema.load(data)
         except ValidationError as err:
-            print(f"Validation error: {err.messages}")
+            logger.info('Order validation failed', extra={'errors': err.messages})
             return jsonify({
                 'success': False,
                 'message': 'Validation error',
                 'errors': err.messages
             }), 400
         
-        # Verify menu items availability with menu service
-        menu_item_ids = [item['menu_item_id'] for item in validated_data['items']]
-        try:
-            menu_response = requests.get(f"{MENU_SERVICE_URL}/api/menu/available", timeout=5)
-            if menu_response.ok:
-                available_items = {item['id']: item for item in menu_response.json().get('data', [])}
-                
-                # Check if all ordered items are available
-                unavailable_items = []
-                for item_id in menu_item_ids:
-                    if item_id not in available_items:
-                        unavailable_items.append(item_id)
-                
-                if unavailable_items:
-                    return jsonify({
-                        'success': False,
-                        'message': 'Some menu items are not available',
-                        'unavailable_items': unavailable_items
-                    }), 400
-        except Exception as e:
-            print(f"Warning: Could not verify menu availability: {str(e)}")
-            # Continue anyway - menu service might be temporarily unavailable
+        if wants_async_processing():
+            return accept_order(validated_data, idempotency_key)
+        
+        # Reserve stock on the menu service (also checks availability)
+        reserved_items, unavailable_items = reserve_menu_items(validated_data['items'])
+        if unavailable_items:
+            return jsonify({
+                'success': False,
+                'message': 'Some menu items are not available',
+                'unavailable_items': unavailable_items
+            }), 400
+        # Continue anyway if the menu service is temporarily unavailable
+        
+        apply_menu_details(validated_data['items'], reserved_items)
         
         # Calculate totals
         total_amount = sum(item['total_price'] for item in validated_data['items'])
@@ -178,6 +646,7 @@ def create_order():
             customer_name=validated_data.get('customer_name'),
             order_type=validated_data['order_type'],
             status='confirmed',
+            stock_reserved=reserved_items is not None,
             total_amount=total_amount,
             tax_amount=tax_amount,
             discount_amount=discount_amount,
@@ -190,6 +659,7 @@ def create_order():
         db.session.flush()  # Get order ID
         
         # Create order items
+        order_items = []
         for item_data in validated_data['items']:
             order_item = OrderItem(
                 order_id=order.id,  # Now it's already a string
@@ -202,20 +672,47 @@ def create_order():
                 status='preparing'
             )
             db.session.add(order_item)
-        
+            order_items.append(order_item)
+        
+        # Serialize from the objects in hand instead of reloading them after commit
+        db.session.flush()
+        kitchen_tasks = order_tasks(order_items, validated_data['items'])
+        add_kitchen_tasks(order.id, kitchen_tasks)
+        order_dict = serialize_order(order, [serialize_order_item(item) for item in order_items])
+        response_body = {
+            'success': True,
+            'message': 'Order created successfully',
+            'data': order_dict
+        }
+        
+        # Stored in the same transaction: a concurrent duplicate fails on the key's unique constraint
+        if idempotency_key:
+            db.session.add(IdempotencyKey(
+                key=idempotency_key,
+                order_id=order.id,
+                response_status=201,
+                response_body=json_dumps(response_body)
+            ))
+            purge_expired_idempotency_keys()
+        
+        add_outbox_event('order.created', order.id, order_dict)
         db.session.commit()
+        get_kitchen_queue().add_order(order.id, kitchen_tasks, order.estimated_completion_time)
         
-        print(f"Order created successfully: {order.order_number}")
+        logger.info('Order created: %s', order.order_number, extra={'order_id': order.id})
         
-        return jsonify({
-            'success': True,
-            'message': 'Order created successfully',
-            'data': order.to_dict()
-        }), 201
+        return jsonify(response_body), 201
         
     except IntegrityError as e:
         db.session.rollback()
-        print(f"IntegrityError: {str(e)}")
+        if reserved_items:
+            release_menu_items(validated_data['items'])
+        if idempotency_key:
+            # Lost the race against a concurrent request with the same key
+            replay = find_idempotent_response(idempotency_key)
+            if replay:
+                return replay
+        logger.warning('Order integrity error: %s', e)
         return jsonify({
             'success': False,
             'message': 'Database integrity error',
@@ -223,9 +720,9 @@ def create_order():
         }), 400
     except Exception as e:
         db.session.rollback()
-        print(f"Error in create_order: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        if reserved_items:
+            release_menu_items(validated_data['items'])
+        logger.exception('Error in create_order')
         return jsonify({
             'success': False,
             'message': 'Error creating order',
@@ -233,6 +730,145 @@ def create_order():
         }), 500
 
 
+def accept_order(validated_data, idempotency_key=None):
+    """Store a validated order as pending and leave stock, timing and confirmation to the workers"""
+    total_amount = sum(item['total_price'] for item in validated_data['items'])
+    
+    order = Order(
+        order_number=generate_order_number(),
+        table_number=validated_data['table_number'],
+        customer_name=validated_data.get('customer_name'),
+        order_type=validated_data['order_type'],
+        status='pending',
+        total_amount=total_amount,
+        tax_amount=0,
+        discount_amount=0,
+        final_amount=total_amount,
+        special_instructions=validated_data.get('special_instructions')
+    )
+    db.session.add(order)
+    db.session.flush()
+    
+    for item_data in validated_data['items']:
+        db.session.add(OrderItem(
+            order_id=order.id,
+            menu_item_id=item_data['menu_item_id'],
+            menu_item_name=item_data['menu_item_name'],
+            quantity=item_data['quantity'],
+            unit_price=item_data['unit_price'],
+            total_price=item_data['total_price'],
+            special_instructions=item_data.get('special_instructions'),
+            status='pending'
+        ))
+    db.session.add(OrderProcessing(order_id=order.id, state='queued'))
+    
+    status_url = f"/api/orders/{order.id}/processing"
+    response_body = {
+        'success': True,
+        'message': 'Order accepted for processing',
+        'data': {
+            'id': order.id,
+            'order_number': order.order_number,
+            'status': 'pending',
+            'status_url': status_url
+        }
+    }
+    if idempotency_key:
+        db.session.add(IdempotencyKey(
+            key=idempotency_key,
+            order_id=order.id,
+            response_status=202,
+            response_body=json_dumps(response_body)
+        ))
+        purge_expired_idempotency_keys()
+    
+    db.session.commit()
+    enqueue_order_processing(order.id)
+    
+    logger.info('Order accepted for processing: %s', order.order_number, extra={'order_id': order.id})
+    
+    response = jsonify(response_body)
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    response.headers['Preference-Applied'] = 'respond-async'
+    return response
+
+
+@order_bp.route('/<string:order_id>/processing', methods=['GET'])
+def get_order_processing(order_id):
+    """Processing state of an order accepted asynchronously, with the order once confirmed"""
+    try:
+        processing = db.session.get(OrderProcessing, order_id)
+        if not processing:
+            return jsonify({
+                'success': False,
+                'message': 'No processing record for this order'
+            }), 404
+        
+        processing_dict = processing.to_dict()
+        processing_dict['order'] = fetch_order_data(order_id) if processing.state == 'confirmed' else None
+        
+        return jsonify({
+            'success': True,
+            'data': processing_dict
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching order processing state',
+            'error': str(e)
+        }), 500
+
+
+def apply_order_transition(order_rows, new_status):
+    """Move orders already checked against the state machine to new_status.
+
+    One guarded UPDATE moves the orders and cascades their items; the events,
+    report rollups and kitchen stats of every order are recorded with it.
+    Returns False, for the caller to roll back, if any order changed since
+    it was read.
+    """
+    order_ids = [row.id for row in order_rows]
+    items = db.session.execute(
+        select(OrderItem.id, OrderItem.order_id, OrderItem.menu_item_id, OrderItem.status, OrderItem.quantity)
+        .where(OrderItem.order_id.in_(order_ids))
+    ).all()
+    if not transition_orders([(row.id, row.version) for row in order_rows], new_status):
+        return False
+    
+    items_by_order = {}
+    for item in items:
+        items_by_order.setdefault(item.order_id, []).append(item)
+    for row in order_rows:
+        event_payload = {'order_id': row.id, 'status': new_status, 'previous_status': row.status}
+        if new_status == 'cancelled' and row.stock_reserved:
+            # Consumers (menu-inventory) give the reserved stock back
+            event_payload['items'] = [
+                {'menu_item_id': item.menu_item_id, 'quantity': item.quantity}
+                for item in items_by_order.get(row.id, [])
+            ]
+        add_outbox_event('order.status_changed', row.id, event_payload)
+        if new_status in ['payed', 'cancelled']:
+            record_order_outcome(row.id, 'paid' if new_status == 'payed' else 'cancelled')
+    
+    # Orders leaving the kitchen complete every item still in preparation
+    if new_status == 'ready':
+        kitchen_order_ids = {row.id for row in order_rows if row.status in ACTIVE_ORDER_STATUSES}
+        record_prep_samples(
+            [item.id for item in items if item.order_id in kitchen_order_ids and item.status in ACTIVE_ITEM_STATUSES],
+            window_size=current_app.config.get('PREP_STATS_WINDOW', 100)
+        )
+    
+    item_sources = cascaded_item_sources(new_status)
+    if item_sources:
+        record_item_transitions(
+            [(item.id, item.order_id, item.menu_item_id, item.status) for item in items if item.status in item_sources],
+            ORDER_ITEM_CASCADE[new_status]
+        )
+    return True
+
+
 @order_bp.route('/<string:order_id>/status', methods=['PUT'])
 def update_order_status(order_id):
     """Update order status"""
@@ -250,7 +886,7 @@ def update_order_status(order_id):
         # Find order using raw SQL (SQLite compatible)
         from sqlalchemy import text
         result = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
+            text("SELECT id, status, version, stock_reserved FROM orders WHERE id = :order_id"),
             {'order_id': order_id}
         ).fetchone()
         
@@ -270,61 +906,49 @@ def update_order_status(order_id):
             }), 400
         
         # Validate status
-        valid_statuses = ['pending', 'confirmed', 'preparing', 'ready', 'delivered', 'payed', 'cancelled']
-        if new_status not in valid_statuses:
+        if new_status not in ORDER_STATUSES:
             return jsonify({
                 'success': False,
-                'message': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
+                'message': f'Invalid status. Must be one of: {", ".join(ORDER_STATUSES)}'
             }), 400
         
-        print(f"Updating order {order_id} status to {new_status}")
-        
-        # Update order status using raw SQL (SQLite compatible)
-        db.session.execute(
-            text("UPDATE orders SET status = :status, updated_at = CURRENT_TIMESTAMP WHERE id = :order_id"),
-            {'status': new_status, 'order_id': order_id}
-        )
+        try:
+            client_version = parse_expected_version(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        if client_version is not None and client_version != result.version:
+            return version_conflict_response(order_id, f'Order was modified (now version {result.version}), reload and retry')
         
-        # Update all items status when order status changes
-        if new_status in ['preparing', 'ready', 'delivered']:
-            db.session.execute(
-                text("""
-                    UPDATE order_items 
-                    SET status = :item_status, updated_at = CURRENT_TIMESTAMP 
-                    WHERE order_id = :order_id AND status = 'pending'
-                """),
-                {'item_status': new_status if new_status != 'confirmed' else 'pending', 'order_id': order_id}
-            )
+        if new_status == result.status:
+            # Repeated request: nothing to change
+            return jsonify({
+                'success': True,
+                'message': 'Order status unchanged',
+                'data': fetch_order_data(order_id)
+            })
         
-        db.session.commit()
+        try:
+            check_order_transition(result.status, new_status)
+        except InvalidTransition as e:
+            return version_conflict_response(order_id, str(e))
         
-        print(f"Order status updated successfully")
+        logger.debug('Updating order %s status to %s', order_id, new_status)
         
-        # Get updated order data
-        updated_order = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
+        if not apply_order_transition([result], new_status):
+            return version_conflict_response(order_id, 'Order was changed by another request, reload and retry')
         
-        # Get order items
-        items_result = db.session.execute(
-            text("SELECT * FROM order_items WHERE order_id = :order_id ORDER BY created_at"),
-            {'order_id': order_id}
-        ).fetchall()
+        db.session.commit()
         
-        # Convert to dict format
-        order_dict = dict(updated_order._mapping)
-        order_dict['id'] = str(order_dict['id'])
+        if new_status in ['ready', 'delivered', 'payed', 'cancelled']:
+            release_kitchen_work(order_ids=[order_id])
         
-        items_dict = []
-        for item in items_result:
-            item_dict = dict(item._mapping)
-            item_dict['id'] = str(item_dict['id'])
-            item_dict['order_id'] = str(item_dict['order_id'])
-            item_dict['menu_item_id'] = str(item_dict['menu_item_id'])
-            items_dict.append(item_dict)
+        logger.info('Order %s status updated to %s', order_id, new_status, extra={'order_id': order_id, 'status': new_status})
         
-        order_dict['items'] = items_dict
+        # Get updated order data
+        order_dict = fetch_order_data(order_id)
         
         return jsonify({
             'success': True,
@@ -334,9 +958,7 @@ def update_order_status(order_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in update_order_status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in update_order_status')
         return jsonify({
             'success': False,
             'message': 'Error updating order status',
@@ -344,6 +966,86 @@ def update_order_status(order_id):
         }), 500
 
 
+@order_bp.route('/status', methods=['PUT'])
+def update_orders_status():
+    """Update the status of several orders at once: all of them change, or none"""
+    try:
+        try:
+            data = bulk_status_schema.load(request.json or {})
+        except ValidationError as err:
+            return jsonify({
+                'success': False,
+                'message': 'Validation error',
+                'errors': err.messages
+            }), 400
+        
+        new_status = data['status']
+        requested_versions = {order['id']: order.get('version') for order in data['orders']}
+        rows = db.session.execute(
+            select(Order.id, Order.status, Order.version, Order.stock_reserved)
+            .where(Order.id.in_(list(requested_versions)))
+        ).all()
+        
+        missing = [order_id for order_id in requested_versions if order_id not in {row.id for row in rows}]
+        if missing:
+            return jsonify({
+                'success': False,
+                'message': f'Orders not found: {", ".join(missing)}'
+            }), 404
+        
+        conflicts = []
+        for row in rows:
+            expected = requested_versions[row.id]
+            if expected is not None and expected != row.version:
+                conflicts.append({'id': row.id, 'error': f'Order was modified (now version {row.version})'})
+            elif row.status != new_status:
+                try:
+                    check_order_transition(row.status, new_status)
+                except InvalidTransition as e:
+                    conflicts.append({'id': row.id, 'error': str(e)})
+        
+        if conflicts:
+            return jsonify({
+                'success': False,
+                'message': 'Some orders cannot change status, nothing was updated',
+                'errors': conflicts,
+                'data': fetch_orders_by_id(list(requested_versions))
+            }), 409
+        
+        order_rows = [row for row in rows if row.status != new_status]
+        logger.debug('Updating %s orders status to %s', len(order_rows), new_status)
+        
+        if not apply_order_transition(order_rows, new_status):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'Some orders were changed by another request, reload and retry',
+                'data': fetch_orders_by_id(list(requested_versions))
+            }), 409
+        
+        db.session.commit()
+        
+        if order_rows and new_status in ['ready', 'delivered', 'payed', 'cancelled']:
+            release_kitchen_work(order_ids=[row.id for row in order_rows])
+        
+        logger.info('%s orders status updated to %s', len(order_rows), new_status, extra={'status': new_status})
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(order_rows)} orders updated',
+            'data': fetch_orders_by_id(list(requested_versions))
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error in update_orders_status')
+        return jsonify({
+            'success': False,
+            'message': 'Error updating orders status',
+            'error': str(e)
+        }), 500
+
+
 @order_bp.route('/<string:order_id>/items/<string:item_id>/status', methods=['PUT'])
 def update_order_item_status(order_id, item_id):
     """Update order item status"""
@@ -362,7 +1064,7 @@ def update_order_item_status(order_id, item_id):
         # Find order using raw SQL (SQLite compatible)
         from sqlalchemy import text
         order_result = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
+            text("SELECT id, status, version FROM orders WHERE id = :order_id"),
             {'order_id': order_id}
         ).fetchone()
         
@@ -374,7 +1076,7 @@ def update_order_item_status(order_id, item_id):
         
         # Find order item using raw SQL (SQLite compatible)
         item_result = db.session.execute(
-            text("SELECT * FROM order_items WHERE id = :item_id AND order_id = :order_id"),
+            text("SELECT id, menu_item_id, status, version FROM order_items WHERE id = :item_id AND order_id = :order_id"),
             {'item_id': item_id, 'order_id': order_id}
         ).fetchone()
         
@@ -394,71 +1096,78 @@ def update_order_item_status(order_id, item_id):
             }), 400
         
         # Validate status
-        valid_statuses = ['pending', 'preparing', 'ready', 'served', 'cancelled']
-        if new_status not in valid_statuses:
+        if new_status not in ITEM_STATUSES:
             return jsonify({
                 'success': False,
-                'message': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
+                'message': f'Invalid status. Must be one of: {", ".join(ITEM_STATUSES)}'
             }), 400
         
-        print(f"Updating item {item_id} status to {new_status}")
+        try:
+            client_version = parse_expected_version(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        if client_version is not None and client_version != item_result.version:
+            return version_conflict_response(order_id, f'Order item was modified (now version {item_result.version}), reload and retry')
         
-        # Update order item status using raw SQL (SQLite compatible)
-        db.session.execute(
-            text("""
-                UPDATE order_items 
-                SET status = :status, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = :item_id AND order_id = :order_id
-            """),
-            {'status': new_status, 'item_id': item_id, 'order_id': order_id}
-        )
+        if new_status == item_result.status:
+            # Repeated request: nothing to change
+            return jsonify({
+                'success': True,
+                'message': 'Order item status unchanged',
+                'data': fetch_order_data(order_id)
+            })
         
-        # Check if all items are ready and update order status
-        all_items_result = db.session.execute(
-            text("""
-                SELECT COUNT(*) as total_count,
-                       COUNT(CASE WHEN status IN ('ready', 'served') THEN 1 END) as ready_count
-                FROM order_items 
-                WHERE order_id = :order_id
-            """),
-            {'order_id': order_id}
-        ).fetchone()
+        try:
+            check_item_transition(item_result.status, new_status)
+        except InvalidTransition as e:
+            return version_conflict_response(order_id, str(e))
         
-        if all_items_result.total_count == all_items_result.ready_count and order_result.status != 'ready':
-            db.session.execute(
-                text("UPDATE orders SET status = 'ready', updated_at = CURRENT_TIMESTAMP WHERE id = :order_id"),
-                {'order_id': order_id}
-            )
+        logger.debug('Updating item %s status to %s', item_id, new_status)
         
-        db.session.commit()
+        if not transition_item(order_id, item_id, item_result.version, new_status):
+            return version_conflict_response(order_id, 'Order item was changed by another request, reload and retry')
         
-        print(f"Order item status updated successfully")
+        record_item_transitions(
+            [(item_id, order_id, item_result.menu_item_id, item_result.status)], new_status
+        )
+        if (new_status in ['ready', 'served'] and item_result.status in ACTIVE_ITEM_STATUSES
+                and order_result.status in ACTIVE_ORDER_STATUSES):
+            record_prep_samples([item_id], window_size=current_app.config.get('PREP_STATS_WINDOW', 100))
+        
+        add_outbox_event('order.item.status_changed', order_id, {
+            'order_id': order_id,
+            'item_id': item_id,
+            'status': new_status,
+            'previous_status': item_result.status
+        })
         
-        # Get updated order data
-        updated_order = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
+        # Every item change bumps the order version: of two chefs finishing the last items at
+        # once only one commits, the other gets a 409 and its retry sees all items done
+        order_status = item_changed(order_id, order_result.version)
+        if order_status is None:
+            return version_conflict_response(order_id, 'Order was changed by another request, reload and retry')
         
-        # Get order items
-        items_result = db.session.execute(
-            text("SELECT * FROM order_items WHERE order_id = :order_id ORDER BY created_at"),
-            {'order_id': order_id}
-        ).fetchall()
+        if order_status != order_result.status:
+            add_outbox_event('order.status_changed', order_id, {
+                'order_id': order_id,
+                'status': order_status,
+                'previous_status': order_result.status
+            })
+        
+        db.session.commit()
         
-        # Convert to dict format
-        order_dict = dict(updated_order._mapping)
-        order_dict['id'] = str(order_dict['id'])
+        if order_status == 'ready' and order_result.status != 'ready':
+            release_kitchen_work(order_ids=[order_id])
+        elif new_status in ['ready', 'served', 'cancelled']:
+            release_kitchen_work(order_item_ids=[item_id])
         
-        items_dict = []
-        for item in items_result:
-            item_dict = dict(item._mapping)
-            item_dict['id'] = str(item_dict['id'])
-            item_dict['order_id'] = str(item_dict['order_id'])
-            item_dict['menu_item_id'] = str(item_dict['menu_item_id'])
-            items_dict.append(item_dict)
+        logger.info('Order item %s status updated to %s', item_id, new_status, extra={'order_id': order_id, 'status': new_status})
         
-        order_dict['items'] = items_dict
+        # Get updated order data
+        order_dict = fetch_order_data(order_id)
         
         return jsonify({
             'success': True,
@@ -468,9 +1177,7 @@ def update_order_item_status(order_id, item_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in update_order_item_status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in update_order_item_status')
         return jsonify({
             'success': False,
             'message': 'Error updating order item status',
@@ -497,12 +1204,14 @@ def delete_order(order_id):
                 'message': 'Can only delete pending or cancelled orders'
             }), 400
         
-        print(f"Deleting order: {order.order_number}")
+        logger.debug('Deleting order: %s', order.order_number)
         
         db.session.delete(order)
+        add_outbox_event('order.deleted', order_id, {'order_id': order_id, 'order_number': order.order_number})
         db.session.commit()
+        release_kitchen_work(order_ids=[order_id])
         
-        print(f"Order deleted successfully: {order.order_number}")
+        logger.info('Order deleted: %s', order.order_number, extra={'order_id': order_id})
         
         return jsonify({
             'success': True,
@@ -511,9 +1220,7 @@ def delete_order(order_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in delete_order: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in delete_order')
         return jsonify({
             'success': False,
             'message': 'Error deleting order',
@@ -549,7 +1256,9 @@ def pay_order(order_id):
             }), 404
         
         # Check if order is in a payable status (ready or delivered)
-        if result.status not in ['ready', 'delivered']:
+        try:
+            check_order_transition(result.status, 'payed')
+        except InvalidTransition:
             return jsonify({
                 'success': False,
                 'message': f'Order must be ready or delivered to be paid. Current status: {result.status}'
@@ -574,43 +1283,34 @@ def pay_order(order_id):
                     'message': 'Invalid payment amount'
                 }), 400
         
-        print(f"Processing payment for order {order_id} - Method: {payment_method}, Amount: €{result.final_amount}")
-        
-        # Update order status to payed
-        db.session.execute(
-            text("UPDATE orders SET status = 'payed', updated_at = CURRENT_TIMESTAMP WHERE id = :order_id"),
-            {'order_id': order_id}
-        )
+        try:
+            client_version = parse_expected_version(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        if client_version is not None and client_version != result.version:
+            return version_conflict_response(order_id, f'Order was modified (now version {result.version}), reload and retry')
+        
+        logger.debug('Processing payment for order %s', order_id)
+        
+        # Update order status to payed (only once, even for concurrent payments)
+        if not transition_orders([(order_id, result.version)], 'payed'):
+            return version_conflict_response(order_id, 'Order was already paid or changed by another request')
+        record_order_outcome(order_id, 'paid', payment_method=payment_method)
+        add_outbox_event('order.paid', order_id, {
+            'order_id': order_id,
+            'payment_method': payment_method,
+            'amount': float(result.final_amount)
+        })
         
         db.session.commit()
         
-        print(f"Order marked as payed successfully")
+        logger.info('Order %s paid', order_id, extra={'order_id': order_id, 'payment_method': payment_method, 'amount': float(result.final_amount)})
         
         # Get updated order data
-        updated_order = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
-        
-        # Get order items
-        items_result = db.session.execute(
-            text("SELECT * FROM order_items WHERE order_id = :order_id ORDER BY created_at"),
-            {'order_id': order_id}
-        ).fetchall()
-        
-        # Convert to dict format
-        order_dict = dict(updated_order._mapping)
-        order_dict['id'] = str(order_dict['id'])
-        
-        items_dict = []
-        for item in items_result:
-            item_dict = dict(item._mapping)
-            item_dict['id'] = str(item_dict['id'])
-            item_dict['order_id'] = str(item_dict['order_id'])
-            item_dict['menu_item_id'] = str(item_dict['menu_item_id'])
-            items_dict.append(item_dict)
-        
-        order_dict['items'] = items_dict
+        order_dict = fetch_order_data(order_id)
         
         return jsonify({
             'success': True,
@@ -625,9 +1325,7 @@ def pay_order(order_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in pay_order: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in pay_order')
         return jsonify({
             'success': False,
             'message': 'Error processing payment',
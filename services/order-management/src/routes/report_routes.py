@@ -0,0 +1,196 @@
+from flask import Blueprint, request, jsonify
+from models import db, SalesRollup, MenuItemSalesRollup, italy_now
+from db_routing import read_only
+from reporting import NO_PAYMENT
+from serialization import to_float
+from sqlalchemy import select, func
+from datetime import date
+
+report_bp = Blueprint('reports', __name__)
+
+SALES_GROUPS = {
+    'day': (SalesRollup.day,),
+    'hour': (SalesRollup.day, SalesRollup.hour),
+    'order_type': (SalesRollup.order_type,),
+    'payment_method': (SalesRollup.payment_method,)
+}
+
+
+def parse_date_range():
+    """?from=YYYY-MM-DD&to=YYYY-MM-DD, both defaulting to today"""
+    today = italy_now().date()
+    date_from = date.fromisoformat(request.args['from']) if request.args.get('from') else today
+    date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else today
+    if date_from > date_to:
+        raise ValueError("'from' must not be after 'to'")
+    return date_from, date_to
+
+
+def invalid_range_response(error):
+    return jsonify({
+        'success': False,
+        'message': 'Invalid date range',
+        'error': str(error)
+    }), 400
+
+
+def sales_totals(*columns):
+    return (
+        *columns,
+        func.sum(SalesRollup.paid_orders).label('paid_orders'),
+        func.sum(SalesRollup.revenue).label('revenue'),
+        func.sum(SalesRollup.items_sold).label('items_sold'),
+        func.sum(SalesRollup.cancelled_orders).label('cancelled_orders'),
+        func.sum(SalesRollup.cancelled_amount).label('cancelled_amount')
+    )
+
+
+def serialize_sales_row(row, group_columns=()):
+    paid_orders = int(row.paid_orders or 0)
+    revenue = to_float(row.revenue)
+    data = {column.name: getattr(row, column.name) for column in group_columns}
+    if 'day' in data:
+        data['day'] = data['day'].isoformat()
+    data.update({
+        'paid_orders': paid_orders,
+        'revenue': round(revenue, 2),
+        'average_ticket': round(revenue / paid_orders, 2) if paid_orders else 0,
+        'items_sold': int(row.items_sold or 0),
+        'cancelled_orders': int(row.cancelled_orders or 0),
+        'cancelled_amount': round(to_float(row.cancelled_amount), 2)
+    })
+    return data
+
+
+@report_bp.route('/sales', methods=['GET'])
+@read_only
+def get_sales_report():
+    """Sales grouped by day, hour, order_type or payment_method (?group_by=)"""
+    try:
+        try:
+            date_from, date_to = parse_date_range()
+        except ValueError as e:
+            return invalid_range_response(e)
+        
+        group_by = request.args.get('group_by', 'day')
+        if group_by not in SALES_GROUPS:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid group_by. Must be one of: {", ".join(SALES_GROUPS)}'
+            }), 400
+        
+        group_columns = SALES_GROUPS[group_by]
+        query = (
+            select(*sales_totals(*group_columns))
+            .where(SalesRollup.day.between(date_from, date_to))
+            .group_by(*group_columns)
+            .order_by(*group_columns)
+        )
+        if group_by == 'payment_method':
+            query = query.where(SalesRollup.payment_method != NO_PAYMENT)
+        
+        data = [serialize_sales_row(row, group_columns) for row in db.session.execute(query)]
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'count': len(data),
+            'range': {'from': date_from.isoformat(), 'to': date_to.isoformat()}
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching sales report',
+            'error': str(e)
+        }), 500
+
+
+@report_bp.route('/summary', methods=['GET'])
+@read_only
+def get_sales_summary():
+    """Totals for a date range with throughput per hour of day"""
+    try:
+        try:
+            date_from, date_to = parse_date_range()
+        except ValueError as e:
+            return invalid_range_response(e)
+        
+        in_range = SalesRollup.day.between(date_from, date_to)
+        totals = db.session.execute(select(*sales_totals()).where(in_range)).one()
+        by_hour = db.session.execute(
+            select(*sales_totals(SalesRollup.hour))
+            .where(in_range)
+            .group_by(SalesRollup.hour)
+            .order_by(SalesRollup.hour)
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'totals': serialize_sales_row(totals),
+                'by_hour': [serialize_sales_row(row, (SalesRollup.hour,)) for row in by_hour]
+            },
+            'range': {'from': date_from.isoformat(), 'to': date_to.isoformat()}
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching sales summary',
+            'error': str(e)
+        }), 500
+
+
+@report_bp.route('/menu-items', methods=['GET'])
+@read_only
+def get_menu_item_report():
+    """Best selling menu items (?sort=quantity|revenue, ?limit=)"""
+    try:
+        try:
+            date_from, date_to = parse_date_range()
+        except ValueError as e:
+            return invalid_range_response(e)
+        
+        limit = request.args.get('limit', 20, type=int)
+        quantity = func.sum(MenuItemSalesRollup.quantity_sold).label('quantity_sold')
+        revenue = func.sum(MenuItemSalesRollup.revenue).label('revenue')
+        sort_column = revenue if request.args.get('sort') == 'revenue' else quantity
+        
+        rows = db.session.execute(
+            select(
+                MenuItemSalesRollup.menu_item_id,
+                func.max(MenuItemSalesRollup.menu_item_name).label('menu_item_name'),
+                quantity,
+                revenue,
+                func.sum(MenuItemSalesRollup.quantity_cancelled).label('quantity_cancelled')
+            )
+            .where(MenuItemSalesRollup.day.between(date_from, date_to))
+            .group_by(MenuItemSalesRollup.menu_item_id)
+            .order_by(sort_column.desc())
+            .limit(limit)
+        )
+        data = [
+            {
+                'menu_item_id': row.menu_item_id,
+                'menu_item_name': row.menu_item_name,
+                'quantity_sold': int(row.quantity_sold or 0),
+                'revenue': round(to_float(row.revenue), 2),
+                'quantity_cancelled': int(row.quantity_cancelled or 0)
+            }
+            for row in rows
+        ]
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'count': len(data),
+            'range': {'from': date_from.isoformat(), 'to': date_to.isoformat()}
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching menu item report',
+            'error': str(e)
+        }), 500
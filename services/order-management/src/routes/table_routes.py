@@ -0,0 +1,271 @@
+from flask import Blueprint, request, jsonify
+from models import db, Order, OrderItem, italy_now
+from db_routing import read_only
+from outbox import add_outbox_event
+from reporting import record_order_outcome
+from state_machine import transition_orders
+from sqlalchemy import select
+from marshmallow import Schema, fields, ValidationError, validates_schema
+from decimal import Decimal, ROUND_DOWN
+import logging
+
+table_bp = Blueprint('tables', __name__)
+logger = logging.getLogger(__name__)
+
+# The frontend settles single orders by moving them to 'delivered' (payOrder), so the
+# table bill treats delivered orders as paid and only charges the ready ones
+UNPAID_EXCLUDED_STATUSES = ['delivered', 'payed', 'cancelled']
+PAYABLE_STATUSES = ('ready',)
+CENT = Decimal('0.01')
+
+# Marshmallow schemas
+class SplitSchema(Schema):
+    by = fields.Str(required=True, validate=lambda x: x in ['amount', 'item'])
+    parts = fields.Int(validate=lambda x: x >= 2)
+    amounts = fields.List(fields.Float(validate=lambda x: x > 0), validate=lambda x: len(x) >= 2)
+    groups = fields.List(fields.List(fields.Str(), validate=lambda x: len(x) > 0), validate=lambda x: len(x) >= 2)
+
+    @validates_schema
+    def validate_split(self, data, **kwargs):
+        if data['by'] == 'amount' and ('parts' in data) == ('amounts' in data):
+            raise ValidationError('Amount split needs exactly one of parts or amounts')
+        if data['by'] == 'item' and 'groups' not in data:
+            raise ValidationError('Item split needs groups of order item ids')
+
+class TablePaymentSchema(Schema):
+    payment_method = fields.Str(load_default='cash', validate=lambda x: x in ['cash', 'card', 'other'])
+    payment_amount = fields.Float(allow_none=True)
+    split = fields.Nested(SplitSchema)
+
+table_payment_schema = TablePaymentSchema()
+
+
+def fetch_open_orders(table_number):
+    """Unpaid orders of a table with their items, in one query"""
+    rows = db.session.execute(
+        select(
+            Order.id, Order.order_number, Order.status, Order.final_amount, Order.version, Order.created_at,
+            OrderItem.id.label('item_id'), OrderItem.menu_item_id, OrderItem.menu_item_name,
+            OrderItem.quantity, OrderItem.unit_price, OrderItem.total_price
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.table_number == table_number, Order.status.notin_(UNPAID_EXCLUDED_STATUSES))
+        .order_by(Order.created_at, OrderItem.created_at)
+    ).all()
+
+    orders = {}
+    for row in rows:
+        order = orders.setdefault(row.id, {
+            'id': row.id,
+            'order_number': row.order_number,
+            'status': row.status,
+            'version': row.version,
+            'final_amount': Decimal(str(row.final_amount or 0)),
+            'payable': row.status in PAYABLE_STATUSES,
+            'items': []
+        })
+        order['items'].append({
+            'id': row.item_id,
+            'menu_item_id': row.menu_item_id,
+            'menu_item_name': row.menu_item_name,
+            'quantity': row.quantity,
+            'unit_price': Decimal(str(row.unit_price or 0)),
+            'total_price': Decimal(str(row.total_price or 0))
+        })
+    return list(orders.values())
+
+
+def bill_lines(orders):
+    """Items of the orders merged per menu item and unit price"""
+    lines = {}
+    for order in orders:
+        for item in order['items']:
+            line = lines.setdefault((item['menu_item_id'], item['unit_price']), {
+                'menu_item_id': item['menu_item_id'],
+                'menu_item_name': item['menu_item_name'],
+                'unit_price': item['unit_price'],
+                'quantity': 0,
+                'total_price': Decimal('0')
+            })
+            line['quantity'] += item['quantity']
+            line['total_price'] += item['total_price']
+    return [
+        {**line, 'unit_price': float(line['unit_price']), 'total_price': float(line['total_price'])}
+        for line in lines.values()
+    ]
+
+
+def serialize_bill_order(order):
+    return {
+        'id': order['id'],
+        'order_number': order['order_number'],
+        'status': order['status'],
+        'version': order['version'],
+        'payable': order['payable'],
+        'final_amount': float(order['final_amount'])
+    }
+
+
+def split_bill(split, orders, total):
+    """Shares of the total for each guest; raises ValueError if the split does not add up"""
+    if split['by'] == 'amount':
+        if 'parts' in split:
+            share = (total / split['parts']).quantize(CENT, rounding=ROUND_DOWN)
+            shares = [share] * split['parts']
+            # Leftover cents go to the first guest
+            shares[0] += total - share * split['parts']
+            return [{'guest': index + 1, 'amount': float(amount)} for index, amount in enumerate(shares)]
+        amounts = [Decimal(str(amount)).quantize(CENT) for amount in split['amounts']]
+        if sum(amounts) != total:
+            raise ValueError(f'Split amounts add up to €{sum(amounts)}, the bill is €{total}')
+        return [{'guest': index + 1, 'amount': float(amount)} for index, amount in enumerate(amounts)]
+
+    items = {item['id']: item for order in orders for item in order['items']}
+    assigned = [item_id for group in split['groups'] for item_id in group]
+    unknown = set(assigned) - set(items)
+    if unknown:
+        raise ValueError(f'Items not on this bill: {", ".join(sorted(unknown))}')
+    if len(assigned) != len(set(assigned)) or set(assigned) != set(items):
+        raise ValueError('Every item of the bill must be assigned to exactly one guest')
+    return [
+        {
+            'guest': index + 1,
+            'amount': float(sum(items[item_id]['total_price'] for item_id in group)),
+            'items': [
+                {'id': item_id, 'menu_item_name': items[item_id]['menu_item_name'], 'quantity': items[item_id]['quantity']}
+                for item_id in group
+            ]
+        }
+        for index, group in enumerate(split['groups'])
+    ]
+
+
+@table_bp.route('/<int:table_number>/bill', methods=['GET'])
+@read_only
+def get_table_bill(table_number):
+    """Open bill of a table: all unpaid orders, merged lines and totals"""
+    try:
+        orders = fetch_open_orders(table_number)
+        total = sum((order['final_amount'] for order in orders), Decimal('0'))
+        payable_total = sum((order['final_amount'] for order in orders if order['payable']), Decimal('0'))
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'table_number': table_number,
+                'orders': [serialize_bill_order(order) for order in orders],
+                'lines': bill_lines(orders),
+                'total': float(total),
+                'payable_total': float(payable_total)
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching table bill',
+            'error': str(e)
+        }), 500
+
+
+@table_bp.route('/<int:table_number>/pay', methods=['POST'])
+def pay_table(table_number):
+    """Settle every ready order of a table in one transaction and return one receipt"""
+    try:
+        try:
+            data = table_payment_schema.load(request.json or {})
+        except ValidationError as err:
+            return jsonify({
+                'success': False,
+                'message': 'Validation error',
+                'errors': err.messages
+            }), 400
+        
+        open_orders = fetch_open_orders(table_number)
+        orders = [order for order in open_orders if order['payable']]
+        if not orders:
+            return jsonify({
+                'success': False,
+                'message': f'Table {table_number} has no orders ready to be paid'
+            }), 400
+        
+        total = sum((order['final_amount'] for order in orders), Decimal('0'))
+        payment_amount = data.get('payment_amount')
+        if payment_amount is not None and Decimal(str(payment_amount)) < total:
+            return jsonify({
+                'success': False,
+                'message': f'Payment amount (€{payment_amount}) is less than the bill total (€{total})'
+            }), 400
+        
+        splits = None
+        if data.get('split'):
+            try:
+                splits = split_bill(data['split'], orders, total)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid split',
+                    'error': str(e)
+                }), 400
+        
+        order_ids = [order['id'] for order in orders]
+        logger.debug('Processing payment for table %s: %s orders', table_number, len(order_ids))
+        
+        # All or nothing: compare-and-set on the versions read with the bill, so any order
+        # changed or paid by another request in the meantime fails the whole payment
+        if not transition_orders([(order['id'], order['version']) for order in orders], 'payed'):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'Some orders of the table were changed by another request, reload the bill'
+            }), 409
+        
+        for order in orders:
+            order['status'] = 'payed'
+            order['version'] += 1
+            record_order_outcome(order['id'], 'paid', payment_method=data['payment_method'])
+            add_outbox_event('order.paid', order['id'], {
+                'order_id': order['id'],
+                'payment_method': data['payment_method'],
+                'amount': float(order['final_amount']),
+                'table_number': table_number
+            })
+        
+        db.session.commit()
+        
+        paid_at = italy_now()
+        receipt = {
+            'receipt_number': f"RCP-{paid_at.strftime('%Y%m%d%H%M%S')}-T{table_number}",
+            'table_number': table_number,
+            'paid_at': paid_at.isoformat(),
+            'payment_method': data['payment_method'],
+            'orders': [serialize_bill_order(order) for order in orders],
+            'lines': bill_lines(orders),
+            'total': float(total),
+            'payment_amount': payment_amount if payment_amount is not None else float(total),
+            'change': float(Decimal(str(payment_amount)) - total) if payment_amount is not None else 0,
+            'splits': splits,
+            'remaining_orders': [serialize_bill_order(order) for order in open_orders if not order['payable']]
+        }
+        
+        logger.info('Table %s paid', table_number, extra={
+            'table_number': table_number,
+            'order_ids': order_ids,
+            'payment_method': data['payment_method'],
+            'amount': float(total)
+        })
+        
+        return jsonify({
+            'success': True,
+            'message': 'Table paid successfully',
+            'data': receipt
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error in pay_table')
+        return jsonify({
+            'success': False,
+            'message': 'Error processing table payment',
+            'error': str(e)
+        }), 500
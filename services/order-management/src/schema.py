@@ -0,0 +1,50 @@
+"""Schema version tracking so DDL only runs when the models changed"""
+from sqlalchemy import text
+
+from models import db, SchemaMetadata
+
+# Bump whenever models gain tables so the next boot runs create_all once
+SCHEMA_VERSION = 7
+SCHEMA_VERSION_KEY = 'schema_version'
+# Arbitrary advisory lock id serializing schema setup across workers
+SCHEMA_LOCK_ID = 3002
+
+
+def get_applied_schema_version():
+    """Return the recorded schema version, or None if it was never recorded"""
+    try:
+        value = db.session.execute(
+            db.select(SchemaMetadata.value).where(SchemaMetadata.key == SCHEMA_VERSION_KEY)
+        ).scalar()
+        return int(value) if value is not None else None
+    except Exception:
+        # Metadata table does not exist yet
+        db.session.rollback()
+        return None
+
+
+def ensure_schema():
+    """Create tables only if the recorded schema version is outdated.
+
+    Returns True if DDL was executed, False if the schema was already current.
+    """
+    if get_applied_schema_version() == SCHEMA_VERSION:
+        return False
+
+    if db.engine.dialect.name == 'postgresql':
+        # Held until commit: concurrent workers wait here instead of racing on CREATE TABLE
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {'lock_id': SCHEMA_LOCK_ID})
+        db.session.execute(text("CREATE TABLE IF NOT EXISTS schema_metadata (key VARCHAR(50) PRIMARY KEY, value VARCHAR(100))"))
+        if get_applied_schema_version() == SCHEMA_VERSION:
+            db.session.commit()
+            return False
+
+    db.metadata.create_all(bind=db.session.connection())
+
+    metadata = db.session.get(SchemaMetadata, SCHEMA_VERSION_KEY)
+    if metadata:
+        metadata.value = str(SCHEMA_VERSION)
+    else:
+        db.session.add(SchemaMetadata(key=SCHEMA_VERSION_KEY, value=str(SCHEMA_VERSION)))
+    db.session.commit()
+    return True
@@ -0,0 +1,144 @@
+"""Row-oriented serializers shared by models and routes.
+
+Serializers only use attribute access, so they accept ORM instances as well
+as SQLAlchemy Row objects from Core selects (which skip ORM object overhead).
+"""
+from json_provider import NATIVE_DATETIME
+
+
+def format_datetime(value):
+    """ISO 8601 datetime; left to the JSON encoder when it formats datetimes natively"""
+    if value is None or NATIVE_DATETIME:
+        return value
+    # Drivers without native datetimes (SQLite raw SQL) already return text
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def to_float(value):
+    return float(value) if value is not None else 0.0
+
+
+def to_str(value):
+    return str(value) if value is not None else None
+
+
+def serialize_order_item(row):
+    return {
+        'id': str(row.id),
+        'order_id': str(row.order_id),
+        'menu_item_id': str(row.menu_item_id),
+        'menu_item_name': row.menu_item_name,
+        'quantity': row.quantity,
+        'unit_price': to_float(row.unit_price),
+        'total_price': to_float(row.total_price),
+        'special_instructions': row.special_instructions,
+        'status': row.status,
+        'version': row.version,
+        'created_at': format_datetime(row.created_at),
+        'updated_at': format_datetime(row.updated_at)
+    }
+
+
+def serialize_order(row, items):
+    """Serialize an order row; items is the already serialized list of its items"""
+    return {
+        'id': str(row.id),
+        'order_number': row.order_number,
+        'table_number': row.table_number,
+        'customer_name': row.customer_name,
+        'status': row.status,
+        'order_type': row.order_type,
+        'total_amount': to_float(row.total_amount),
+        'tax_amount': to_float(row.tax_amount),
+        'discount_amount': to_float(row.discount_amount),
+        'final_amount': to_float(row.final_amount),
+        'special_instructions': row.special_instructions,
+        'estimated_completion_time': format_datetime(row.estimated_completion_time),
+        'items': items,
+        'version': row.version,
+        'created_at': format_datetime(row.created_at),
+        'updated_at': format_datetime(row.updated_at)
+    }
+
+
+# Sparse fieldsets: output field -> converter applied to the column of the same name
+ORDER_ITEM_FIELDS = {
+    'id': to_str,
+    'order_id': to_str,
+    'menu_item_id': to_str,
+    'menu_item_name': None,
+    'quantity': None,
+    'unit_price': to_float,
+    'total_price': to_float,
+    'special_instructions': None,
+    'status': None,
+    'version': None,
+    'created_at': format_datetime,
+    'updated_at': format_datetime
+}
+
+ORDER_FIELDS = {
+    'id': to_str,
+    'order_number': None,
+    'table_number': None,
+    'customer_name': None,
+    'status': None,
+    'order_type': None,
+    'total_amount': to_float,
+    'tax_amount': to_float,
+    'discount_amount': to_float,
+    'final_amount': to_float,
+    'special_instructions': None,
+    'estimated_completion_time': format_datetime,
+    'version': None,
+    'created_at': format_datetime,
+    'updated_at': format_datetime
+}
+
+
+def project_row(row, fields, converters):
+    """Serialize only the requested fields of a row"""
+    data = {}
+    for field in fields:
+        convert = converters[field]
+        value = getattr(row, field)
+        data[field] = convert(value) if convert is not None else value
+    return data
+
+
+def parse_order_fields(value):
+    """Parse ?fields= for orders into (order_fields, item_fields).
+
+    None means "all fields"; an empty tuple of item fields means items are
+    omitted entirely. Item fields are requested as "items" (all) or
+    "items.<field>". Raises ValueError on unknown fields.
+    """
+    if not value:
+        return None, None
+
+    order_fields = []
+    item_fields = []
+    all_items = False
+    unknown = []
+    for field in (f.strip() for f in value.split(',')):
+        if not field:
+            continue
+        if field == 'items':
+            all_items = True
+        elif field.startswith('items.'):
+            item_field = field[len('items.'):]
+            if item_field in ORDER_ITEM_FIELDS:
+                item_fields.append(item_field)
+            else:
+                unknown.append(field)
+        elif field in ORDER_FIELDS:
+            order_fields.append(field)
+        else:
+            unknown.append(field)
+
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    if all_items:
+        return order_fields, None
+    return order_fields, tuple(dict.fromkeys(item_fields))
@@ -0,0 +1,203 @@
+"""Order and order item status transitions.
+
+The legal transitions are declared once below; the tables derived from them
+(which statuses can reach a target, how items follow their order) and the
+UPDATE statements for every target status are built at import time. A
+transition is a single set-based UPDATE guarded by the allowed source
+statuses and the version read by the caller, so an illegal or concurrent
+change simply matches no row.
+"""
+from sqlalchemy import update, select, bindparam, tuple_, case, and_, func, literal
+
+from models import db, Order, OrderItem, italy_now
+
+ORDER_TRANSITIONS = {
+    'pending': ('confirmed', 'cancelled'),
+    'confirmed': ('preparing', 'ready', 'cancelled'),
+    'preparing': ('ready', 'cancelled'),
+    'ready': ('delivered', 'payed', 'cancelled'),
+    'delivered': ('payed',),
+    'payed': (),
+    'cancelled': ()
+}
+
+ITEM_TRANSITIONS = {
+    'pending': ('preparing', 'ready', 'cancelled'),
+    'preparing': ('ready', 'cancelled'),
+    'ready': ('served', 'cancelled'),
+    'served': (),
+    'cancelled': ()
+}
+
+# Order target status -> status its items move to (every item that can reach it does)
+ORDER_ITEM_CASCADE = {
+    'preparing': 'preparing',
+    'ready': 'ready',
+    'delivered': 'served',
+    'payed': 'served',
+    'cancelled': 'cancelled'
+}
+
+# An order in the kitchen becomes ready once none of its items is still to be made
+ITEM_DONE_STATUSES = ('ready', 'served', 'cancelled')
+
+ORDER_STATUSES = tuple(ORDER_TRANSITIONS)
+ITEM_STATUSES = tuple(ITEM_TRANSITIONS)
+
+
+def _sources(transitions):
+    """Target status -> statuses allowed to move to it"""
+    return {
+        target: tuple(source for source, targets in transitions.items() if target in targets)
+        for target in transitions
+    }
+
+
+ORDER_SOURCES = _sources(ORDER_TRANSITIONS)
+ITEM_SOURCES = _sources(ITEM_TRANSITIONS)
+
+
+class InvalidTransition(ValueError):
+    """A status change the state machine does not allow"""
+
+    def __init__(self, kind, from_status, to_status, allowed):
+        self.from_status = from_status
+        self.to_status = to_status
+        allowed_text = ', '.join(allowed) if allowed else 'none, it is final'
+        super().__init__(f'Cannot change {kind} status from {from_status} to {to_status} (allowed: {allowed_text})')
+
+
+def check_order_transition(from_status, to_status):
+    if to_status not in ORDER_TRANSITIONS.get(from_status, ()):
+        raise InvalidTransition('order', from_status, to_status, ORDER_TRANSITIONS.get(from_status, ()))
+
+
+def check_item_transition(from_status, to_status):
+    if to_status not in ITEM_TRANSITIONS.get(from_status, ()):
+        raise InvalidTransition('item', from_status, to_status, ITEM_TRANSITIONS.get(from_status, ()))
+
+
+def cascaded_item_sources(order_status):
+    """Item statuses moved along when an order goes to order_status"""
+    item_status = ORDER_ITEM_CASCADE.get(order_status)
+    return ITEM_SOURCES[item_status] if item_status else ()
+
+
+orders_table = Order.__table__
+items_table = OrderItem.__table__
+
+
+def _order_statement(to_status):
+    return (
+        update(orders_table)
+        .where(
+            tuple_(orders_table.c.id, orders_table.c.version).in_(bindparam('keys', expanding=True)),
+            orders_table.c.status.in_(ORDER_SOURCES[to_status])
+        )
+        .values(status=to_status, version=orders_table.c.version + 1, updated_at=bindparam('now'))
+    )
+
+
+def _cascade_statement(order_status, order_ids):
+    item_status = ORDER_ITEM_CASCADE[order_status]
+    return (
+        update(items_table)
+        .where(items_table.c.order_id.in_(order_ids), items_table.c.status.in_(ITEM_SOURCES[item_status]))
+        .values(status=item_status, version=items_table.c.version + 1, updated_at=bindparam('now'))
+    )
+
+
+def _combined_statement(to_status):
+    """Postgres: the order update and its item cascade as one statement"""
+    moved = _order_statement(to_status).returning(orders_table.c.id).cte('moved_orders')
+    if to_status not in ORDER_ITEM_CASCADE:
+        return select(func.count()).select_from(moved)
+    cascaded = _cascade_statement(to_status, select(moved.c.id)).returning(items_table.c.id).cte('cascaded_items')
+    return select(func.count()).select_from(moved).add_cte(cascaded)
+
+
+ORDER_STATEMENTS = {status: _order_statement(status) for status in ORDER_STATUSES if ORDER_SOURCES[status]}
+CASCADE_STATEMENTS = {
+    status: _cascade_statement(status, bindparam('order_ids', expanding=True)) for status in ORDER_ITEM_CASCADE
+}
+COMBINED_STATEMENTS = {status: _combined_statement(status) for status in ORDER_STATEMENTS}
+
+ITEM_STATEMENTS = {
+    status: (
+        update(items_table)
+        .where(
+            items_table.c.id == bindparam('match_item_id'),
+            items_table.c.order_id == bindparam('match_order_id'),
+            items_table.c.version == bindparam('expected_version'),
+            items_table.c.status.in_(ITEM_SOURCES[status])
+        )
+        .values(status=status, version=items_table.c.version + 1, updated_at=bindparam('now'))
+    )
+    for status in ITEM_STATUSES if ITEM_SOURCES[status]
+}
+
+_open_items = (
+    select(literal(1))
+    .where(items_table.c.order_id == orders_table.c.id, items_table.c.status.notin_(ITEM_DONE_STATUSES))
+    .exists()
+)
+_made_items = (
+    select(literal(1))
+    .where(items_table.c.order_id == orders_table.c.id, items_table.c.status != 'cancelled')
+    .exists()
+)
+# Bumps the order version after one of its items changed and moves it to ready
+# when that was its last open item; RETURNING tells the caller which happened
+ITEM_CHANGED_STATEMENT = (
+    update(orders_table)
+    .where(orders_table.c.id == bindparam('match_order_id'), orders_table.c.version == bindparam('expected_version'))
+    .values(
+        status=case(
+            (and_(orders_table.c.status.in_(ORDER_SOURCES['ready']), ~_open_items, _made_items),
+             literal('ready', orders_table.c.status.type)),
+            else_=orders_table.c.status
+        ),
+        version=orders_table.c.version + 1,
+        updated_at=bindparam('now')
+    )
+    .returning(orders_table.c.status)
+)
+
+
+def transition_orders(keys, to_status):
+    """Move orders, given as [(order_id, version)], to to_status together with their items.
+
+    Returns False, having changed nothing the caller must keep, when any of
+    them was modified since it was read or cannot reach to_status; the caller
+    rolls back.
+    """
+    if not keys:
+        return True
+    params = {'keys': [tuple(key) for key in keys], 'now': italy_now()}
+    if db.engine.dialect.name == 'postgresql':
+        return db.session.execute(COMBINED_STATEMENTS[to_status], params).scalar() == len(keys)
+
+    if db.session.execute(ORDER_STATEMENTS[to_status], params).rowcount != len(keys):
+        return False
+    if to_status in CASCADE_STATEMENTS:
+        db.session.execute(
+            CASCADE_STATEMENTS[to_status],
+            {'order_ids': [order_id for order_id, _ in keys], 'now': params['now']}
+        )
+    return True
+
+
+def transition_item(order_id, item_id, version, to_status):
+    """Move one item to to_status; False if it changed since it was read"""
+    return db.session.execute(
+        ITEM_STATEMENTS[to_status],
+        {'match_order_id': order_id, 'match_item_id': item_id, 'expected_version': version, 'now': italy_now()}
+    ).rowcount == 1
+
+
+def item_changed(order_id, version):
+    """Record an item change on its order; returns the order's new status, or None
+    if the order changed since it was read"""
+    return db.session.execute(
+        ITEM_CHANGED_STATEMENT, {'match_order_id': order_id, 'expected_version': version, 'now': italy_now()}
+    ).scalar()
@@ -0,0 +1,259 @@
+"""Distributed tracing with W3C trace context.
+
+Every request runs in a server span, joined to the caller's trace when it
+sends a `traceparent` header (the gateway starts the trace otherwise). Calls
+to other services run in client spans whose traceparent is forwarded, and
+database statements and response serialization are recorded as child spans.
+
+Finished spans go to the exporter named by TRACE_EXPORTER: 'memory' keeps the
+last TRACE_MEMORY_SPANS spans in process, 'file' appends JSON lines to
+TRACE_FILE ({service} is replaced by the service name) from a background
+thread; register_exporter() adds others. With no exporter, trace context is
+still propagated but nothing is recorded.
+TRACE_SAMPLE_RATE applies to traces started here; joined traces follow the
+caller's sampled flag.
+"""
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+from flask import g, request
+
+from json_provider import json_dumps
+
+TRACEPARENT_HEADER = 'traceparent'
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_exporter = None
+_service = None
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'trace_id', 'span_id', 'parent_id', 'sampled', 'attributes',
+                 'status', 'start_time', '_started')
+
+    def __init__(self, name, trace_id, parent_id=None, sampled=True, kind='internal', attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        self.status = 'ok'
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self):
+        if self.sampled and _exporter is not None:
+            export_span(self.name, self.kind, self.trace_id, self.span_id, self.parent_id, self.start_time,
+                        time.perf_counter() - self._started, self.attributes, self.status)
+
+
+def export_span(name, kind, trace_id, span_id, parent_id, start_time, duration, attributes, status='ok'):
+    try:
+        _exporter.export({
+            'trace_id': trace_id,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'name': name,
+            'kind': kind,
+            'service': _service,
+            'start_time': start_time,
+            'duration_ms': round(duration * 1000, 3),
+            'status': status,
+            'attributes': attributes
+        })
+    except Exception as e:
+        logger.warning('Could not export span %s: %s', name, e)
+
+
+def parse_traceparent(value):
+    """(trace_id, parent_span_id, sampled) from a traceparent header, or None if invalid"""
+    match = _TRACEPARENT.match((value or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def tracing_enabled():
+    """True when the current span is recorded, so callers can skip building attributes"""
+    span = _current_span.get()
+    return span is not None and span.sampled and _exporter is not None
+
+
+def traceparent_headers():
+    """Headers that continue the current trace in another service"""
+    span = _current_span.get()
+    return {TRACEPARENT_HEADER: span.traceparent} if span is not None else {}
+
+
+@contextmanager
+def start_span(name, kind='internal', **attributes):
+    """Child span of the current one; a no-op outside a traced request"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    span = Span(name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.status = 'error'
+        span.set_attribute('error', str(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def record_span(name, duration, attributes=None, kind='internal'):
+    """Record an already finished child span of the current span (e.g. timed by an event hook)"""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled or _exporter is None:
+        return
+    export_span(name, kind, parent.trace_id, os.urandom(8).hex(), parent.span_id,
+                time.time() - duration, duration, attributes or {})
+
+
+class MemoryExporter:
+    """Keeps the most recent spans in process (tests, debugging)"""
+
+    def __init__(self, max_spans=10000):
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def get_trace(self, trace_id):
+        return [span for span in list(self.spans) if span['trace_id'] == trace_id]
+
+
+class FileExporter:
+    """Appends spans as JSON lines from a background thread; drops spans when the queue is full"""
+
+    def __init__(self, path, queue_size=10000):
+        self.path = path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._writer_pid = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span):
+        if self._writer_pid != os.getpid():
+            # Started lazily so that forked workers (gunicorn preload) get their own writer
+            self._writer_pid = os.getpid()
+            threading.Thread(target=self._run, name='trace-writer', daemon=True).start()
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            spans = [self.queue.get()]
+            while len(spans) < 500:
+                try:
+                    spans.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(''.join(json_dumps(span) + '\n' for span in spans))
+            except OSError as e:
+                logger.warning('Could not write spans to %s: %s', self.path, e)
+
+
+EXPORTERS = {
+    'memory': lambda config: MemoryExporter(config.get('TRACE_MEMORY_SPANS', 10000)),
+    'file': lambda config: FileExporter(
+        config.get('TRACE_FILE', '/tmp/traces/{service}.jsonl').format(service=_service)
+    )
+}
+
+
+def register_exporter(name, factory):
+    """factory(app.config) -> object with export(span_dict)"""
+    EXPORTERS[name] = factory
+
+
+def get_exporter():
+    return _exporter
+
+
+def init_tracing(app, service):
+    global _exporter, _service
+    _service = service
+    name = app.config.get('TRACE_EXPORTER')
+    _exporter = EXPORTERS[name](app.config) if name else None
+    sample_rate = app.config.get('TRACE_SAMPLE_RATE', 1.0)
+
+    # Response encoding is the serialization step of every endpoint
+    encode_response = app.json.response
+
+    def traced_response(*args, **kwargs):
+        with start_span('serialize.response'):
+            return encode_response(*args, **kwargs)
+
+    app.json.response = traced_response
+
+    @app.before_request
+    def start_server_span():
+        parent = parse_traceparent(request.headers.get(TRACEPARENT_HEADER))
+        if parent:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = os.urandom(16).hex(), None, random.random() < sample_rate
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        span = Span(f'{request.method} {route}', trace_id, parent_id, sampled, 'server', {
+            'http.method': request.method,
+            'http.route': route,
+            'http.target': request.full_path.rstrip('?')
+        })
+        g.trace_id = trace_id
+        g.server_span = span
+        g.server_span_token = _current_span.set(span)
+
+    @app.after_request
+    def tag_server_span(response):
+        span = g.get('server_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.status = 'error'
+        return response
+
+    @app.teardown_request
+    def end_server_span(exc):
+        span = g.pop('server_span', None)
+        if span is None:
+            return
+        if exc is not None:
+            span.status = 'error'
+            span.set_attribute('error', str(exc))
+        _current_span.reset(g.pop('server_span_token'))
+        span.end()